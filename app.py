@@ -4,7 +4,9 @@ from dash import dcc
 import dash
 import yaml
 
+from utils import component_initialiser
 from utils.component_initialiser import initialise
+from utils.serving import configure_responses
 
 BASE_PATH = '/catalogue/'
 
@@ -14,7 +16,7 @@ class App:
     The main application
     """
 
-    def __init__(self, launch_config):
+    def __init__(self, launch_config, background_work=True):
         self.app = dash.Dash(__name__,
                              suppress_callback_exceptions=True,
                              routes_pathname_prefix=BASE_PATH,
@@ -22,8 +24,9 @@ class App:
                              )
         self.app.title = "Catalogue"
         self.server = self.app.server
-        app_context = initialise(self.app, launch_config, BASE_PATH)
-        navbar = app_context.components['navigation_bar']
+        configure_responses(self.server, launch_config)
+        self.app_context = initialise(self.app, launch_config, BASE_PATH, background_work)
+        navbar = self.app_context.components['navigation_bar']
 
         # Use the navbar as the launch layout for the app
         self.app.layout = html.Div([
@@ -32,6 +35,14 @@ class App:
             html.Div(id="page-content")
         ])
 
+    def start_background_work(self):
+        """ Start background work that was held back, in the process that will serve requests """
+        component_initialiser.start_background_work(self.app_context.data_components)
+
+    def before_fork(self):
+        """ Release what can't be shared with the processes that are about to be forked to serve requests """
+        component_initialiser.before_fork(self.app_context.data_components)
+
     def __call__(self, port=7245):
         """
         When the app instance is called, this will run
@@ -0,0 +1,53 @@
+// Sends files picked in the data uploader to the upload routes in resumable chunks, see DataUploaderTab
+(function () {
+    const CHUNK_SIZE = 4 * 1024 * 1024;
+    const INPUT_ID = 'data-upload-chunked-input';
+    const OUTPUT_ID = 'data-upload-output-component';
+
+    function uploadId(file) {
+        // stable for the same file, so an interrupted upload resumes where it stopped
+        return `${file.size}-${file.lastModified}-${file.name}`.replace(/[^A-Za-z0-9_-]/g, '_').slice(0, 128);
+    }
+
+    async function uploadFile(file, uploadUrl, report) {
+        const fileUrl = `${uploadUrl}/${uploadId(file)}`;
+        const status = await fetch(fileUrl).then(response => response.json());
+        let received = status.received || 0;
+
+        while (received < file.size) {
+            const query = new URLSearchParams({filename: file.name, offset: received, total_size: file.size});
+            const response = await fetch(`${fileUrl}?${query}`, {
+                method: 'PUT',
+                body: file.slice(received, received + CHUNK_SIZE)
+            });
+            const body = await response.json();
+            if (!response.ok && response.status !== 409) {
+                throw new Error(body.error || response.statusText);
+            }
+            received = body.received;
+            report(`${file.name}: ${Math.floor(100 * received / file.size)}%`);
+        }
+        report(`${file.name}: uploaded`);
+    }
+
+    document.addEventListener('change', async function (event) {
+        const input = event.target;
+        if (input.id !== INPUT_ID) {
+            return;
+        }
+
+        const output = document.getElementById(OUTPUT_ID);
+        const lines = {};
+        const render = () => { output.textContent = Object.values(lines).join('\n'); };
+
+        for (const file of Array.from(input.files)) {
+            try {
+                await uploadFile(file, input.dataset.uploadUrl, line => { lines[file.name] = line; render(); });
+            } catch (error) {
+                lines[file.name] = `${file.name}: failed (${error.message})`;
+                render();
+            }
+        }
+        input.value = '';
+    });
+})();
@@ -0,0 +1,27 @@
+// Refreshes the catalogue file viewer when the server pushes a catalogue change, see FilesystemViewer
+(function () {
+    const TRIGGER_ID = 'catalogue-fileviewer-push-trigger';
+    let source = null;
+
+    // the trigger only exists while the catalogue page is shown, so keep checking for it
+    setInterval(function () {
+        const trigger = document.getElementById(TRIGGER_ID);
+        const eventsUrl = trigger && trigger.dataset.eventsUrl;
+        if (!eventsUrl) {
+            if (source) {
+                source.close();
+                source = null;
+            }
+            return;
+        }
+        if (!source) {
+            source = new EventSource(eventsUrl);
+            source.onmessage = function () {
+                const currentTrigger = document.getElementById(TRIGGER_ID);
+                if (currentTrigger) {
+                    currentTrigger.click();
+                }
+            };
+        }
+    }, 1000);
+})();
@@ -47,7 +47,6 @@ class CataloguePage:
                 ),
                 dbc.CardBody(id="catalogue-file-card-view")
             ], width=9, style={"height": "94vh", "overflow": "scroll"}),
-            dcc.Download(id="download-catalogue-dataframe"),
             dcc.Store(id='selected-catalogue-filename')
         ], className="g-0")
 
@@ -1,9 +1,11 @@
+import dash
 from dash import html
 from dash import dcc
+from dash import Input, Output, State, ALL
 import dash_bootstrap_components as dbc
 import plotly.express as px
 
-from utils.component_decorators import component
+from utils.component_decorators import component, callback
 from discovery.metadata import NumericColMetadata
 
 
@@ -20,8 +22,14 @@ class CatalogueColumnOverview:
         return html.Div(self.build_column_list(file_catalogue))
 
     def build_column_list(self, file_catalogue):
-        catalogue_data = file_catalogue.get_data()
         file_metadata = file_catalogue.get_metadata()
+        column_relationships = self.data_catalogue.get_column_relationships(file_catalogue)
+        # resolve the files of every relationship in one lookup rather than once per relationship
+        related_files = self.data_catalogue.get_metadata_by_hashes({
+            related_checksum
+            for relationships in column_relationships.values()
+            for related_checksum, _, _ in relationships
+        })
         return dbc.Accordion(
             [
                 dbc.AccordionItem([
@@ -29,27 +37,79 @@ class CatalogueColumnOverview:
                     html.H5("Relationships:"),
                     dbc.ListGroup([
                         dbc.ListGroupItem(
-                            f"Column: {relationship.target_column_name} "
-                            f"-- from \
-                            {self.data_catalogue.get_metadata_by_hash(relationship.target_hash).get_metadata().data_manifest['path']}"
-                            f" (Certainty: {relationship.certainty}%)",
-                            color=self.colour_thresholds(relationship.certainty)
+                            f"Column: {related_column} "
+                            f"-- from {self._related_file_path(related_files[related_checksum])}"
+                            f" (Certainty: {certainty}%)",
+                            color=self.colour_thresholds(certainty)
                         )
-                        for relationship in column.relationships
+                        for related_checksum, related_column, certainty in column_relationships.get(column_name, [])
                     ], flush=True),
+                    html.H5("Columns sharing values:"),
+                    # joinable columns and visuals are only built once their item is expanded, see build_active_visual
+                    html.Div(id={"type": "catalogue-column-joinable", "index": column_name}),
                     html.H5("Visualisation:"),
-                    html.Div(self.build_visual(catalogue_data, column_name, column))
+                    html.Div(id={"type": "catalogue-column-visual", "index": column_name})
                 ],
-                    title=column_name
+                    title=column_name,
+                    item_id=column_name
                 )
                 for column_name, column in file_metadata.columns.items()
             ],
+            id="catalogue-column-accordion",
+            start_collapsed=True,
             flush=True
         )
 
-    def build_visual(self, catalogue_data, column_name, column):
-        """ Create a graph if the column is numeric """
+    @staticmethod
+    def _related_file_path(related_file):
+        """ Related files may have been removed from the catalogue since the relationship was made """
+        if related_file is None:
+            return "an unknown file"
+        return related_file.get_metadata().data_manifest['path']
+
+    @callback(
+        Output({"type": "catalogue-column-visual", "index": ALL}, 'children'),
+        Output({"type": "catalogue-column-joinable", "index": ALL}, 'children'),
+        Input("catalogue-column-accordion", 'active_item'),
+        State("selected-catalogue-filename", 'data')
+    )
+    def build_active_visual(self, active_item, file_path):
+        """
+        Build the visual and joinable columns for the column that has just been expanded
+        Every other column is left as it is
+        """
+        visual_outputs, joinable_outputs = dash.ctx.outputs_list
+        file_catalogue = self.data_catalogue.get_metadata_by_file(file_path)
+        if active_item is None or file_catalogue is None:
+            return [dash.no_update] * len(visual_outputs), [dash.no_update] * len(joinable_outputs)
+
+        return [
+            self.build_visual(file_catalogue, active_item)
+            if visual_output['id']['index'] == active_item else dash.no_update
+            for visual_output in visual_outputs
+        ], [
+            self.build_joinable_columns(file_path, active_item)
+            if joinable_output['id']['index'] == active_item else dash.no_update
+            for joinable_output in joinable_outputs
+        ]
+
+    def build_joinable_columns(self, file_path, column_name):
+        """ List the columns elsewhere in the catalogue that share values with this one, from the value index """
+        joinable_columns = self.data_catalogue.find_joinable_columns(file_path, column_name)
+        if not joinable_columns:
+            return html.Div("No columns found")
+        return dbc.ListGroup([
+            dbc.ListGroupItem(
+                f"Column: {joinable_column} -- from {joinable_file} (Shared values: {round(containment * 100)}%)",
+                color=self.colour_thresholds(containment * 100)
+            )
+            for joinable_file, joinable_column, containment in joinable_columns
+        ], flush=True)
+
+    def build_visual(self, file_catalogue, column_name):
+        """ Create a graph if the column is numeric, plotting a downsampled copy of the column """
+        column = file_catalogue.get_metadata().columns.get(column_name)
         if isinstance(column, NumericColMetadata):
-            catalogue_data_mask = catalogue_data[column_name]
-            return dcc.Graph(figure=px.line(catalogue_data_mask))
+            visual_series = self.data_catalogue.get_visual_series(file_catalogue, column_name)
+            return dcc.Graph(figure=px.line(visual_series))
         return html.Div("No visuals currently supported for this column type")
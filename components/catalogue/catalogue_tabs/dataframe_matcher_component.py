@@ -6,12 +6,18 @@ import dash_bootstrap_components as dbc
 import plotly.express as px
 
 from utils.component_decorators import component, callback
+from utils.table_queries import paged_table_options
 
+TABLE_PAGE_SIZE = 5
+# approximate cells whose upper confidence bound reaches this percentage are rescored exactly when refining
+DEFAULT_REFINE_THRESHOLD = 50
 
-@component(name="catalogue_dataframe_matcher", required_data=["local_data_catalogue"])
+
+@component(name="catalogue_dataframe_matcher", required_data=["local_data_catalogue", "job_manager"])
 class CatalogueDataframeMatcher:
-    def __init__(self, catalogue_data):
+    def __init__(self, catalogue_data, job_manager):
         self.catalogue_data = catalogue_data
+        self.job_manager = job_manager
         # List of colours that form a gradient
         self.table_colours = px.colors.diverging.RdYlGn[:9]
         # As there are a set amount of colours, a conversion must be made from a percentage to the required gradient
@@ -21,12 +27,12 @@ class CatalogueDataframeMatcher:
         """
         Build the main view for the selected file
         """
-        file_data = file_catalogue.get_data()
         file_metadata = file_catalogue.get_metadata()
-        data_head = file_data.head().to_dict('records')
+        file_head = file_catalogue.get_head(TABLE_PAGE_SIZE)
+        data_head = file_head.to_dict('records')
         return html.Div([
             dcc.Dropdown([
-                file_path for file_path in self.catalogue_data.file_catalogue_ref
+                file_path for file_path in self.catalogue_data.get_loaded_files()
                 if file_path != file_metadata.data_manifest['path']
             ],
                 id="catalogue-file-comparison-choice"
@@ -39,8 +45,9 @@ class CatalogueDataframeMatcher:
                     "name": col,
                     "hideable": True,
                     "id": col
-                } for col in file_data.columns],
-                id="catalogue-origin-comparison-table"
+                } for col in file_head.columns],
+                id="catalogue-origin-comparison-table",
+                **paged_table_options(TABLE_PAGE_SIZE)
             ),
 
             html.Div([
@@ -75,8 +82,28 @@ class CatalogueDataframeMatcher:
                         ], class_name="mb-3")
                     ])
                     for label in self.catalogue_data.match_types
+                ] + [
+                    html.Hr(),
+                    dbc.Checkbox(id="catalogue-comparison-approximate", label="Approximate (sampled rows)",
+                                 value=False),
+                    dbc.InputGroup([
+                        dbc.InputGroupText("Sample rows"),
+                        dbc.Input(id="catalogue-comparison-sample-size", type="number", min=10,
+                                  placeholder=self.catalogue_data.comparison_engine.sample_size)
+                    ], class_name="mb-3"),
+                    dbc.InputGroup([
+                        dbc.InputGroupText("Refine above"),
+                        dbc.Input(id="catalogue-comparison-refine-threshold", type="number", min=0, max=100,
+                                  placeholder=DEFAULT_REFINE_THRESHOLD),
+                        dbc.Button("Refine", id="catalogue-comparison-refine-button", color="secondary")
+                    ], class_name="mb-3")
                 ], width=3),
                 dbc.Col([
+                    dbc.Row([
+                        dbc.Col(dbc.Progress(id="catalogue-comparison-progress", value=0), width=10),
+                        dbc.Col(dbc.Button("Cancel", id="catalogue-comparison-cancel-button", color="secondary",
+                                           size="sm"), width=2)
+                    ], align="center", className="mb-3"),
                     html.Div(id="catalogue-comparison-table-wrapper"),
                     html.Hr(),
                     dbc.Card([
@@ -93,6 +120,8 @@ class CatalogueDataframeMatcher:
                 ], width=9)
             ]),
             dcc.Store("catalogue-comparison-percentages-data"),
+            dcc.Store("catalogue-comparison-job"),
+            dcc.Interval(id="catalogue-comparison-job-poll", interval=500, disabled=True),
             dcc.Store("catalogue-active-relationship-columns")
         ])
 
@@ -109,15 +138,15 @@ class CatalogueDataframeMatcher:
             return dash.no_update
 
         file_catalogue = self.catalogue_data.get_metadata_by_file(file_path)
-        file_meta = file_catalogue.get_metadata()
-        file_data = file_catalogue.get_data()
 
-        if file_meta is None:
+        if file_catalogue is None:
             return html.Div(
                 html.H2("Specify a file to compare with")
             )
 
-        data_head = file_data.head().to_dict('records')
+        file_meta = file_catalogue.get_metadata()
+        file_head = file_catalogue.get_head(TABLE_PAGE_SIZE)
+        data_head = file_head.to_dict('records')
 
         return html.Div([
             html.H2(file_meta.data_manifest['path']),
@@ -127,11 +156,46 @@ class CatalogueDataframeMatcher:
                     "name": col,
                     "hideable": True,
                     "id": col
-                } for col in file_data.columns],
-                id="catalogue-target-comparison-table"
+                } for col in file_head.columns],
+                id="catalogue-target-comparison-table",
+                **paged_table_options(TABLE_PAGE_SIZE)
             )
         ])
 
+    @callback(
+        Output("catalogue-origin-comparison-table", 'data'),
+        Output("catalogue-origin-comparison-table", 'page_count'),
+        Input("catalogue-origin-comparison-table", 'page_current'),
+        Input("catalogue-origin-comparison-table", 'page_size'),
+        Input("catalogue-origin-comparison-table", 'sort_by'),
+        Input("catalogue-origin-comparison-table", 'filter_query'),
+        State("selected-catalogue-filename", 'data')
+    )
+    def update_origin_table_page(self, page_current, page_size, sort_by, filter_query, file_path):
+        return self._get_table_page(file_path, page_current, page_size, sort_by, filter_query)
+
+    @callback(
+        Output("catalogue-target-comparison-table", 'data'),
+        Output("catalogue-target-comparison-table", 'page_count'),
+        Input("catalogue-target-comparison-table", 'page_current'),
+        Input("catalogue-target-comparison-table", 'page_size'),
+        Input("catalogue-target-comparison-table", 'sort_by'),
+        Input("catalogue-target-comparison-table", 'filter_query'),
+        State("catalogue-file-comparison-choice", "value")
+    )
+    def update_target_table_page(self, page_current, page_size, sort_by, filter_query, file_path):
+        return self._get_table_page(file_path, page_current, page_size, sort_by, filter_query)
+
+    def _get_table_page(self, file_path, page_current, page_size, sort_by, filter_query):
+        """
+        Page, sort and filter a file on the server, only the requested page is sent back
+        If no file is selected (or the table is still a placeholder), do not update
+        """
+        file_catalogue = self.catalogue_data.get_metadata_by_file(file_path) if file_path else None
+        if file_catalogue is None or page_size is None:
+            return dash.no_update, dash.no_update
+        return self.catalogue_data.get_table_page(file_catalogue, page_current, page_size, sort_by, filter_query)
+
     @callback(
         Output("catalogue-comparison-table-wrapper", "children"),
         Input("catalogue-target-comparison-table", "hidden_columns"),
@@ -155,10 +219,29 @@ class CatalogueDataframeMatcher:
         active_target_columns = [col['name'] for col in target_columns if col['name'] not in target_hidden_columns]
         active_origin_columns = [col['name'] for col in origin_columns if col['name'] not in origin_hidden_columns]
 
-        result_table = pd.DataFrame(percentage_data, columns=[""] + active_origin_columns)[:len(active_target_columns)]
+        percentage_data = percentage_data or {}
+        result_table = pd.DataFrame(
+            percentage_data.get('percentages'), columns=[""] + active_origin_columns
+        )[:len(active_target_columns)]
         result_table[""] = active_target_columns
+        # approximate cells hold [lower, upper] confidence bounds, exact cells hold None
+        intervals = (percentage_data.get('intervals') or [])[:len(active_target_columns)]
+        approximate_cells = [
+            (row_index, col_name, bounds)
+            for row_index, row_intervals in enumerate(intervals)
+            for col_name, bounds in row_intervals.items()
+            if bounds is not None and col_name in active_origin_columns
+        ]
         return dash_table.DataTable(
             result_table.to_dict('records'),
+            tooltip_data=[
+                {
+                    col_name: f"Approximate, 95% confidence interval {bounds[0]} - {bounds[1]}"
+                    for col_name, bounds in row_intervals.items()
+                    if bounds is not None
+                }
+                for row_intervals in intervals
+            ],
             style_data_conditional=[
                 {
                     'if': {
@@ -170,28 +253,62 @@ class CatalogueDataframeMatcher:
                 }
                 for col_name in active_origin_columns
                 for index, colour in enumerate(self.table_colours)
+            ] + [
+                {
+                    'if': {
+                        'row_index': row_index,
+                        'column_id': col_name
+                    },
+                    'fontStyle': 'italic',
+                    'border': '1px dashed grey'
+                }
+                for row_index, col_name, _ in approximate_cells
             ],
             id='catalogue-comparison-table'
         )
 
     @callback(
         Output("catalogue-comparison-percentages-data", "data"),
+        Output("catalogue-comparison-job", "data"),
+        Output("catalogue-comparison-job-poll", "disabled"),
+        Output("catalogue-comparison-progress", "value"),
+        Output("catalogue-comparison-progress", "label"),
         Input({"type": "catalogue-dataframe-comparison-types", "index": ALL}, 'value'),
         Input({"type": "catalogue-dataframe-comparison-weights", "index": ALL}, 'value'),
+        Input("catalogue-comparison-approximate", "value"),
+        Input("catalogue-comparison-refine-button", "n_clicks"),
+        Input("catalogue-comparison-job-poll", "n_intervals"),
+        Input("catalogue-comparison-cancel-button", "n_clicks"),
         State("selected-catalogue-filename", 'data'),
         State("catalogue-file-comparison-choice", "value"),
         State("catalogue-target-comparison-table", "hidden_columns"),
         State("catalogue-origin-comparison-table", "hidden_columns"),
         State("catalogue-target-comparison-table", "columns"),
-        State("catalogue-origin-comparison-table", "columns")
+        State("catalogue-origin-comparison-table", "columns"),
+        State("catalogue-comparison-job", "data"),
+        State("catalogue-comparison-sample-size", "value"),
+        State("catalogue-comparison-refine-threshold", "value"),
+        State("catalogue-comparison-percentages-data", "data")
     )
-    def update_comparison_percentage_data(self, comparison_types, comparison_weights, origin_file_path,
-                                          target_file_path,
-                                          target_hidden_columns, origin_hidden_columns, target_columns, origin_columns):
+    def update_comparison_percentage_data(self, comparison_types, comparison_weights, approximate, refine_clicks,
+                                          n_intervals, cancel_clicks, origin_file_path, target_file_path,
+                                          target_hidden_columns, origin_hidden_columns, target_columns, origin_columns,
+                                          job_id, sample_size, refine_threshold, percentage_data):
+        """
+        Comparisons run as a background job, which is polled until it has finished or is cancelled
+        Approximate comparisons score a sample of rows, refining rescores the promising approximate cells exactly
+        Note: as you can not have duplicate outputs, all of this logic must exist here
+        """
+        if dash.ctx.triggered_id == "catalogue-comparison-job-poll":
+            return self._poll_comparison_job(job_id)
+        if dash.ctx.triggered_id == "catalogue-comparison-cancel-button":
+            self.job_manager.cancel(job_id)
+            return self._poll_comparison_job(job_id)
+
         if not target_file_path:
             return dash.no_update
         comparison_type_names = [x['id']['index'] for x in dash.ctx.inputs_list[0] if x.get('value', False)]
-        comparison_weight_names = [x['id']['index'] for x in dash.ctx.inputs_list[1] if x.get('value', False)]
+        comparison_weights = {x['id']['index']: x['value'] for x in dash.ctx.inputs_list[1] if x.get('value', False)}
 
         origin_file_meta = self.catalogue_data.get_metadata_by_file(origin_file_path)
         target_file_meta = self.catalogue_data.get_metadata_by_file(target_file_path)
@@ -204,26 +321,137 @@ class CatalogueDataframeMatcher:
         active_target_columns = [col['name'] for col in target_columns if col['name'] not in target_hidden_columns]
         active_origin_columns = [col['name'] for col in origin_columns if col['name'] not in origin_hidden_columns]
 
+        if dash.ctx.triggered_id == "catalogue-comparison-refine-button":
+            if not percentage_data or not percentage_data.get('intervals') or not any(comparison_types):
+                return dash.no_update
+            threshold = DEFAULT_REFINE_THRESHOLD if refine_threshold is None else refine_threshold
+            if job_id:
+                self.job_manager.cancel(job_id)
+            job = self.job_manager.submit(
+                f"Refine '{origin_file_path}' with '{target_file_path}'",
+                self._refine_job,
+                comparison_type_names,
+                comparison_weights,
+                origin_file_meta,
+                target_file_meta,
+                active_target_columns,
+                percentage_data,
+                threshold
+            )
+            return dash.no_update, job.job_id, False, 0, job.status
+
+        # a new comparison replaces any that is still running
+        if job_id:
+            self.job_manager.cancel(job_id)
+
         if not any(comparison_types):
             # if no comparison types are given, reset all percentage cells to nothing (preventing updating columns)
-            return [{col_name: None for col_name in active_origin_columns} for _ in range(len(active_target_columns))]
+            reset_table = [{col_name: None for col_name in active_origin_columns} for _ in active_target_columns]
+            return {'percentages': reset_table, 'intervals': None}, None, True, 0, ""
+
+        job = self.job_manager.submit(
+            f"{'Estimate' if approximate else 'Compare'} '{origin_file_path}' with '{target_file_path}'",
+            self._compare_job,
+            comparison_type_names,
+            comparison_weights,
+            origin_file_meta,
+            target_file_meta,
+            active_origin_columns,
+            active_target_columns,
+            sample_size if approximate else None,
+            approximate
+        )
+        return dash.no_update, job.job_id, False, 0, job.status
+
+    def _poll_comparison_job(self, job_id):
+        """
+        Report the progress of a comparison job, returning its percentage table once it's complete
+        A completed job's label shows the time spent on each comparison type
+        """
+        job = self.job_manager.get(job_id) if job_id else None
+        if job is None:
+            return dash.no_update, dash.no_update, True, 0, ""
+        if not job.done:
+            return dash.no_update, dash.no_update, False, job.progress_percentage(), job.message or job.status
+        if job.result is None:
+            return dash.no_update, dash.no_update, True, job.progress_percentage(), job.error or job.status
+
+        timing_label = ", ".join(
+            f"{comparison_type}: {seconds:.2f}s" for comparison_type, seconds in job.result['timings'].items()
+        )
+        percentage_data = {'percentages': job.result['table'], 'intervals': job.result['intervals']}
+        return percentage_data, dash.no_update, True, job.progress_percentage(), timing_label or job.status
 
-        percentage_data = self.catalogue_data.get_dataframe_comparisons(
+    def _compare_job(self, job, comparison_type_names, comparison_weights, origin_file_meta, target_file_meta,
+                     active_origin_columns, active_target_columns, sample_size=None, approximate=False):
+        timings = {}
+        comparison_args = (
             comparison_type_names,
-            comparison_weight_names,
+            comparison_weights,
             origin_file_meta,
             target_file_meta,
             active_origin_columns,
             active_target_columns
         )
+        bounds = None
+        if approximate:
+            estimates = self.catalogue_data.get_approximate_dataframe_comparisons(
+                *comparison_args, sample_size=sample_size, job=job, timings=timings
+            )
+            percentage_data = {
+                origin_key: {target_key: estimate[0] for target_key, estimate in targets.items()}
+                for origin_key, targets in estimates.items()
+            }
+            bounds = {
+                origin_key: {target_key: list(estimate[1:]) for target_key, estimate in targets.items()}
+                for origin_key, targets in estimates.items()
+            }
+        else:
+            percentage_data = self.catalogue_data.get_dataframe_comparisons(*comparison_args, job=job, timings=timings)
 
         # data table format is as follows: [{col_name: row_val0}, {col_name: row_val1}]
         percentage_table = [
             {origin_key: percentage_data[origin_key][target_key] for origin_key in percentage_data.keys()}
             for target_key in active_target_columns
         ]
+        intervals = [
+            {origin_key: bounds[origin_key][target_key] for origin_key in bounds.keys()}
+            for target_key in active_target_columns
+        ] if bounds is not None else None
+        return {'table': percentage_table, 'intervals': intervals, 'timings': timings}
 
-        return percentage_table
+    def _refine_job(self, job, comparison_type_names, comparison_weights, origin_file_meta, target_file_meta,
+                    active_target_columns, percentage_data, threshold):
+        """
+        Rescore exactly the approximate cells whose upper confidence bound reaches the threshold
+        The rest of the table is kept as it is
+        """
+        percentage_table = [dict(row) for row in percentage_data['percentages']]
+        intervals = [dict(row) for row in percentage_data['intervals']]
+        column_pairs = [
+            (origin_key, target_key)
+            for target_key, row_intervals in zip(active_target_columns, intervals)
+            for origin_key, bounds in row_intervals.items()
+            if bounds is not None and bounds[1] >= threshold
+        ]
+        timings = {}
+        if column_pairs:
+            percentage_data = self.catalogue_data.get_dataframe_comparisons(
+                comparison_type_names,
+                comparison_weights,
+                origin_file_meta,
+                target_file_meta,
+                None,
+                None,
+                job=job,
+                timings=timings,
+                column_pairs=column_pairs
+            )
+            target_rows = {target_key: row_index for row_index, target_key in enumerate(active_target_columns)}
+            for origin_key, target_key in column_pairs:
+                percentage_table[target_rows[target_key]][origin_key] = percentage_data[origin_key][target_key]
+                intervals[target_rows[target_key]][origin_key] = None
+        return {'table': percentage_table, 'intervals': intervals, 'timings': timings}
 
     @callback(
         Output("catalogue-selected-column-relationships", 'children'),
@@ -275,17 +503,14 @@ class CatalogueDataframeMatcher:
     )
     def update_relationships(self, n_clicks, active_relations, origin_file_path, target_file_path):
         """
-        If the button has been pressed, update the column relationships
+        If the button has been pressed, update the column relationships in one batch
         """
         if not n_clicks:
             return dash.no_update
 
-        for col_pair, certainty in self._flatten_dict(active_relations).items():
-            origin_col, target_col = col_pair
-            self.catalogue_data.update_relationships(
-                origin_file_path, target_file_path, origin_col, target_col, certainty
-            )
-
+        self.catalogue_data.update_relationships(
+            origin_file_path, target_file_path, self._flatten_dict(active_relations or {}), method="Matcher"
+        )
         return True
 
     @staticmethod
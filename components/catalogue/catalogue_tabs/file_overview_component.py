@@ -1,27 +1,33 @@
 import copy
+import os
+from urllib.parse import urlencode
 
 import dash
-from dash import html, dash_table, dcc
+import flask
+from dash import html, dash_table
 from dash import Input, Output, State, ctx, ALL
 import dash_bootstrap_components as dbc
 
 from discovery.metadata import NumericColMetadata
-from utils.component_decorators import component, callback
+from utils.component_decorators import component, callback, route
+from utils.streaming import gzip_chunks
+from utils.table_queries import paged_table_options
 
+TABLE_PAGE_SIZE = 10
 
-@component(name="catalogue_file_overview", required_data=["local_data_catalogue"])
+
+@component(name="catalogue_file_overview", required_data=["local_data_catalogue", "app_context"])
 class CatalogueFileOverview:
-    def __init__(self, catalogue_data):
+    def __init__(self, catalogue_data, app_context):
         self.catalogue_data = catalogue_data
+        self.download_path = f"{app_context.base_path.rstrip('/')}/download"
 
-    @staticmethod
-    def build_table_view(file_catalogue):
+    def build_table_view(self, file_catalogue):
         """
         Create an overview for a given dataframe
         """
-        file_data = file_catalogue.get_data()
         file_metadata = file_catalogue.get_metadata()
-        data_head = file_data.head().to_dict('records')
+        file_head = file_catalogue.get_head(TABLE_PAGE_SIZE)
         numeric_file_catalogue = [x for x in file_metadata.columns if isinstance(x, NumericColMetadata)]
         numeric_display_columns = ['name', 'mean', 'maximum', 'minimum']
         numeric_display_records = [{col_name: getattr(metadata, col_name) for col_name in numeric_display_columns} for
@@ -56,21 +62,90 @@ class CatalogueFileOverview:
             ),
             html.Hr(),
             dbc.Row([
-                dbc.Col(html.H2("Dataframe Head: "), width=4),
+                dbc.Col(html.H2("Dataframe: "), width=4),
                 dbc.Col([
-                    dbc.Button("Download Dataframe", id='catalogue-download-button', color="secondary")
+                    dbc.Button(
+                        "Download Dataframe",
+                        id='catalogue-download-button',
+                        color="secondary",
+                        href=self._download_url(file_catalogue.file_path),
+                        external_link=True
+                    ),
+                    dbc.Checkbox(id='catalogue-download-compress', label="Compress (gzip)", value=False)
                 ], width=4, className="d-grid gap-2")
             ], justify="between"),
-            dash_table.DataTable(data_head)
+            dash_table.DataTable(
+                file_head.to_dict('records'),
+                columns=[{"name": col, "hideable": True, "id": col} for col in file_head.columns],
+                id="catalogue-overview-data-table",
+                **paged_table_options(TABLE_PAGE_SIZE)
+            )
         ])
 
     @callback(
-        Output("download-catalogue-dataframe", "data"),
-        Input("catalogue-download-button", 'n_clicks'),
+        Output("catalogue-overview-data-table", 'data'),
+        Output("catalogue-overview-data-table", 'page_count'),
+        Input("catalogue-overview-data-table", 'page_current'),
+        Input("catalogue-overview-data-table", 'page_size'),
+        Input("catalogue-overview-data-table", 'sort_by'),
+        Input("catalogue-overview-data-table", 'filter_query'),
+        State("selected-catalogue-filename", 'data')
+    )
+    def update_table_page(self, page_current, page_size, sort_by, filter_query, file_path):
+        """
+        Page, sort and filter the dataframe on the server, only the requested page is sent back
+        """
+        file_catalogue = self.catalogue_data.get_metadata_by_file(file_path)
+        if file_catalogue is None:
+            return dash.no_update, dash.no_update
+        return self.catalogue_data.get_table_page(file_catalogue, page_current, page_size, sort_by, filter_query)
+
+    def _download_url(self, file_path, compress=False, column_names=None):
+        """ Link to the streaming download route for a file """
+        query = {"file": file_path}
+        if compress:
+            query["gzip"] = 1
+        if column_names:
+            query["columns"] = ",".join(column_names)
+        return f"{self.download_path}?{urlencode(query)}"
+
+    @callback(
+        Output("catalogue-download-button", 'href'),
+        Input("catalogue-download-compress", 'value'),
+        Input("catalogue-overview-data-table", 'hidden_columns'),
+        State("catalogue-overview-data-table", 'columns'),
         State("selected-catalogue-filename", 'data'),
-        prevent_inital_call=True
+        prevent_initial_call=True
     )
-    def download_selected_dataframe(self, n_clicks, file_path):
-        if n_clicks:
-            file_data = self.catalogue_data.get_metadata_by_file(file_path).get_data()
-            return dcc.send_data_frame(file_data.to_csv, file_path)
+    def update_download_link(self, compress, hidden_columns, columns, file_path):
+        """
+        Only download the columns that are shown in the table, the whole file is downloaded if none are hidden
+        """
+        if not hidden_columns:
+            return self._download_url(file_path, compress)
+        shown_columns = [col['id'] for col in columns if col['id'] not in hidden_columns]
+        return self._download_url(file_path, compress, shown_columns)
+
+    @route("download")
+    def download_selected_dataframe(self):
+        """
+        Stream a catalogued file as CSV in chunks, straight from disk or from the cached frame
+        Query parameters: file (catalogue path), columns (comma separated subset), gzip (1 to compress)
+        """
+        file_path = flask.request.args.get("file")
+        file_catalogue = self.catalogue_data.get_metadata_by_file(file_path)
+        if file_catalogue is None:
+            flask.abort(404)
+
+        column_names = [col for col in flask.request.args.get("columns", "").split(",") if col]
+        download_name = os.path.basename(file_path)
+        chunks = file_catalogue.iter_csv(column_names)
+        if flask.request.args.get("gzip") == "1":
+            chunks = gzip_chunks(chunks)
+            download_name = f"{download_name}.gz"
+
+        return flask.Response(
+            flask.stream_with_context(chunks),
+            mimetype="application/gzip" if download_name.endswith(".gz") else "text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{download_name}"'}
+        )
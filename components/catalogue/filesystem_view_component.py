@@ -1,46 +1,166 @@
+import dash
+import flask
 from dash import html, dcc
-from dash import Input, Output
+from dash import Input, Output, State, MATCH
 import dash_bootstrap_components as dbc
-from utils.component_decorators import component, callback
+from utils.component_decorators import component, callback, route
+from utils.directory_listing import build_directory_index
+from utils.file_tree import LazyFileTree
 
+PUSH_KEEPALIVE_SECONDS = 15
 
-@component(name="filesystem_view", required_data=["local_data_catalogue"])
+
+@component(name="filesystem_view", required_data=["local_data_catalogue", "app_context", "job_manager"])
 class FilesystemViewer:
-    def __init__(self, data_catalogue):
+    """
+    Shows the files in the catalogue as a tree, directories are only listed and rendered when they're expanded
+    The catalogue version is checked by polling, or pushed with server sent events (see assets/fileviewer_push.js),
+    expanded directories are only patched when their own listing has changed
+    Relationship discovery across the whole catalogue can be started from here
+    """
+
+    def __init__(self, data_catalogue, app_context, job_manager):
         self.data_catalogue = data_catalogue
+        self.job_manager = job_manager
+        view_config = (app_context.launch_config or {}).get("FILESYSTEM_VIEW") or {}
+        push_updates = view_config.get("update_mode", "poll") == "push"
+        self._directory_index = (None, {})
+        self.file_tree = LazyFileTree(
+            "catalogue-fileviewer-tree",
+            self._list_catalogue_directory,
+            self._build_filesystem_item,
+            page_size=view_config.get("page_size", 200)
+        )
+
         self.layout = html.Div([
             dbc.Card([
                 dbc.CardBody([
-                    html.Div(
-                        id="catalogue-fileviewer-card"
-                    )
+                    html.Div(self.file_tree.build_root(data_catalogue.file_path), id="catalogue-fileviewer-card")
+                ])
+            ]),
+            dbc.Card([
+                dbc.CardBody([
+                    dbc.Button("Discover relationships", id="catalogue-discovery-button", size="sm",
+                               className="mb-2"),
+                    dbc.Progress(id="catalogue-discovery-progress", value=0)
                 ])
             ]),
-            dcc.Interval(id="catalogue-fileviewer-poll-update", interval=10*1000)
+            dcc.Store(id="catalogue-discovery-job"),
+            dcc.Interval(id="catalogue-discovery-job-poll", interval=1000, disabled=True),
+            dcc.Store(id="catalogue-fileviewer-version"),
+            dcc.Interval(
+                id="catalogue-fileviewer-poll-update",
+                interval=view_config.get("poll_interval", 10) * 1000,
+                # with push updates the interval only fires once, to pick up the current version
+                max_intervals=1 if push_updates else -1
+            ),
+            html.Button(
+                id="catalogue-fileviewer-push-trigger",
+                hidden=True,
+                **({'data-events-url': f"{app_context.base_path.rstrip('/')}/fileviewer/events"}
+                   if push_updates else {})
+            )
         ])
 
-    def _build_filesystem_items(self):
-        # self.data_catalogue.load_files()
-        file_list = self.data_catalogue.get_loaded_files()
-        return dbc.ListGroup([
-            dbc.ListGroupItem(
-                filename, n_clicks=0, action=True,
-                id={
-                    "type": "catalogue-fileviewer",
-                    "index": filename
-                }
-            )
-            for filename in sorted(file_list)
-        ],
-            flush=True
+    @staticmethod
+    def _build_filesystem_item(filename, file_path):
+        return dbc.ListGroupItem(
+            filename, n_clicks=0, action=True,
+            id={
+                "type": "catalogue-fileviewer",
+                "index": file_path
+            }
         )
 
+    def _list_catalogue_directory(self, directory):
+        """
+        Listing of the loaded files in a directory
+        The listings of every directory are built in one pass per catalogue version
+        """
+        version, directory_index = self._directory_index
+        current_version = self.data_catalogue.get_version()
+        if version != current_version:
+            directory_index = build_directory_index(
+                self.data_catalogue.file_path, self.data_catalogue.get_loaded_files()
+            )
+            self._directory_index = (current_version, directory_index)
+        return directory_index.get(directory, [])
+
+    @callback(
+        Output("catalogue-fileviewer-version", 'data'),
+        Input("catalogue-fileviewer-poll-update", 'n_intervals'),
+        Input("catalogue-fileviewer-push-trigger", 'n_clicks'),
+        State("catalogue-fileviewer-version", 'data')
+    )
+    def update_file_viewer(self, _, __, client_version):
+        """
+        Only move the client's version on if the catalogue has changed, which refreshes the expanded directories
+        """
+        version = self.data_catalogue.get_version()
+        if client_version and tuple(client_version) == version:
+            return dash.no_update
+        return version
+
     @callback(
-        Output("catalogue-fileviewer-card", 'children'),
-        Input("catalogue-fileviewer-poll-update", 'n_intervals')
+        Output({"type": "catalogue-fileviewer-tree-children", "index": MATCH}, 'children'),
+        Output({"type": "catalogue-fileviewer-tree-listing", "index": MATCH}, 'data'),
+        Output({"type": "catalogue-fileviewer-tree-more", "index": MATCH}, 'hidden'),
+        Input({"type": "catalogue-fileviewer-tree-dir", "index": MATCH}, 'n_clicks'),
+        Input({"type": "catalogue-fileviewer-tree-more", "index": MATCH}, 'n_clicks'),
+        Input("catalogue-fileviewer-version", 'data'),
+        State({"type": "catalogue-fileviewer-tree-listing", "index": MATCH}, 'data')
     )
-    def update_file_viewer(self, _):
+    def update_file_tree_directory(self, toggle_clicks, more_clicks, _, rendered_entries):
         """
-        Periodically update the loaded files
+        Expand, collapse or page a directory, or patch it if its files have changed
+        """
+        directory = dash.ctx.outputs_list[0]['id']['index']
+        return self.file_tree.update_directory(directory, toggle_clicks, more_clicks, rendered_entries)
+
+    @callback(
+        Output("catalogue-discovery-job", "data"),
+        Output("catalogue-discovery-job-poll", "disabled"),
+        Output("catalogue-discovery-progress", "value"),
+        Output("catalogue-discovery-progress", "label"),
+        Input("catalogue-discovery-button", "n_clicks"),
+        Input("catalogue-discovery-job-poll", "n_intervals"),
+        State("catalogue-discovery-job", "data"),
+        prevent_initial_call=True
+    )
+    def update_relationship_discovery(self, n_clicks, n_intervals, job_id):
         """
-        return self._build_filesystem_items()
+        Start a relationship discovery job, then poll it until it has finished
+        """
+        if dash.ctx.triggered_id == "catalogue-discovery-button":
+            job = self.data_catalogue.queue_relationship_discovery()
+            return job.job_id, False, 0, job.status
+
+        job = self.job_manager.get(job_id) if job_id else None
+        if job is None:
+            return None, True, 0, ""
+        if not job.done:
+            return dash.no_update, False, job.progress_percentage(), job.message or job.status
+        if job.result is None:
+            return dash.no_update, True, job.progress_percentage(), job.error or job.status
+        return dash.no_update, True, 100, f"Found {job.result['relationships']} relationships"
+
+    @route("fileviewer/events")
+    def stream_catalogue_changes(self):
+        """
+        Server sent events, an event is sent every time the catalogue version changes
+        """
+        def catalogue_changes():
+            _, version = self.data_catalogue.get_version()
+            while True:
+                new_version = self.data_catalogue.wait_for_change(version, timeout=PUSH_KEEPALIVE_SECONDS)
+                if new_version == version:
+                    yield ": keepalive\n\n"
+                else:
+                    version = new_version
+                    yield f"data: {version}\n\n"
+
+        return flask.Response(
+            flask.stream_with_context(catalogue_changes()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
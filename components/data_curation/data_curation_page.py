@@ -1,6 +1,9 @@
+import dash
 from dash import dcc, html
-from dash import Input, Output, State
+from dash import Input, Output, State, MATCH
 from utils.component_decorators import component, page, callback
+from utils.directory_listing import DirectoryListingCache
+from utils.file_tree import LazyFileTree
 import dash_bootstrap_components as dbc
 
 
@@ -15,9 +18,14 @@ class DataInputPage:
         self.data_catalogue = data_catalogue
         self.datagen_tab = data_generator.layout
         self.data_uploader_tab = data_uploader.layout
+        self.directory_tree = LazyFileTree(
+            "data-curation-tree", DirectoryListingCache().list, lambda filename, _: html.Div(filename)
+        )
         self.layout = dbc.Row([
             dbc.Col(
-                dbc.Card(id="data-generation-directory-tree"), width=4, style={"height": "94vh", "overflow": "scroll"}
+                dbc.Card(
+                    self.directory_tree.build_root(data_catalogue.file_path), id="data-generation-directory-tree"
+                ), width=4, style={"height": "94vh", "overflow": "scroll"}
             ),
             dbc.Col([
                 dbc.Tabs(
@@ -44,14 +52,20 @@ class DataInputPage:
         }.get(current_tab)
 
     @callback(
-        Output("data-generation-directory-tree", 'children'),
-        Input("data-generation-stub", 'value')
+        Output({"type": "data-curation-tree-children", "index": MATCH}, 'children'),
+        Output({"type": "data-curation-tree-listing", "index": MATCH}, 'data'),
+        Output({"type": "data-curation-tree-more", "index": MATCH}, 'hidden'),
+        Input({"type": "data-curation-tree-dir", "index": MATCH}, 'n_clicks'),
+        Input({"type": "data-curation-tree-more", "index": MATCH}, 'n_clicks'),
+        Input("data-generation-stub", 'value'),
+        State({"type": "data-curation-tree-listing", "index": MATCH}, 'data')
     )
-    def build_directory_tree(self, _):
-        return [
-            html.Div(line.displayable())
-            for line in self.data_catalogue.get_directory_tree()
-        ]
+    def update_directory_tree(self, toggle_clicks, more_clicks, _, rendered_entries):
+        """
+        Expand, collapse or page a directory, generating data refreshes the expanded directories
+        """
+        directory = dash.ctx.outputs_list[0]['id']['index']
+        return self.directory_tree.update_directory(directory, toggle_clicks, more_clicks, rendered_entries)
 
     @page("datain", "Data Input")
     def return_page(self):
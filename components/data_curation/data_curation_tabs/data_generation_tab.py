@@ -1,13 +1,16 @@
+import dash
 from dash import dcc, html
-from dash import Input, Output, State
+from dash import Input, Output, State, ctx
 from utils.component_decorators import component, page, callback
 import dash_bootstrap_components as dbc
 
 
-@component(name="data_generator", required_data=["local_data_generator"])
+@component(name="data_generator", required_data=["local_data_generator", "local_data_catalogue", "job_manager"])
 class DataGeneratorTab:
-    def __init__(self, data_generator):
+    def __init__(self, data_generator, data_catalogue, job_manager):
         self.data_generator = data_generator
+        self.data_catalogue = data_catalogue
+        self.job_manager = job_manager
         index_types = ['datetime', 'counter', 'categoric']
         self.layout = dbc.Card([
             dbc.Form([
@@ -39,9 +42,10 @@ class DataGeneratorTab:
                     dbc.Input(type="number", id="data-generation-file-spread", placeholder="1")
                 )
             ]),
-            dcc.Loading([
-                dbc.Button("Generate", id="data-generation-generate-data", style={'width': '100%'})
-            ])
+            dbc.Button("Generate", id="data-generation-generate-data", style={'width': '100%'}),
+            dbc.Progress(id="data-generation-progress", value=0, style={"marginTop": "10px"}),
+            dcc.Store(id="data-generation-job"),
+            dcc.Interval(id="data-generation-job-poll", interval=500, disabled=True)
         ], style={"padding": "10px"}
         )
 
@@ -57,7 +61,13 @@ class DataGeneratorTab:
 
     @callback(
         Output("data-generation-stub", 'value'),
+        Output("data-generation-job", 'data'),
+        Output("data-generation-job-poll", 'disabled'),
+        Output("data-generation-progress", 'value'),
+        Output("data-generation-progress", 'label'),
         Input("data-generation-generate-data", 'n_clicks'),
+        Input("data-generation-job-poll", 'n_intervals'),
+        State("data-generation-job", 'data'),
         State("data-generation-row-count", 'value'),
         State("data-generation-file-name", 'value'),
         State("data-generation-index-type", 'value'),
@@ -66,6 +76,31 @@ class DataGeneratorTab:
         State("data-generation-file-spread", 'value'),
         prevent_initial_call=True
     )
-    def generate_data(self, n_clicks, *generation_arguments):
-        if all(generation_arguments):
-            self.data_generator.generate_fake_data(*generation_arguments)
+    def generate_data(self, n_clicks, n_intervals, job_id, *generation_arguments):
+        """
+        Generating data runs as a background job, which is polled until it has finished
+        Note: as you can not have duplicate outputs, both pieces of logic must exist here
+        """
+        if ctx.triggered_id == "data-generation-generate-data":
+            if not all(generation_arguments):
+                return dash.no_update
+            job = self.job_manager.submit(
+                f"Generate '{generation_arguments[1]}'", self._generate_data_job, *generation_arguments
+            )
+            return dash.no_update, job.job_id, False, 0, job.status
+
+        job = self.job_manager.get(job_id)
+        if job is None:
+            return dash.no_update, dash.no_update, True, 0, ""
+        if not job.done:
+            return dash.no_update, dash.no_update, False, job.progress_percentage(), job.status
+
+        # updating the stub rebuilds the directory tree
+        return job.job_id, dash.no_update, True, job.progress_percentage(), job.error or job.status
+
+    def _generate_data_job(self, job, *generation_arguments):
+        job.set_progress(0, 2, "Generating data")
+        self.data_generator.generate_fake_data(*generation_arguments)
+        # pick up the new files straight away rather than waiting for the next rescan
+        job.set_progress(1, 2, "Profiling generated data")
+        self.data_catalogue.load_files()
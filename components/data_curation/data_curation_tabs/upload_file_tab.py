@@ -1,23 +1,39 @@
-import base64
-
-from dash import dcc, html
-from dash import Input, Output, State
-from utils.component_decorators import component, page, callback
+import flask
+from dash import html
+from utils.component_decorators import component, route
 import dash_bootstrap_components as dbc
 
 
-@component(name="data_uploader")
+@component(name="data_uploader", required_data=["local_upload_receiver", "local_data_catalogue", "app_context"])
 class DataUploaderTab:
-    def __init__(self):
+    """
+    Files are sent to the upload routes in chunks by assets/chunked_upload.js, rather than through a dash callback
+    """
+
+    def __init__(self, upload_receiver, data_catalogue, app_context):
+        self.upload_receiver = upload_receiver
+        self.data_catalogue = data_catalogue
         self.layout = dbc.Card([
             html.Header("Add files to the local catalogue"),
-            dcc.Upload(
-                id='data-upload-component',
-                children=html.Div([
-                    'Drag and Drop or ',
-                    html.A('Select Files')
-                ]),
+            html.Label([
+                'Drag and Drop or ',
+                html.A('Select Files'),
+                html.Input(
+                    id='data-upload-chunked-input',
+                    type='file',
+                    multiple=True,
+                    accept=','.join(upload_receiver.allowed_extensions),
+                    style={
+                        'position': 'absolute',
+                        'inset': 0,
+                        'opacity': 0,
+                        'cursor': 'pointer'
+                    },
+                    **{'data-upload-url': f"{app_context.base_path.rstrip('/')}/upload"}
+                )
+            ],
                 style={
+                    'position': 'relative',
                     'width': '100%',
                     'height': '60px',
                     'lineHeight': '60px',
@@ -26,25 +42,41 @@ class DataUploaderTab:
                     'borderRadius': '5px',
                     'textAlign': 'center',
                     'margin': '10px'
-                },
-                multiple=True
+                }
             ),
-            html.Div(id='data-upload-output-component')
+            html.Div(id='data-upload-output-component', style={'whiteSpace': 'pre-line'})
         ])
 
-    @callback(
-        Output('data-upload-output-component', 'children'),
-        Input('data-upload-component', 'contents'),
-        State('data-upload-component', 'filename'),
-        State('data-upload-component', 'last_modified'),
-        prevent_initial_call=True
-    )
-    def update_output(self, list_of_contents, list_of_names, list_of_dates):
-        for index, filename in enumerate(list_of_names):
-            with open(f'local_data/user_content/{filename}', 'wb') as newfile:
-                contents = list_of_contents[index]
-                content_type, content_string = contents.split(',')
-                decoded = base64.b64decode(content_string)
-                newfile.write(decoded)
+    @route("upload/<upload_id>", methods=["GET"])
+    def get_upload_status(self, upload_id):
+        """
+        Report how many bytes of an upload have been received, so that the client can resume it
+        """
+        try:
+            received = self.upload_receiver.get_received_bytes(upload_id)
+        except ValueError as e:
+            return flask.jsonify(error=str(e)), 400
+        return flask.jsonify(received=received)
+
+    @route("upload/<upload_id>", methods=["PUT"])
+    def receive_upload_chunk(self, upload_id):
+        """
+        Write the request body to the upload, starting at the offset given in the query string
+        Once the last chunk lands, the file is queued for profiling so it appears in the catalogue without a rescan
+        """
+        try:
+            accepted, received, final_path = self.upload_receiver.receive_chunk(
+                upload_id,
+                flask.request.args.get("filename"),
+                flask.request.args.get("offset", type=int),
+                flask.request.args.get("total_size", type=int),
+                flask.request.stream
+            )
+        except ValueError as e:
+            self.upload_receiver.discard(upload_id)
+            return flask.jsonify(error=str(e)), 400
 
-        return html.Div('\n'.join(list_of_names))
+        if final_path is not None:
+            self.data_catalogue.queue_file(final_path)
+        # a chunk at the wrong offset is a conflict, the client should carry on from the bytes received
+        return flask.jsonify(received=received, complete=final_path is not None), 200 if accepted else 409
@@ -0,0 +1,16 @@
+from utils.component_decorators import data
+from utils.jobs import JobManager
+
+
+@data("job_manager")
+class LocalJobManager(JobManager):
+    """
+    The app's background job pool, sized by the JOBS section of the launch config
+    """
+
+    def __init__(self, config):
+        job_config = (config or {}).get("JOBS") or {}
+        super().__init__(
+            max_workers=job_config.get("max_workers", 4),
+            max_retained_jobs=job_config.get("max_retained_jobs", 200)
+        )
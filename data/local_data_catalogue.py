@@ -1,98 +1,491 @@
-import copy
 import itertools
-import os
+import logging
+import math
+import threading
+import uuid
 
 from utils.component_decorators import data
-from discovery import DiscoveryClient
-from utils.directory_tree_visual import DisplayablePath
+from discovery import DiscoveryClient, metadata
+from utils.catalogue_entry import CatalogueEntry
+from utils.catalogue_indexer import CatalogueIndexer
+from utils.catalogue_lease import CatalogueLease
+from utils.comparison_engine import ROW_ALIGNED_METHODS, ComparisonEngine
+from utils.dtw_similarity import BandedDynamicTimeWarping
+from utils.frame_cache import FrameCache
+from utils.metadata_store import MetadataStore
+from utils.relationship_discovery import CandidateColumns, RelationshipDiscovery
+from utils.relationship_store import RelationshipStore
+from utils.series_downsampling import DownsampledSeriesCache
+from utils.shared_frames import SharedFrameStore
+from utils.table_queries import TableQueryCache
+from utils.value_index import ValueOverlapIndex
 from discovery.data_matching.matching_methods import *
-from discovery.data_matching.dataframe_matcher import DataFrameMatcher
 
+logger = logging.getLogger(__name__)
 
-@data("local_data_catalogue")
+def _is_finite(certainty):
+    try:
+        return math.isfinite(float(certainty))
+    except (TypeError, ValueError):
+        return False
+
+
+@data("local_data_catalogue", required_data=["job_manager"])
 class LocalDataCatalogue:
-    def __init__(self, config):
+    def __init__(self, config, job_manager):
         self.discovery_client = DiscoveryClient({})
+        self.job_manager = job_manager
         self.file_path = "local_data"
         self.file_catalogue_ref = {}
-        self.load_files()
+        # checksum -> {path: catalogue item} and path -> checksum, files with identical data share a checksum
+        self._items_by_checksum = {}
+        self._checksum_by_path = {}
+        self.comparison_engine = ComparisonEngine.from_config(config)
+        self.metadata_store = MetadataStore.from_config(config)
+        # only metadata is kept resident, frames are loaded on demand into a memory bounded cache
+        self.frame_cache = FrameCache.from_config(config)
+        # when several processes serve the catalogue, one of them holds the lease and indexes the data root
+        self.lease = CatalogueLease.from_config(config)
+        self.shared_frames = SharedFrameStore.from_config(config)
+        self.visual_series = DownsampledSeriesCache.from_config(config)
+        self.table_queries = TableQueryCache()
+        # MinHash signatures of every catalogued column, for finding columns that share values
+        self.value_index = ValueOverlapIndex.from_config(config)
+        self.relationship_discovery = RelationshipDiscovery.from_config(config)
+        self.relationship_store = RelationshipStore.from_config(config)
+
+        # the indexer reports new, changed and deleted files, the lock guards the catalogue while it does
+        indexer_config = (config or {}).get("CATALOGUE_INDEXER") or {}
+        self.indexer_enabled = indexer_config.get("enabled", True)
+        self._catalogue_lock = threading.RLock()
+        # every change to the set of loaded files bumps the version, the token tells versions of other instances apart
+        self.version = 0
+        self.instance_token = uuid.uuid4().hex
+        self._version_changed = threading.Condition(self._catalogue_lock)
+        self.indexer = CatalogueIndexer(
+            self.file_path,
+            on_change=self._load_file,
+            on_remove=self._evict_file,
+            interval=indexer_config.get("interval", 10),
+            submit=self._submit_scan
+        )
+        self._load_stored_metadata()
+        if self.indexes_files():
+            self.load_files()
 
         self.match_types = {
             "Match Identical Values": MatchIdenticalRows,
             "Match Pearson Coefficient": MatchDataPearsonCoefficient,
             "Match Dynamic Time Warping": MatchDataDynamicTimeWarping,
+            "Match Dynamic Time Warping (banded)": BandedDynamicTimeWarping,
             "Match Column Name (LCS)": MatchColumnNamesLCS,
             "Match Column Name (LVN)": MatchColumnNamesLevenshtein,
             "Match Column Name (wordnet)": MatchColumnNamesWordnet
         }
 
+    def start_background_work(self):
+        """ Start rescanning the data root and scheduled relationship discovery on background threads """
+        # processes forked from a preloaded catalogue inherit its token, each needs its own to tell its versions apart
+        with self._catalogue_lock:
+            self.instance_token = uuid.uuid4().hex
+        if self.indexer_enabled:
+            self.indexer.start()
+        self.relationship_discovery.start(self._run_scheduled_discovery)
+
+    def before_fork(self):
+        """
+        Let go of what can't be shared with forked processes: background threads, database connections and the lease
+        The stores reconnect when they're next used, and the forked processes take the lease between themselves
+        """
+        self.indexer.stop()
+        self.relationship_discovery.stop()
+        if self.metadata_store is not None:
+            self.metadata_store.close()
+        self.relationship_store.close()
+        if self.lease is not None:
+            self.lease.release()
+
+    def indexes_files(self):
+        """
+        Whether this process scans and profiles the data root
+        If it doesn't, another process does and this one follows the metadata store, it takes over if that one exits
+        """
+        return self.lease is None or self.lease.acquire()
+
     def load_files(self):
-        """ Load in a set of files at the data root path """
-        for new_item in self.discovery_client.scan_local_filesystem(self.file_path):
-            self.file_catalogue_ref[new_item.get_metadata().data_manifest['path']] = new_item.get_id()
-        # for root, dirs, files in os.walk(self.file_path):
-        #     for filename in files:
-        #         full_path = os.path.join(root, filename)
-        #         if full_path not in self.discovery_client.loaded_catalogue:
-        #             self.discovery_client.load_file(full_path)
+        """
+        Bring the catalogue up to date with the files at the data root path
+        Only new or changed files are profiled, deleted files are evicted. If another process indexes the data root,
+        this one only follows the metadata store, and that process picks the files up on its next rescan
+        Returns the changed and removed paths, or None if another process indexes the data root
+        """
+        if not self.indexes_files():
+            self._sync_stored_metadata()
+            return None
+        return self.indexer.scan()
+
+    def queue_file(self, file_path):
+        """
+        Profile a new or changed file as a background job, without rescanning the data root
+        Returns the job
+        """
+        return self.job_manager.submit(f"Profile '{file_path}'", lambda job: self._index_file(file_path))
+
+    def _index_file(self, file_path):
+        """ Profile a single file if this process indexes the data root, otherwise follow the metadata store """
+        if not self.indexes_files():
+            self._sync_stored_metadata()
+            return False
+        return self.indexer.index_file(file_path)
+
+    def _submit_scan(self, scan):
+        """ Run a background rescan of the data root as a job, waiting for it to finish """
+        if not self.indexes_files():
+            self._sync_stored_metadata()
+            return
+        self.job_manager.submit(f"Index '{self.file_path}'", lambda job: scan(progress=job.set_progress)).wait()
+
+    def _load_stored_metadata(self):
+        """
+        Load previously profiled files from the metadata store
+        The indexer is told about their state, so the next scan only profiles files that have changed since
+        """
+        if self.metadata_store is None:
+            return
+
+        stored_entries = self.metadata_store.load_all()
+        with self._catalogue_lock:
+            for file_path, (file_state, catalogue_entry) in stored_entries.items():
+                self._register_entry(file_path, catalogue_entry)
+                self.indexer.file_states[file_path] = file_state
+        logger.info(f"Loaded {len(stored_entries)} files from the metadata store")
+
+    def _sync_stored_metadata(self):
+        """
+        Bring the catalogue up to date with the metadata store, while another process indexes the data root
+        Entries that changed in the store are loaded, and entries that were removed from it are evicted
+        """
+        if self.metadata_store is None:
+            return
+
+        stored_states = self.metadata_store.load_states()
+        known_states = dict(self.indexer.file_states)
+        removed = [file_path for file_path in known_states if file_path not in stored_states]
+        changed = self.metadata_store.load(
+            file_path for file_path, file_state in stored_states.items() if known_states.get(file_path) != file_state
+        )
+        with self._catalogue_lock:
+            for file_path in removed:
+                self.indexer.file_states.pop(file_path, None)
+                self._evict_file(file_path)
+            for file_path, (file_state, catalogue_entry) in changed.items():
+                self._evict_file(file_path)
+                self._register_entry(file_path, catalogue_entry)
+                self.indexer.file_states[file_path] = file_state
+        if changed or removed:
+            logger.info(f"Followed {len(changed)} changed and {len(removed)} removed files from the metadata store")
+
+    def _load_file(self, file_path, file_state=None):
+        """
+        Profile a single file, replacing any previous version of it in the catalogue
+        If profiling fails, the previous version is evicted and the indexer forgets the file, so it's retried later
+        """
+        try:
+            # the client's load_file doesn't return the item, so it's built the way scan_local_filesystem does
+            new_item = metadata.from_csv(file_path)
+            new_item.rebuild_metadata_object()
+            catalogue_entry = CatalogueEntry.from_catalogue_item(new_item, file_path)
+        except Exception:
+            logger.exception(f"Failed to profile '{file_path}'")
+            with self._catalogue_lock:
+                self.indexer.file_states.pop(file_path, None)
+                self._evict_file(file_path)
+            return
+
+        with self._catalogue_lock:
+            self._evict_file(file_path)
+            self._register_entry(file_path, catalogue_entry)
+        self._store_entry(file_path, catalogue_entry)
+
+    def _register_entry(self, file_path, catalogue_entry):
+        data_checksum = catalogue_entry.get_checksum()
+        catalogue_entry.attach_frame_cache(self.frame_cache, self.shared_frames)
+        self.discovery_client.loaded_catalogue[catalogue_entry.get_id()] = catalogue_entry
+        self.file_catalogue_ref[file_path] = catalogue_entry.get_id()
+        self._items_by_checksum.setdefault(data_checksum, {})[file_path] = catalogue_entry
+        self._checksum_by_path[file_path] = data_checksum
+        self.value_index.add(data_checksum, catalogue_entry.get_column_signatures())
+        self._bump_version()
+
+    def _bump_version(self):
+        with self._version_changed:
+            self.version += 1
+            self._version_changed.notify_all()
+
+    def _store_entry(self, file_path, catalogue_entry):
+        """ Persist an entry, provided the indexer knows the state of its file """
+        file_state = self.indexer.file_states.get(file_path)
+        if self.metadata_store is not None and file_state is not None:
+            self.metadata_store.save(file_path, file_state, catalogue_entry)
+
+    def _evict_file(self, file_path):
+        """ Remove a file from the catalogue, along with any comparison scores that involve it """
+        with self._catalogue_lock:
+            item_id = self.file_catalogue_ref.pop(file_path, None)
+            catalogue_item = self.discovery_client.loaded_catalogue.pop(item_id, None)
+            data_checksum = self._checksum_by_path.pop(file_path, None)
+            checksum_items = self._items_by_checksum.get(data_checksum, {})
+            checksum_items.pop(file_path, None)
+            if not checksum_items:
+                self._items_by_checksum.pop(data_checksum, None)
+                self.value_index.remove(data_checksum)
+                if self.shared_frames is not None and data_checksum is not None and self._owns_stores():
+                    self.shared_frames.discard(data_checksum)
+            if item_id is not None:
+                self._bump_version()
+        if catalogue_item is not None:
+            self.comparison_engine.forget(catalogue_item.get_checksum())
+            self.frame_cache.discard(catalogue_item.cache_key)
+            self.visual_series.forget(catalogue_item.get_checksum())
+        if self.metadata_store is not None and file_path not in self.indexer.file_states and self._owns_stores():
+            self.metadata_store.delete(file_path)
+
+    def _owns_stores(self):
+        """ Only the indexing process removes shared metadata and frames, others only follow its changes """
+        return self.lease is None or self.lease.held
 
     def get_loaded_files(self):
         """ Get all metadata that's in memory """
-        return self.file_catalogue_ref
+        with self._catalogue_lock:
+            return dict(self.file_catalogue_ref)
+
+    def get_version(self):
+        """ A (token, version) pair that changes whenever a file is loaded, reloaded or evicted """
+        with self._catalogue_lock:
+            return self.instance_token, self.version
+
+    def wait_for_change(self, version, timeout=None):
+        """ Block until the catalogue version moves past the given version, returns the current version """
+        with self._version_changed:
+            self._version_changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
 
     def get_metadata_by_file(self, filename):
         """ Retrieve metadata from memory by file name """
-        return self.discovery_client.loaded_catalogue.get(self.file_catalogue_ref[filename])
+        with self._catalogue_lock:
+            return self.discovery_client.loaded_catalogue.get(self.file_catalogue_ref.get(filename))
 
     def get_metadata_by_hash(self, data_checksum):
         """ Retrieve metadata from memory by data checksum """
-        for catalogue_item in self.discovery_client.loaded_catalogue.values():
-            if catalogue_item.get_checksum() == data_checksum:
-                return catalogue_item
+        with self._catalogue_lock:
+            return next(iter(self._items_by_checksum.get(data_checksum, {}).values()), None)
+
+    def get_metadata_by_hashes(self, data_checksums):
+        """
+        Retrieve metadata for many data checksums at once
+        Returns {checksum: catalogue item}, checksums that aren't in the catalogue map to None
+        """
+        with self._catalogue_lock:
+            return {
+                data_checksum: next(iter(self._items_by_checksum.get(data_checksum, {}).values()), None)
+                for data_checksum in data_checksums
+            }
+
+    def get_checksum_by_file(self, filename):
+        """ Retrieve the data checksum of a file in the catalogue """
+        with self._catalogue_lock:
+            return self._checksum_by_path.get(filename)
+
+    def get_table_page(self, catalogue_item, page_current, page_size, sort_by=None, filter_query=None):
+        """ Get a single sorted and filtered page of a file, returns (records, page count) """
+        return self.table_queries.get_page(catalogue_item, page_current, page_size, sort_by, filter_query)
+
+    def get_visual_series(self, catalogue_item, column_name):
+        """ Get a numeric column downsampled for plotting """
+        return self.visual_series.get(catalogue_item, column_name)
+
+    def find_joinable_columns(self, file_path, column_name, min_containment=None, limit=None):
+        """
+        Columns of other files that share values with a column, most overlapping first
+        Returns [(file path, column name, estimated share of the smaller column's values that are shared)]
+        """
+        catalogue_item = self.get_metadata_by_file(file_path)
+        signature = catalogue_item.get_column_signatures().get(column_name) if catalogue_item else None
+        if signature is None:
+            return []
+
+        matches = self.value_index.query(signature, min_containment, limit,
+                                         exclude_checksum=catalogue_item.get_checksum())
+        related_files = self.get_metadata_by_hashes({data_checksum for data_checksum, _, _ in matches})
+        return [
+            (related_files[data_checksum].file_path, match_column, containment)
+            for data_checksum, match_column, containment in matches
+            if related_files[data_checksum] is not None
+        ]
 
     def get_dataframe_comparisons(self, comparison_types, comparison_weights, origin_catalogue, target_catalogue,
-                                  active_origin_columns, active_target_columns):
+                                  active_origin_columns, active_target_columns, job=None, timings=None,
+                                  column_pairs=None):
         """
         Get comparisons between two dataframes
-        Apply given weights and average all percentages
+        Apply given weights and average all percentages, comparison_weights maps a comparison type to its weight
+        If this is run as a job, progress is reported to it
+        If a timings dict is given, the seconds spent on each comparison type are added to it
+        If column_pairs is given, only those (origin column, target column) pairs are compared
 
         Note that with the datable format, we must preserve row order, but not column order
         """
+        match_methods = {method: self.match_types.get(method) for method in comparison_types}
+        return self.comparison_engine.compare(
+            match_methods,
+            comparison_weights,
+            origin_catalogue,
+            target_catalogue,
+            active_origin_columns,
+            active_target_columns,
+            job=job,
+            timings=timings,
+            column_pairs=column_pairs
+        )
+
+    def get_approximate_dataframe_comparisons(self, comparison_types, comparison_weights, origin_catalogue,
+                                              target_catalogue, active_origin_columns, active_target_columns,
+                                              sample_size=None, job=None, timings=None):
+        """
+        Estimate comparisons between two dataframes from a sample of their rows
+        Each similarity comes with a 95% confidence interval, as (percentage, lower bound, upper bound)
+        If no sample size is given, the comparison engine's configured size is used
+        """
+        match_methods = {method: self.match_types.get(method) for method in comparison_types}
+        return self.comparison_engine.estimate(
+            match_methods,
+            comparison_weights,
+            origin_catalogue,
+            target_catalogue,
+            active_origin_columns,
+            active_target_columns,
+            sample_size=sample_size,
+            job=job,
+            timings=timings
+        )
+
+    def _run_scheduled_discovery(self):
+        """ Scheduled runs only happen in the indexing process, so they aren't repeated by every process """
+        if self.indexes_files():
+            self.queue_relationship_discovery().wait()
 
-        origin_df = origin_catalogue.get_data().reindex(columns=active_origin_columns)
-        target_df = target_catalogue.get_data().reindex(columns=active_target_columns)
+    def queue_relationship_discovery(self):
+        """ Discover relationships across the whole catalogue as a background job, returns the job """
+        return self.job_manager.submit("Discover relationships", self.discover_relationships)
 
-        origin_meta = origin_catalogue.get_metadata()
-        target_meta = target_catalogue.get_metadata()
+    def discover_relationships(self, job=None):
+        """
+        Propose relationships between the columns of every pair of files in the catalogue
+        Column pairs are pruned with column signatures, then the candidates are scored with the configured match types.
+        Pairs scoring at least min_certainty are stored as relationships, one batch per file pair
+        Returns a summary of the run
+        """
+        discovery = self.relationship_discovery
+        discovery_method = ", ".join(discovery.match_types)
+        match_methods = {method: self.match_types[method] for method in discovery.match_types}
+        # value overlap doesn't tell whether methods that align rows will match, so numeric pairs are kept for them
+        include_numeric_pairs = any(method in ROW_ALIGNED_METHODS for method in match_methods.values())
+        with self._catalogue_lock:
+            file_items = {
+                file_path: self.get_metadata_by_file(file_path) for file_path in sorted(self.file_catalogue_ref)
+            }
 
-        match_methods = [self.match_types.get(method) for method in comparison_types]
-        df_matcher = DataFrameMatcher()
-        similarities = {}
+        signatures = {}
+        for completed, (file_path, catalogue_item) in enumerate(file_items.items(), 1):
+            signatures[file_path] = catalogue_item.get_column_signatures()
+            if job is not None:
+                job.set_progress(completed, len(file_items), f"Summarised {completed} of {len(file_items)} files")
 
-        for origin_column, target_column in itertools.product(active_origin_columns, active_target_columns):
-            similarity = df_matcher.match_columns(
-                methods=match_methods,
-                col_meta1=copy.copy(origin_meta.columns[origin_column]),
-                col_meta2=copy.copy(target_meta.columns[target_column]),
-                series1=origin_df[origin_column],
-                series2=target_df[target_column],
-                metadata1=copy.copy(origin_meta),
-                metadata2=copy.copy(target_meta),
-                weights=comparison_weights
+        file_pairs = list(itertools.combinations(file_items, 2))
+        candidates_by_pair = {
+            (origin_path, target_path): discovery.candidate_pairs(
+                signatures[origin_path], signatures[target_path], include_numeric_pairs
             )
-            similarities.setdefault(origin_column, {}).update({target_column: round(similarity[1], 2)})
+            for origin_path, target_path in file_pairs
+        }
+        # each file's candidate columns are read once for the whole run, then shared by every pair it's in
+        candidate_columns = {}
+        for (origin_path, target_path), candidates in candidates_by_pair.items():
+            candidate_columns.setdefault(origin_path, {}).update(dict.fromkeys(column for column, _ in candidates))
+            candidate_columns.setdefault(target_path, {}).update(dict.fromkeys(column for _, column in candidates))
+        candidate_items = {
+            file_path: CandidateColumns(file_items[file_path], column_names, self.frame_cache)
+            for file_path, column_names in candidate_columns.items()
+        }
 
-        return similarities
+        summary = {"files": len(file_items), "column_pairs": 0, "candidates": 0, "relationships": 0}
+        try:
+            for completed, ((origin_path, target_path), candidates) in enumerate(candidates_by_pair.items(), 1):
+                summary["column_pairs"] += len(signatures[origin_path]) * len(signatures[target_path])
+                summary["candidates"] += len(candidates)
+                # files evicted since the run started are skipped
+                if candidates and self.get_metadata_by_file(origin_path) and self.get_metadata_by_file(target_path):
+                    similarities = self.comparison_engine.compare(
+                        match_methods, {}, candidate_items[origin_path], candidate_items[target_path], None, None,
+                        column_pairs=candidates
+                    )
+                    certainties = {
+                        (origin_column, target_column): similarities[origin_column][target_column]
+                        for origin_column, target_column in candidates
+                        if similarities[origin_column][target_column] >= discovery.min_certainty
+                    }
+                    summary["relationships"] += self.update_relationships(
+                        origin_path, target_path, certainties, method=discovery_method
+                    )
+                if job is not None:
+                    job.set_progress(
+                        completed, len(file_pairs), f"Compared {completed} of {len(file_pairs)} file pairs"
+                    )
+        finally:
+            for candidate_item in candidate_items.values():
+                candidate_item.discard()
 
-    def update_relationships(self, origin_file_name, target_file_name, origin_col_name, target_col_name, certainty):
-        target_catalogue = self.get_metadata_by_file(target_file_name)
-        origin_catalogue = self.get_metadata_by_file(origin_file_name)
+        logger.info(f"Discovered {summary['relationships']} relationships from {summary['candidates']} of "
+                    f"{summary['column_pairs']} column pairs")
+        return summary
 
-        origin_metadata = origin_catalogue.get_metadata()
-        origin_metadata.columns[origin_col_name].add_relationship(certainty, target_catalogue.get_checksum(),
-                                                                  target_col_name)
+    def update_relationships(self, origin_file_name, target_file_name, certainties, method=None):
+        """
+        Store relationships between the columns of two files in one batch
+        certainties maps (origin column, target column) to a certainty, method records how they were found
+        Pairs without a finite certainty, such as columns the matcher couldn't score, aren't stored
+        Returns the number of relationships stored
+        """
+        origin_checksum = self.get_checksum_by_file(origin_file_name)
+        target_checksum = self.get_checksum_by_file(target_file_name)
+        if origin_checksum is None or target_checksum is None:
+            logger.warning(f"Not storing relationships between '{origin_file_name}' and '{target_file_name}', "
+                           f"one of them isn't in the catalogue")
+            return 0
 
-    def get_directory_tree(self):
-        return DisplayablePath.make_tree(
-            self.file_path
+        scored = {pair: certainty for pair, certainty in certainties.items() if _is_finite(certainty)}
+        if len(scored) < len(certainties):
+            logger.debug(f"Not storing {len(certainties) - len(scored)} relationships between '{origin_file_name}' "
+                         f"and '{target_file_name}' without a certainty")
+        return self.relationship_store.upsert(
+            (origin_checksum, origin_column, target_checksum, target_column, float(certainty), method)
+            for (origin_column, target_column), certainty in scored.items()
         )
+
+    def get_column_relationships(self, catalogue_item):
+        """
+        The relationships of every column of a file, whichever end of the relationship the column is at
+        Returns {column name: [(related data checksum, related column name, certainty)]}
+        """
+        data_checksum = catalogue_item.get_checksum()
+        column_relationships = {}
+        for relationship in self.relationship_store.get_by_checksum(data_checksum):
+            if relationship.origin_checksum == data_checksum:
+                column_relationships.setdefault(relationship.origin_column, []).append(
+                    (relationship.target_checksum, relationship.target_column, relationship.certainty)
+                )
+            if relationship.target_checksum == data_checksum:
+                column_relationships.setdefault(relationship.target_column, []).append(
+                    (relationship.origin_checksum, relationship.origin_column, relationship.certainty)
+                )
+        return column_relationships
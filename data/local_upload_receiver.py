@@ -0,0 +1,118 @@
+import logging
+import os
+import re
+import threading
+
+from utils.component_decorators import data
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+READ_SIZE = 64 * 1024
+
+
+@data("local_upload_receiver")
+class LocalUploadReceiver:
+    """
+    Receives files in chunks, writing each chunk straight to disk
+    Partial uploads are kept under their upload id, so an interrupted upload can resume from the bytes received.
+    They're hidden files in the upload directory itself, so the finished file is renamed on the same filesystem and
+    the indexer never picks up a partial one
+    """
+
+    def __init__(self, config):
+        upload_config = (config or {}).get("UPLOADS") or {}
+        self.upload_path = upload_config.get("path", "local_data/user_content")
+        self.max_bytes = int(upload_config.get("max_bytes", 2 * 1024 ** 3))
+        self.allowed_extensions = tuple(upload_config.get("allowed_extensions", [".csv"]))
+        # each upload is written under its own lock, so a slow client only holds up its own upload
+        self._upload_locks = {}
+        self._upload_locks_lock = threading.Lock()
+        # finished uploads take their final name under this lock, so two of them can't claim the same name
+        self._rename_lock = threading.Lock()
+        os.makedirs(self.upload_path, exist_ok=True)
+
+    def get_received_bytes(self, upload_id):
+        """ How much of an upload has been written so far """
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise ValueError("Invalid upload id")
+        partial_file = self._partial_file(upload_id)
+        return os.path.getsize(partial_file) if os.path.exists(partial_file) else 0
+
+    def receive_chunk(self, upload_id, filename, offset, total_size, stream):
+        """
+        Append a chunk read from stream to an upload
+        A chunk that doesn't start where the upload left off isn't written
+        Returns (whether the chunk was written, bytes received, final path), the final path is None until the
+        upload is complete. A file that already has the upload's name isn't overwritten, the upload is numbered instead
+        """
+        filename = self.validate(upload_id, filename, total_size)
+        partial_file = self._partial_file(upload_id)
+
+        with self._upload_lock(upload_id):
+            received = self.get_received_bytes(upload_id)
+            if offset != received:
+                return False, received, None
+
+            with open(partial_file, 'ab') as upload_file:
+                for chunk in iter(lambda: stream.read(READ_SIZE), b''):
+                    if received == 0 and b'\0' in chunk:
+                        raise ValueError("Binary files can't be uploaded")
+                    if received + len(chunk) > total_size:
+                        raise ValueError("Upload is larger than its declared size")
+                    upload_file.write(chunk)
+                    received += len(chunk)
+
+            if received < total_size:
+                return True, received, None
+
+            with self._rename_lock:
+                final_path = self._unused_path(filename)
+                os.replace(partial_file, final_path)
+            self._forget_upload_lock(upload_id)
+            logger.info(f"Received upload '{final_path}' ({received} bytes)")
+            return True, received, final_path
+
+    def discard(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            return
+        with self._upload_lock(upload_id):
+            if os.path.exists(self._partial_file(upload_id)):
+                os.remove(self._partial_file(upload_id))
+        self._forget_upload_lock(upload_id)
+
+    def validate(self, upload_id, filename, total_size):
+        """
+        Check an upload can be accepted, raises a ValueError if it can't
+        Returns the filename the upload will be saved as
+        """
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise ValueError("Invalid upload id")
+        filename = os.path.basename(filename or "")
+        if not filename or filename.startswith('.'):
+            raise ValueError("Invalid file name")
+        if not filename.lower().endswith(self.allowed_extensions):
+            raise ValueError(f"Only {', '.join(self.allowed_extensions)} files can be uploaded")
+        if total_size is None or not 0 < total_size <= self.max_bytes:
+            raise ValueError(f"Uploads must be between 1 and {self.max_bytes} bytes")
+        return filename
+
+    def _partial_file(self, upload_id):
+        return os.path.join(self.upload_path, f".{upload_id}.partial")
+
+    def _unused_path(self, filename):
+        """ The path to save an upload to, numbered if a file with its name already exists """
+        stem, extension = os.path.splitext(filename)
+        final_path, copy_number = os.path.join(self.upload_path, filename), 1
+        while os.path.exists(final_path):
+            final_path = os.path.join(self.upload_path, f"{stem}_{copy_number}{extension}")
+            copy_number += 1
+        return final_path
+
+    def _upload_lock(self, upload_id):
+        with self._upload_locks_lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    def _forget_upload_lock(self, upload_id):
+        with self._upload_locks_lock:
+            self._upload_locks.pop(upload_id, None)
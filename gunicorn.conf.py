@@ -0,0 +1,48 @@
+"""
+gunicorn settings for the production entry point in wsgi.py, read from the SERVING section of launch_config.yaml
+Settings given on the command line take precedence, e.g. gunicorn --workers 8
+The catalogue is only shared between workers if SERVING.workers is more than 1, or SHARED_CATALOGUE is enabled
+"""
+
+import yaml
+
+from utils.catalogue_lease import catalogue_is_shared
+
+_launch_config = yaml.safe_load(open("launch_config.yaml")) or {}
+_serving_config = _launch_config.get("SERVING") or {}
+
+wsgi_app = "wsgi:server"
+bind = f"{_serving_config.get('host', '0.0.0.0')}:{_serving_config.get('port', 7245)}"
+workers = int(_serving_config.get("workers", 1))
+# threaded workers, server sent events hold a thread for as long as a page is open
+worker_class = "gthread"
+threads = int(_serving_config.get("threads", 8))
+# build the app, and so the catalogue, once before forking, workers start with a copy of it instead of loading their own
+preload_app = bool(_serving_config.get("preload", True))
+timeout = int(_serving_config.get("timeout", 120))
+keepalive = int(_serving_config.get("keepalive", 5))
+
+
+def on_starting(server):
+    """
+    Refuse to start several workers that would each index the data root, the catalogue is built from the launch
+    config, so it's only shared if SERVING.workers or SHARED_CATALOGUE says so, not --workers on the command line
+    """
+    if server.cfg.workers > 1 and not catalogue_is_shared(_launch_config):
+        raise RuntimeError(
+            f"Serving with {server.cfg.workers} workers needs a shared catalogue, set SERVING.workers or enable "
+            f"SHARED_CATALOGUE in launch_config.yaml"
+        )
+
+
+def when_ready(server):
+    """ The app was preloaded in this process, release what the workers can't share before they're forked """
+    if server.cfg.preload_app:
+        import wsgi
+        wsgi.app.before_fork()
+
+
+def post_worker_init(worker):
+    """ Start background work in each worker, with a shared catalogue only the lease holder indexes """
+    import wsgi
+    wsgi.app.start_background_work()
@@ -0,0 +1,39 @@
+from utils.catalogue_indexer import CatalogueIndexer
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_only_csv_files_are_indexed(tmp_path):
+    write(tmp_path / "data.csv", "id\n1\n")
+    write(tmp_path / "nested" / "upper.CSV", "id\n2\n")
+    write(tmp_path / "README", "notes")
+    write(tmp_path / "nested" / "archive.csv.gz", "not a csv")
+    write(tmp_path / "nested" / "sheet.xlsx", "not a csv")
+    write(tmp_path / ".hidden.csv", "id\n3\n")
+    changed_paths = []
+    indexer = CatalogueIndexer(str(tmp_path), on_change=lambda path, state: changed_paths.append(path),
+                               on_remove=lambda path: None)
+
+    changed, removed = indexer.scan()
+
+    assert sorted(changed) == sorted([str(tmp_path / "data.csv"), str(tmp_path / "nested" / "upper.CSV")])
+    assert sorted(changed_paths) == sorted(changed)
+    assert removed == []
+    assert not indexer.index_file(str(tmp_path / "README"))
+
+
+def test_rescan_reports_only_changes(tmp_path):
+    write(tmp_path / "first.csv", "id\n1\n")
+    write(tmp_path / "second.csv", "id\n2\n")
+    removed_paths = []
+    indexer = CatalogueIndexer(str(tmp_path), on_change=lambda path, state: None, on_remove=removed_paths.append)
+    indexer.scan()
+
+    write(tmp_path / "first.csv", "id\n1\n10\n")
+    (tmp_path / "second.csv").unlink()
+
+    assert indexer.scan() == ([str(tmp_path / "first.csv")], [str(tmp_path / "second.csv")])
+    assert removed_paths == [str(tmp_path / "second.csv")]
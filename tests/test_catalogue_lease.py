@@ -0,0 +1,50 @@
+import multiprocessing
+
+import pytest
+
+from utils.catalogue_lease import CatalogueLease, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="file locks aren't available on this platform")
+
+
+def try_acquire(lease, results):
+    """ Run in a forked process, reports whether the inherited lease is held and whether it can be taken """
+    results.put((lease.held, lease.acquire()))
+
+
+def test_only_one_lease_is_held(tmp_path):
+    lock_path = str(tmp_path / "catalogue.lock")
+    first_lease, second_lease = CatalogueLease(lock_path), CatalogueLease(lock_path)
+
+    assert first_lease.acquire()
+    assert first_lease.acquire()
+    assert not second_lease.acquire()
+    assert not second_lease.held
+
+    first_lease.release()
+    assert not first_lease.held
+    assert second_lease.acquire()
+    second_lease.release()
+
+
+def test_forked_process_cant_take_a_held_lease(tmp_path):
+    lease = CatalogueLease(str(tmp_path / "catalogue.lock"))
+    assert lease.acquire()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    child = context.Process(target=try_acquire, args=(lease, results))
+    child.start()
+    child.join(timeout=30)
+    assert results.get(timeout=5) == (False, False)
+    # the child's attempt doesn't affect the parent's lease
+    assert lease.held
+
+    lease.release()
+    child = context.Process(target=try_acquire, args=(lease, results))
+    child.start()
+    child.join(timeout=30)
+    assert results.get(timeout=5) == (False, True)
+    # the lease is let go when the process holding it exits
+    assert lease.acquire()
+    lease.release()
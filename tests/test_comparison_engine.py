@@ -0,0 +1,71 @@
+import pytest
+from discovery import metadata
+from discovery.data_matching.matching_methods import MatchColumnNamesLevenshtein, MatchIdenticalRows
+
+from utils.catalogue_entry import CatalogueEntry
+from utils.comparison_engine import ComparisonEngine
+
+
+class FailingMethod:
+    """ A matching method that raises for every pair, DataFrameMatcher logs it and skips the method """
+    name = "Failing"
+
+    def run_process(self, **kwargs):
+        raise ValueError("can't score this pair")
+
+
+def catalogue_entry(path, text):
+    path.write_text(text)
+    catalogue_item = metadata.from_csv(str(path))
+    catalogue_item.rebuild_metadata_object()
+    return CatalogueEntry.from_catalogue_item(catalogue_item, str(path))
+
+
+@pytest.fixture
+def entries(tmp_path):
+    return (
+        catalogue_entry(tmp_path / "customers.csv", "customer_id,name\n1,ann\n2,bob\n3,cy\n"),
+        catalogue_entry(tmp_path / "orders.csv", "order_id,cust_id\n10,1\n11,2\n12,2\n")
+    )
+
+
+def compare(engine, match_methods, weights, entries):
+    origin, target = entries
+    return engine.compare(match_methods, weights, origin, target, ["customer_id", "name"], ["order_id", "cust_id"])
+
+
+def test_failed_methods_are_left_out_of_the_average(entries):
+    engine = ComparisonEngine(executor="serial")
+    expected = compare(engine, {"LVN": MatchColumnNamesLevenshtein, "Identical": MatchIdenticalRows}, {}, entries)
+
+    similarities = compare(
+        engine, {"LVN": MatchColumnNamesLevenshtein, "Identical": MatchIdenticalRows, "Failing": FailingMethod},
+        {"Failing": 5}, entries
+    )
+
+    assert similarities == expected
+    assert similarities["customer_id"]["cust_id"] > 0
+    assert compare(engine, {"Failing": FailingMethod}, {}, entries) == {
+        "customer_id": {"order_id": 0, "cust_id": 0}, "name": {"order_id": 0, "cust_id": 0}
+    }
+
+
+def test_estimates_leave_failed_methods_out(entries):
+    engine = ComparisonEngine(executor="serial", sample_batches=2)
+    origin, target = entries
+    expected = engine.estimate({"Identical": MatchIdenticalRows}, {}, origin, target, ["customer_id"], ["cust_id"])
+
+    estimates = engine.estimate(
+        {"Identical": MatchIdenticalRows, "Failing": FailingMethod}, {}, origin, target, ["customer_id"], ["cust_id"]
+    )
+
+    assert estimates == expected
+
+
+def test_a_zero_weight_leaves_a_method_out(entries):
+    engine = ComparisonEngine(executor="serial")
+    expected = compare(engine, {"LVN": MatchColumnNamesLevenshtein}, {}, entries)
+
+    match_methods = {"LVN": MatchColumnNamesLevenshtein, "Identical": MatchIdenticalRows}
+    assert compare(engine, match_methods, {"Identical": 0}, entries) == expected
+    assert compare(engine, match_methods, {}, entries) != expected
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from utils.dtw_similarity import BandedDynamicTimeWarping, band_envelopes, banded_dtw_distances, lb_keogh
+
+
+def reference_dtw(first, second, radius=None):
+    """ Textbook squared DTW, one cell at a time, with an optional Sakoe-Chiba band """
+    length = len(first)
+    radius = length if radius is None else radius
+    costs = np.full((length + 1, length + 1), np.inf)
+    costs[0, 0] = 0
+    for i in range(1, length + 1):
+        for j in range(max(1, i - radius), min(length, i + radius) + 1):
+            costs[i, j] = (first[i - 1] - second[j - 1]) ** 2 + min(
+                costs[i - 1, j], costs[i, j - 1], costs[i - 1, j - 1]
+            )
+    return costs[length, length]
+
+
+def random_series(count, length, seed):
+    return np.random.default_rng(seed).normal(size=(count, length)).cumsum(axis=1)
+
+
+def test_full_band_matches_unbanded_reference():
+    first, second = random_series(6, 24, seed=1), random_series(6, 24, seed=2)
+    distances = banded_dtw_distances(first, second, radius=24)
+    expected = [reference_dtw(first_row, second_row) for first_row, second_row in zip(first, second)]
+    np.testing.assert_allclose(distances, expected)
+
+
+def test_banded_distances_match_banded_reference():
+    first, second = random_series(6, 30, seed=3), random_series(6, 30, seed=4)
+    for radius in (0, 1, 3, 7):
+        distances = banded_dtw_distances(first, second, radius)
+        expected = [reference_dtw(first_row, second_row, radius) for first_row, second_row in zip(first, second)]
+        np.testing.assert_allclose(distances, expected)
+
+
+def test_band_never_shortens_the_warping_path():
+    first, second = random_series(8, 32, seed=5), random_series(8, 32, seed=6)
+    assert np.all(banded_dtw_distances(first, second, 2) >= banded_dtw_distances(first, second, 32) - 1e-9)
+
+
+def test_lb_keogh_is_a_lower_bound():
+    queries, candidates = random_series(10, 40, seed=7), random_series(12, 40, seed=8)
+    for radius in (0, 2, 5):
+        upper, lower = band_envelopes(candidates, radius)
+        bounds = lb_keogh(queries, upper, lower)
+        for query_index, query in enumerate(queries):
+            distances = banded_dtw_distances(np.repeat(query[np.newaxis], len(candidates), axis=0), candidates, radius)
+            assert np.all(bounds[query_index] <= distances + 1e-9)
+
+
+def test_similarity_matrix_scores():
+    x = np.linspace(0, 6, 500)
+    origin = pd.DataFrame({"sine": np.sin(x), "name": ["a"] * 500})
+    target = pd.DataFrame({"shifted": np.sin(x) * 3 + 10, "opposite": -np.sin(x), "constant": np.ones(500)})
+    scores = BandedDynamicTimeWarping(length=64, window=0.1, min_similarity=20).similarity_matrix(origin, target)
+
+    assert scores.shape == (2, 3)
+    # z-normalisation makes scaled and shifted series identical
+    assert scores[0, 0] == 100
+    assert scores[0, 1] < 20
+    assert np.all(scores[1] == 0)
@@ -0,0 +1,77 @@
+import pytest
+
+from data.local_data_catalogue import LocalDataCatalogue
+from utils.jobs import JobManager
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    """ The catalogue reads from local_data and keeps its stores in .catalogue_cache, both relative to the cwd """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "local_data").mkdir()
+    return tmp_path / "local_data"
+
+
+@pytest.fixture
+def build_catalogue():
+    """ Builds catalogues without background rescans, their stores and leases are let go after the test """
+    catalogues = []
+
+    def build(config=None):
+        catalogues.append(
+            LocalDataCatalogue({"CATALOGUE_INDEXER": {"enabled": False}, **(config or {})}, JobManager())
+        )
+        return catalogues[-1]
+
+    yield build
+    for catalogue in catalogues:
+        catalogue.before_fork()
+
+
+def test_csv_files_are_profiled_through_the_discovery_client(data_root, build_catalogue):
+    (data_root / "customers.csv").write_text("customer_id,name,balance\n1,ann,10.5\n2,bob,20.25\n3,cy,30\n")
+    (data_root / "README").write_text("not data")
+
+    catalogue = build_catalogue()
+
+    assert list(catalogue.get_loaded_files()) == ["local_data/customers.csv"]
+    catalogue_item = catalogue.get_metadata_by_file("local_data/customers.csv")
+    assert list(catalogue_item.get_metadata().columns) == ["customer_id", "name", "balance"]
+    assert catalogue_item.get_row_count() == 3
+    assert catalogue_item.get_data()["balance"].tolist() == [10.5, 20.25, 30]
+    assert catalogue.get_metadata_by_hash(catalogue_item.get_checksum()) is catalogue_item
+
+
+def test_profiled_files_are_reloaded_from_the_metadata_store(data_root, build_catalogue):
+    (data_root / "customers.csv").write_text("customer_id,name\n1,ann\n2,bob\n")
+    checksum = build_catalogue().get_metadata_by_file("local_data/customers.csv").get_checksum()
+
+    catalogue = build_catalogue()
+
+    assert catalogue.get_metadata_by_file("local_data/customers.csv").get_checksum() == checksum
+
+
+def test_only_one_of_several_workers_indexes_the_data_root(data_root, build_catalogue):
+    (data_root / "customers.csv").write_text("customer_id,name\n1,ann\n2,bob\n")
+    config = {"SERVING": {"workers": 2}, "SHARED_CATALOGUE": {"enabled": False, "share_frames": False}}
+
+    indexing_catalogue, following_catalogue = build_catalogue(config), build_catalogue(config)
+
+    assert indexing_catalogue.indexes_files()
+    assert not following_catalogue.indexes_files()
+    # the second catalogue follows the metadata store the first one writes
+    assert list(following_catalogue.get_loaded_files()) == ["local_data/customers.csv"]
+
+    (data_root / "orders.csv").write_text("order_id,customer_id\n1,1\n")
+    assert following_catalogue.load_files() is None
+    assert list(following_catalogue.get_loaded_files()) == ["local_data/customers.csv"]
+    indexing_catalogue.load_files()
+    following_catalogue.load_files()
+    assert sorted(following_catalogue.get_loaded_files()) == ["local_data/customers.csv", "local_data/orders.csv"]
+
+
+def test_a_single_worker_indexes_without_a_lease(data_root, build_catalogue):
+    catalogue = build_catalogue({"SERVING": {"workers": 1}})
+
+    assert catalogue.lease is None
+    assert catalogue.indexes_files()
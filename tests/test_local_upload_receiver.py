@@ -0,0 +1,94 @@
+import io
+import os
+import threading
+
+import pytest
+
+from data.local_upload_receiver import LocalUploadReceiver
+from utils.catalogue_indexer import CatalogueIndexer
+
+
+class SlowStream:
+    """ A request body that sends its first part, then waits to be released before sending the rest """
+
+    def __init__(self, first_part, rest):
+        self.parts = [first_part, rest]
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size):
+        if not self.parts:
+            return b''
+        if len(self.parts) == 1:
+            self.started.set()
+            assert self.release.wait(timeout=10)
+        return self.parts.pop(0)
+
+
+@pytest.fixture
+def receiver(tmp_path):
+    return LocalUploadReceiver({"UPLOADS": {"path": str(tmp_path / "user_content")}})
+
+
+def test_upload_is_received_in_chunks(receiver):
+    assert receiver.receive_chunk("upload", "data.csv", 0, 9, io.BytesIO(b"id\n1\n")) == (True, 5, None)
+    assert receiver.get_received_bytes("upload") == 5
+    # a chunk at the wrong offset isn't written
+    assert receiver.receive_chunk("upload", "data.csv", 2, 9, io.BytesIO(b"2\n3\n")) == (False, 5, None)
+
+    accepted, received, final_path = receiver.receive_chunk("upload", "data.csv", 5, 9, io.BytesIO(b"2\n3\n"))
+
+    assert (accepted, received) == (True, 9)
+    assert final_path == os.path.join(receiver.upload_path, "data.csv")
+    with open(final_path, 'rb') as upload_file:
+        assert upload_file.read() == b"id\n1\n2\n3\n"
+    assert os.listdir(receiver.upload_path) == ["data.csv"]
+
+
+def test_partial_uploads_are_not_indexed(receiver):
+    receiver.receive_chunk("upload", "data.csv", 0, 100, io.BytesIO(b"id\n1\n"))
+    indexer = CatalogueIndexer(receiver.upload_path, on_change=lambda path, state: None, on_remove=lambda path: None)
+
+    assert indexer.scan() == ([], [])
+
+
+def test_existing_files_are_not_overwritten(receiver):
+    for upload_id, contents in [("first", b"id\n1\n"), ("second", b"id\n2\n"), ("third", b"id\n3\n")]:
+        receiver.receive_chunk(upload_id, "data.csv", 0, len(contents), io.BytesIO(contents))
+
+    for filename, contents in [("data.csv", b"id\n1\n"), ("data_1.csv", b"id\n2\n"), ("data_2.csv", b"id\n3\n")]:
+        with open(os.path.join(receiver.upload_path, filename), 'rb') as upload_file:
+            assert upload_file.read() == contents
+
+
+def test_slow_upload_doesnt_block_other_uploads(receiver):
+    slow_stream = SlowStream(b"id\n", b"1\n")
+    slow_upload = threading.Thread(
+        target=receiver.receive_chunk, args=("slow", "slow.csv", 0, 5, slow_stream), daemon=True
+    )
+    slow_upload.start()
+    assert slow_stream.started.wait(timeout=10)
+
+    results = []
+    fast_upload = threading.Thread(
+        target=lambda: results.append(receiver.receive_chunk("fast", "fast.csv", 0, 5, io.BytesIO(b"id\n2\n")))
+    )
+    fast_upload.start()
+    fast_upload.join(timeout=10)
+    slow_stream.release.set()
+    slow_upload.join(timeout=10)
+
+    assert results == [(True, 5, os.path.join(receiver.upload_path, "fast.csv"))]
+    assert sorted(os.listdir(receiver.upload_path)) == ["fast.csv", "slow.csv"]
+
+
+def test_invalid_uploads_are_rejected(receiver):
+    with pytest.raises(ValueError):
+        receiver.receive_chunk("../escape", "data.csv", 0, 5, io.BytesIO(b"id\n1\n"))
+    with pytest.raises(ValueError):
+        receiver.receive_chunk("upload", "data.xlsx", 0, 5, io.BytesIO(b"id\n1\n"))
+    with pytest.raises(ValueError):
+        receiver.receive_chunk("upload", "data.csv", 0, 5, io.BytesIO(b"id\0\n1\n"))
+    receiver.discard("upload")
+
+    assert os.listdir(receiver.upload_path) == []
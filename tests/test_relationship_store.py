@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from utils.relationship_store import RelationshipStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = RelationshipStore(str(tmp_path / "relationships.sqlite"))
+    yield store
+    store.close()
+
+
+def test_upsert_replaces_an_existing_relationship(store):
+    assert store.upsert([("a", "id", "b", "customer_id", 80.0, "Matcher"), ("a", "id", "b", "name", 60.0, None)]) == 2
+    assert store.upsert([("a", "id", "b", "customer_id", 95.0, "Discovery")]) == 1
+
+    relationships = {relationship.target_column: relationship for relationship in store.get_by_checksum("a")}
+    assert len(relationships) == 2
+    assert (relationships["customer_id"].certainty, relationships["customer_id"].method) == (95.0, "Discovery")
+    assert relationships["name"].certainty == 60.0
+
+
+def test_relationships_are_found_from_either_end(store):
+    store.upsert([("a", "id", "b", "customer_id", 80.0, "Matcher")])
+
+    assert [relationship.origin_column for relationship in store.get_by_column("b", "customer_id")] == ["id"]
+    assert [relationship.target_column for relationship in store.get_by_checksum("a")] == ["customer_id"]
+    assert store.get_by_column("b", "id") == []
+
+
+def test_a_failed_batch_stores_nothing(store):
+    with pytest.raises(sqlite3.IntegrityError):
+        store.upsert([("a", "id", "b", "customer_id", 80.0, "Matcher"), ("a", "id", "b", "name", None, "Matcher")])
+
+    assert store.get_by_checksum("a") == []
+
+
+def test_relationships_survive_reopening(tmp_path):
+    db_path = str(tmp_path / "relationships.sqlite")
+    first_store = RelationshipStore(db_path)
+    first_store.upsert([("a", "id", "b", "customer_id", 80.0, "Matcher")])
+    first_store.close()
+
+    second_store = RelationshipStore(db_path)
+    assert [relationship.certainty for relationship in second_store.get_by_checksum("b")] == [80.0]
+    second_store.close()
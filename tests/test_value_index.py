@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from utils.column_signatures import build_signatures
+from utils.value_index import ValueOverlapIndex
+
+
+def signatures_of(columns):
+    return build_signatures(pd.DataFrame({name: pd.Series(values) for name, values in columns.items()}))
+
+
+def indexed_columns(seed=0, column_count=300):
+    """ Columns of string values, each sharing a random share of its values with the query's 1000 values """
+    random_state = np.random.default_rng(seed)
+    columns, containments = {}, {}
+    for column_index in range(column_count):
+        size = int(random_state.integers(50, 3000))
+        shared_count = int(random_state.uniform(0, 1) * min(size, 1000))
+        shared = random_state.choice(1000, shared_count, replace=False)
+        values = [f"v{value}" for value in shared]
+        values += [f"c{column_index}_{value}" for value in range(size - shared_count)]
+        columns[f"column_{column_index}"] = values
+        containments[f"column_{column_index}"] = shared_count / min(size, 1000)
+    return columns, containments
+
+
+def test_query_recalls_overlapping_columns():
+    columns, containments = indexed_columns()
+    index = ValueOverlapIndex(min_containment=0.5, limit=len(columns))
+    for column_name, signature in signatures_of(columns).items():
+        index.add(column_name, {column_name: signature})
+    query = signatures_of({"query": [f"v{value}" for value in range(1000)]})["query"]
+
+    found = {column_name for column_name, _, _ in index.query(query)}
+    # MinHash estimates are noisy near the threshold, so recall is measured on columns clearly above it
+    expected = {column_name for column_name, containment in containments.items() if containment >= 0.6}
+    unexpected = {column_name for column_name, containment in containments.items() if containment < 0.4}
+
+    assert len(found & expected) >= 0.9 * len(expected)
+    assert len(found & unexpected) <= 0.05 * len(found)
+
+
+def test_small_column_contained_in_a_large_one_is_found():
+    index = ValueOverlapIndex(min_containment=0.5)
+    index.add("large", signatures_of({"values": [f"v{value}" for value in range(20000)]}))
+    index.add("other", signatures_of({"values": [f"w{value}" for value in range(20000)]}))
+    query = signatures_of({"query": [f"v{value}" for value in range(0, 20000, 400)]})["query"]
+
+    assert [(checksum, column_name) for checksum, column_name, _ in index.query(query)] == [("large", "values")]
+
+
+def test_removed_and_excluded_columns_are_not_returned():
+    index = ValueOverlapIndex()
+    signatures = signatures_of({"values": [f"v{value}" for value in range(500)]})
+    index.add("first", signatures)
+    index.add("second", signatures)
+    index.remove("first")
+
+    assert [checksum for checksum, _, _ in index.query(signatures["values"])] == ["second"]
+    assert index.query(signatures["values"], exclude_checksum="second") == []
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+from utils.column_signatures import build_signatures
+
+SAMPLE_CHUNK_SIZE = 100_000
+STREAM_CHUNK_BYTES = 1024 * 1024
+STREAM_CHUNK_ROWS = 50_000
+
+
+class CatalogueEntry:
+    """
+    A catalogued file
+    Only the profiled metadata is held in memory, data is read from disk on demand
+    Full frames go through the catalogue's frame cache, head, sample and column reads avoid loading the whole file
+    Full frames that aren't cached are read from the shared frame store if there is one, rather than from the CSV
+    Column signatures are built along with the profile and kept with the metadata
+    """
+
+    def __init__(self, item_id, data_checksum, metadata, file_path, column_signatures=None):
+        self.item_id = item_id
+        self.data_checksum = data_checksum
+        self.metadata = metadata
+        self.file_path = file_path
+        self.column_signatures = column_signatures
+        self.frame_cache = None
+        self.shared_frames = None
+
+    @classmethod
+    def from_catalogue_item(cls, catalogue_item, file_path):
+        """ Wrap an item that has just been profiled by the discovery client, summarising and then dropping its data """
+        return cls(
+            catalogue_item.get_id(),
+            catalogue_item.get_checksum(),
+            catalogue_item.get_metadata(),
+            file_path,
+            column_signatures=build_signatures(catalogue_item.get_data())
+        )
+
+    def attach_frame_cache(self, frame_cache, shared_frames=None):
+        self.frame_cache = frame_cache
+        self.shared_frames = shared_frames
+
+    @property
+    def cache_key(self):
+        return self.file_path, self.data_checksum
+
+    def get_id(self):
+        return self.item_id
+
+    def get_checksum(self):
+        return self.data_checksum
+
+    def get_metadata(self):
+        return self.metadata
+
+    def get_column_signatures(self):
+        """ Signatures of every column, keyed by column name, built from the whole frame if they're missing """
+        if self.column_signatures is None:
+            self.column_signatures = build_signatures(self.get_data())
+        return self.column_signatures
+
+    def get_data(self):
+        """ Get the whole frame """
+        if self.frame_cache is None:
+            return self._load_frame()
+        return self.frame_cache.get(self.cache_key, self._load_frame)
+
+    def get_head(self, row_count=5):
+        """ Get the first rows of the frame, only those rows are read if the frame isn't cached """
+        cached_frame = self._cached_frame()
+        if cached_frame is not None:
+            return cached_frame.head(row_count)
+        return self._read_frame(nrows=row_count)
+
+    def get_rows(self, start, row_count):
+        """ Get a slice of rows by position, rows after the slice aren't read if the frame isn't cached """
+        cached_frame = self._cached_frame()
+        if cached_frame is not None:
+            return cached_frame.iloc[start:start + row_count]
+        return self._read_frame(skiprows=range(1, start + 1), nrows=row_count)
+
+    def get_row_count(self):
+        return self.metadata.data_manifest['data_size']['no_of_rows']
+
+    def get_columns(self, column_names):
+        """
+        Get a subset of columns, in the order given
+        Columns that don't exist in the file are filled with NaN
+        """
+        cached_frame = self._cached_frame()
+        if cached_frame is None:
+            wanted_columns = set(column_names)
+            cached_frame = self._read_frame(usecols=lambda column_name: column_name in wanted_columns)
+        return cached_frame.reindex(columns=column_names)
+
+    def get_sample(self, row_count, seed=0):
+        """
+        Get a uniform random sample of rows, kept in file order
+        If the frame isn't cached the file is streamed in chunks, keeping at most row_count rows plus a chunk in memory
+        """
+        random_state = np.random.default_rng(seed)
+        cached_frame = self._cached_frame()
+        if cached_frame is not None:
+            if len(cached_frame) <= row_count:
+                return cached_frame
+            return cached_frame.sample(n=row_count, random_state=random_state).sort_index()
+
+        # reservoir sampling: give every row a random key and keep the rows with the smallest keys
+        sample, sample_keys = None, np.empty(0)
+        with pd.read_csv(self.file_path, chunksize=SAMPLE_CHUNK_SIZE) as chunks:
+            for chunk in chunks:
+                candidates = chunk if sample is None else pd.concat([sample, chunk])
+                candidate_keys = np.concatenate([sample_keys, random_state.random(len(chunk))])
+                kept = np.argsort(candidate_keys, kind="stable")[:row_count]
+                sample, sample_keys = candidates.iloc[kept], candidate_keys[kept]
+
+        if sample is None:
+            return self._read_frame(nrows=0)
+        return sample.sort_index()
+
+    def get_rows_at(self, positions, column_names):
+        """
+        Get the rows at the given sorted positions, and only the given columns, in the order given
+        Rows that aren't wanted are skipped without being parsed if the frame isn't cached
+        """
+        cached_frame = self._cached_frame()
+        if cached_frame is not None:
+            return cached_frame.iloc[positions].reindex(columns=column_names)
+
+        # line 0 is the header, data row i is on line i + 1
+        wanted_lines = set((np.asarray(positions) + 1).tolist())
+        wanted_columns = set(column_names)
+        return self._read_frame(
+            skiprows=lambda line: line != 0 and line not in wanted_lines,
+            usecols=lambda column_name: column_name in wanted_columns
+        ).reindex(columns=column_names)
+
+    def iter_csv(self, column_names=None):
+        """
+        Yield the file as CSV bytes in chunks, optionally only the given columns
+        The whole file is copied straight from disk, column subsets come from the cached frame or a chunked read
+        """
+        if not column_names:
+            with open(self.file_path, 'rb') as file:
+                yield from iter(lambda: file.read(STREAM_CHUNK_BYTES), b'')
+            return
+
+        cached_frame = self._cached_frame()
+        if cached_frame is not None:
+            frame = cached_frame.reindex(columns=column_names)
+            chunks = (frame.iloc[start:start + STREAM_CHUNK_ROWS] for start in range(0, len(frame), STREAM_CHUNK_ROWS))
+        else:
+            wanted_columns = set(column_names)
+            chunks = (
+                chunk.reindex(columns=column_names)
+                for chunk in pd.read_csv(self.file_path, chunksize=STREAM_CHUNK_ROWS,
+                                         usecols=lambda column_name: column_name in wanted_columns)
+            )
+
+        yield pd.DataFrame(columns=column_names).to_csv(index=False).encode()
+        for chunk in chunks:
+            yield chunk.to_csv(index=False, header=False).encode()
+
+    def _cached_frame(self):
+        if self.frame_cache is None:
+            return None
+        return self.frame_cache.peek(self.cache_key)
+
+    def _load_frame(self):
+        if self.shared_frames is None:
+            return self._read_frame()
+        return self.shared_frames.get(self.data_checksum, self._read_frame)
+
+    def _read_frame(self, **read_kwargs):
+        return pd.read_csv(self.file_path, **read_kwargs)
+
+    def __getstate__(self):
+        """ The frame cache and shared frames belong to the running catalogue, they aren't persisted """
+        state = self.__dict__.copy()
+        state['frame_cache'] = None
+        state['shared_frames'] = None
+        return state
@@ -0,0 +1,160 @@
+"""
+Incremental indexer for the files under a data root
+Each path's mtime, size and checksum is tracked, so that a rescan only reports files that were added, changed or removed
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+FileState = namedtuple("FileState", ["mtime", "size", "checksum"])
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+# only CSV files can be profiled
+INDEXED_SUFFIX = ".csv"
+
+
+def file_checksum(path):
+    """ Checksum the contents of a file, reading it in chunks """
+    file_hash = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHECKSUM_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class CatalogueIndexer:
+    """
+    Keeps track of the state of every file under a root directory
+    on_change is called with the path and state of every new or changed file, on_remove with every deleted path
+    Background scans are run through submit(scan) if it's given, which should return once the scan has finished
+    """
+
+    def __init__(self, root, on_change, on_remove, interval=10, submit=None):
+        self.root = root
+        self.on_change = on_change
+        self.on_remove = on_remove
+        self.interval = interval
+        self.submit = submit
+        self.file_states = {}
+        self._scan_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def scan(self, progress=None):
+        """
+        Compare the filesystem against the last known state
+        Only files whose mtime or size differ are checksummed, and only files whose checksum differs are reported
+        progress(completed, total) is called after each changed file is reported
+        Returns the changed and removed paths
+        """
+        with self._scan_lock:
+            changed, seen = [], set()
+            for path, stat in self._walk(self.root):
+                seen.add(path)
+                previous_state = self.file_states.get(path)
+                if previous_state and (previous_state.mtime, previous_state.size) == (stat.st_mtime_ns, stat.st_size):
+                    continue
+
+                try:
+                    checksum = file_checksum(path)
+                except OSError:
+                    # the file was removed or is being written to, pick it up on the next scan
+                    logger.debug(f"Could not checksum '{path}', skipping")
+                    continue
+
+                self.file_states[path] = FileState(stat.st_mtime_ns, stat.st_size, checksum)
+                if previous_state is None or previous_state.checksum != checksum:
+                    changed.append(path)
+
+            removed = [path for path in self.file_states if path not in seen]
+            for path in removed:
+                self.file_states.pop(path)
+
+            for path in removed:
+                self.on_remove(path)
+            for completed, path in enumerate(changed, 1):
+                try:
+                    self.on_change(path, self.file_states[path])
+                    if progress is not None:
+                        progress(completed, len(changed))
+                except BaseException:
+                    # forget files that weren't reported, so the next scan picks them up again
+                    for unreported_path in changed[completed - 1:]:
+                        self.file_states.pop(unreported_path, None)
+                    raise
+
+        if changed or removed:
+            logger.info(f"Indexed {len(changed)} changed and {len(removed)} removed files under '{self.root}'")
+        return changed, removed
+
+    def index_file(self, path):
+        """
+        Index a single file without rescanning the root, reporting it if it's new or changed
+        Returns True if the file was reported
+        """
+        if not path.lower().endswith(INDEXED_SUFFIX):
+            logger.warning(f"Not indexing '{path}', only {INDEXED_SUFFIX} files are profiled")
+            return False
+
+        with self._scan_lock:
+            try:
+                stat = os.stat(path)
+                checksum = file_checksum(path)
+            except OSError:
+                logger.warning(f"Could not index '{path}'")
+                return False
+
+            previous_state = self.file_states.get(path)
+            self.file_states[path] = FileState(stat.st_mtime_ns, stat.st_size, checksum)
+            if previous_state is not None and previous_state.checksum == checksum:
+                return False
+            self.on_change(path, self.file_states[path])
+            return True
+
+    def start(self):
+        """ Rescan the root on a background thread every interval seconds """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="catalogue-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if self.submit is not None:
+                    self.submit(self.scan)
+                else:
+                    self.scan()
+            except Exception:
+                logger.exception(f"Failed to index '{self.root}'")
+
+    @classmethod
+    def _walk(cls, directory):
+        """
+        Yield the path and stat result of every CSV file under a directory
+        Hidden files and directories (starting with ".") are ignored
+        """
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_dir():
+                    yield from cls._walk(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(INDEXED_SUFFIX):
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
@@ -0,0 +1,79 @@
+"""
+Lease on indexing the data root, for when several server processes share one catalogue
+The process holding the lease scans and profiles files and writes the shared stores, the others follow the stores
+"""
+
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def catalogue_is_shared(config):
+    """
+    Whether several server processes serve the catalogue, either because SHARED_CATALOGUE is enabled or because more
+    than one worker is configured in SERVING
+    """
+    shared_config = (config or {}).get("SHARED_CATALOGUE") or {}
+    serving_config = (config or {}).get("SERVING") or {}
+    return bool(shared_config.get("enabled", False)) or int(serving_config.get("workers", 1)) > 1
+
+
+class CatalogueLease:
+    """
+    An exclusive, non-blocking file lock
+    The lock is released by the operating system when its holder exits, so another process can take over indexing
+    """
+
+    def __init__(self, lock_path):
+        os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._pid = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a lease from the SHARED_CATALOGUE section of the launch config
+        None if the catalogue isn't shared, or if file locks aren't available, then every process indexes for itself
+        """
+        shared_config = (config or {}).get("SHARED_CATALOGUE") or {}
+        if not catalogue_is_shared(config):
+            return None
+        if fcntl is None:
+            logger.warning("File locks aren't available on this platform, every process will index the data root")
+            return None
+        return cls(shared_config.get("lock_path", ".catalogue_cache/catalogue.lock"))
+
+    @property
+    def held(self):
+        return self._lock_file is not None and self._pid == os.getpid()
+
+    def acquire(self):
+        """ Take the lease if nobody else holds it, returns whether this process holds it """
+        if self.held:
+            return True
+
+        # a lease inherited through fork belongs to the parent, the child needs its own lock file to take it
+        self._lock_file, self._pid = None, None
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._lock_file, self._pid = lock_file, os.getpid()
+        logger.info(f"Process {self._pid} took the catalogue indexing lease")
+        return True
+
+    def release(self):
+        if self.held:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+        self._lock_file, self._pid = None, None
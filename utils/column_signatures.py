@@ -0,0 +1,112 @@
+"""
+Cheap summaries of catalogued columns
+A signature holds a column's kind, cardinality, value range, a MinHash of its distinct values and the n-grams of its
+name, so that column pairs can be compared without reading either column again
+"""
+
+import numpy as np
+import pandas as pd
+
+MINHASH_PERMUTATIONS = 128
+MINHASH_SEED = 1
+MINHASH_CHUNK_SIZE = 4096
+NAME_NGRAM_SIZE = 3
+
+# multiply-add hash functions over 64 bit value hashes, an odd multiplier makes each one a permutation
+_random_state = np.random.default_rng(MINHASH_SEED)
+_MULTIPLIERS = _random_state.integers(1, np.iinfo(np.int64).max, MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_INCREMENTS = _random_state.integers(0, np.iinfo(np.int64).max, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_EMPTY_MINHASH = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+
+
+def _is_numeric(column):
+    return pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+
+
+def distinct_values(column):
+    """
+    The distinct values of a column, numbers as floats so that 1 and 1.0 are the same value, everything else as text
+    """
+    values = column.dropna()
+    values = values.astype(float) if _is_numeric(column) else values.astype(str)
+    return pd.unique(values.to_numpy())
+
+
+def minhash(values):
+    """ MinHash signature of a set of values """
+    if not len(values):
+        return _EMPTY_MINHASH.copy()
+
+    value_hashes = pd.util.hash_array(values)
+    signature = _EMPTY_MINHASH.copy()
+    # uint64 arithmetic wraps around, which is the modulus the hash functions are defined with
+    for start in range(0, len(value_hashes), MINHASH_CHUNK_SIZE):
+        chunk = value_hashes[start:start + MINHASH_CHUNK_SIZE, np.newaxis]
+        signature = np.minimum(signature, (chunk * _MULTIPLIERS + _INCREMENTS).min(axis=0))
+    return signature
+
+
+def name_ngrams(name, size=NAME_NGRAM_SIZE):
+    """ The character n-grams of a column name, padded so that short names still have some """
+    padded_name = f" {str(name).strip().lower()} "
+    return frozenset(padded_name[index:index + size] for index in range(max(len(padded_name) - size + 1, 1)))
+
+
+class ColumnSignature:
+    """
+    A summary of one column
+    minimum and maximum are only set for numeric columns
+    """
+
+    def __init__(self, name, numeric, cardinality, minimum, maximum, value_minhash, ngrams):
+        self.name = name
+        self.numeric = numeric
+        self.cardinality = cardinality
+        self.minimum = minimum
+        self.maximum = maximum
+        self.minhash = value_minhash
+        self.ngrams = ngrams
+
+    @classmethod
+    def from_column(cls, name, column):
+        values = distinct_values(column)
+        numeric = _is_numeric(column)
+        return cls(
+            name,
+            numeric,
+            len(values),
+            float(values.min()) if numeric and len(values) else None,
+            float(values.max()) if numeric and len(values) else None,
+            minhash(values),
+            name_ngrams(name)
+        )
+
+    def ranges_overlap(self, other):
+        """ Whether two numeric columns could share a value, based on their ranges alone """
+        if self.minimum is None or other.minimum is None:
+            return False
+        return self.minimum <= other.maximum and other.minimum <= self.maximum
+
+    def jaccard(self, other):
+        """ Estimated Jaccard similarity of the two columns' distinct values """
+        if not self.cardinality or not other.cardinality:
+            return 0.0
+        return float(np.mean(self.minhash == other.minhash))
+
+    def containment(self, other):
+        """ Estimated share of the smaller column's distinct values that the other column also has """
+        if not self.cardinality or not other.cardinality:
+            return 0.0
+        jaccard = self.jaccard(other)
+        shared_values = jaccard * (self.cardinality + other.cardinality) / (1 + jaccard)
+        return min(shared_values / min(self.cardinality, other.cardinality), 1.0)
+
+    def name_similarity(self, other):
+        """ Jaccard similarity of the two column names' n-grams """
+        return len(self.ngrams & other.ngrams) / len(self.ngrams | other.ngrams)
+
+
+def build_signatures(frame):
+    """ Signatures of every column of a frame, keyed by column name """
+    return {column_name: ColumnSignature.from_column(column_name, column) for column_name, column in frame.items()}
+
@@ -0,0 +1,506 @@
+"""
+Scores column pairs between two catalogued dataframes
+Pairs are scored on a worker pool, and every (file checksum, column, method) score is cached so that
+re-weighting or toggling a single method only computes the scores that are missing
+Name methods, numeric columns for the Pearson and identical value methods, and banded Dynamic Time Warping are
+scored as one origin x target matrix instead of pair by pair
+Comparisons can also be estimated from a row sample, with a confidence interval for each similarity
+"""
+
+import concurrent.futures
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from discovery.data_matching.dataframe_matcher import DataFrameMatcher
+from discovery.data_matching.matching_methods import (
+    MatchColumnNamesLCS, MatchColumnNamesLevenshtein, MatchColumnNamesWordnet, MatchDataDynamicTimeWarping,
+    MatchDataPearsonCoefficient, MatchIdenticalRows
+)
+from utils.dtw_similarity import BandedDynamicTimeWarping
+from utils.name_similarity import lcs_similarity_matrix, levenshtein_similarity_matrix, wordnet_similarity_matrix
+from utils.numeric_similarity import identical_values_matrix, pearson_similarity_matrix
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = {
+    "thread": concurrent.futures.ThreadPoolExecutor,
+    "process": concurrent.futures.ProcessPoolExecutor
+}
+
+# matching method -> function(origin names, target names) returning a matrix of percentages, or None to fall back
+NAME_MATRIX_SCORERS = {
+    MatchColumnNamesLCS: lcs_similarity_matrix,
+    MatchColumnNamesLevenshtein: levenshtein_similarity_matrix,
+    MatchColumnNamesWordnet: wordnet_similarity_matrix
+}
+
+# matching method -> function(origin frame, target frame) returning a matrix of percentages,
+# pairs it can't score are NaN and fall back to the method itself
+DATA_MATRIX_SCORERS = {
+    MatchDataPearsonCoefficient: pearson_similarity_matrix,
+    MatchIdenticalRows: identical_values_matrix
+}
+
+# methods that compare numeric series row by row, both files have to be sampled at the same row positions for them
+ROW_ALIGNED_METHODS = (MatchDataPearsonCoefficient, MatchDataDynamicTimeWarping, BandedDynamicTimeWarping)
+
+# two sided 95% critical values of Student's t distribution by degrees of freedom, larger samples use the normal value
+T_CRITICAL_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262}
+
+# Read-only comparison state for process pool workers, shipped once per worker rather than once per pair
+_WORKER_STATE = {}
+
+
+def _initialise_worker(comparison_state):
+    """ Process pool initialiser, holds the shared comparison state for the lifetime of the worker """
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(comparison_state)
+
+
+def _score_column_pair(method, origin_column, target_column, comparison_state=None):
+    """
+    Score a single column pair with a single method
+    Metadata and series are shared between pairs, so they are passed through as is instead of being copied
+    Returns (score, seconds taken), the score is None if the method failed
+    """
+    state = comparison_state or _WORKER_STATE
+    started = time.perf_counter()
+    similarity = DataFrameMatcher().match_columns(
+        methods=[method],
+        col_meta1=state['origin_meta'].columns[origin_column],
+        col_meta2=state['target_meta'].columns[target_column],
+        series1=state['origin_df'][origin_column],
+        series2=state['target_df'][target_column],
+        metadata1=state['origin_meta'],
+        metadata2=state['target_meta'],
+        weights=[1]
+    )
+    # the matcher leaves methods that raised out of its individual scores
+    score = similarity[1] if similarity[0] else None
+    return score, time.perf_counter() - started
+
+
+def _method_weights(match_methods, weights):
+    """ The weight of each method, 1 unless it's given """
+    return {method_name: float(weights.get(method_name, 1)) for method_name in match_methods}
+
+
+def _weighted_average(method_scores, method_weights):
+    """
+    Weighted average of each method's score, or of each method's array of scores
+    Methods that failed, scored None or NaN, are left out of both sides of the average, as DataFrameMatcher does.
+    The average is 0 where every method failed
+    """
+    weighted_sum = total_weight = 0
+    for method_name, scores in method_scores.items():
+        scores = np.asarray(scores, dtype=float)
+        scored = ~np.isnan(scores)
+        weighted_sum = weighted_sum + np.where(scored, scores, 0) * method_weights[method_name]
+        total_weight = total_weight + scored * method_weights[method_name]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total_weight > 0, weighted_sum / total_weight, 0)
+
+
+def stratified_positions(row_count, sample_size, seed=0):
+    """
+    Sorted row positions for a sample of sample_size rows, one drawn at random from each of sample_size equal strata
+    Every row is used if there are no more than sample_size of them
+    """
+    if row_count <= sample_size:
+        return np.arange(row_count)
+    edges = np.arange(sample_size + 1) * row_count // sample_size
+    offsets = np.random.default_rng(seed).random(sample_size) * (edges[1:] - edges[:-1])
+    return edges[:-1] + offsets.astype(int)
+
+
+class ComparisonEngine:
+    """
+    Computes weighted column similarities between two catalogue items
+    """
+
+    def __init__(self, executor="thread", max_workers=None, dynamic_time_warping=None, sample_size=10000,
+                 sample_batches=5, max_cached_scores=200_000, max_cached_estimates=50_000):
+        if executor not in EXECUTORS and executor != "serial":
+            raise ValueError(f"Unknown comparison executor '{executor}', expected one of {[*EXECUTORS, 'serial']}")
+        if sample_batches < 2:
+            raise ValueError(f"At least two sample batches are needed for a confidence interval, got {sample_batches}")
+        self.executor = executor
+        self.max_workers = max_workers
+        self.sample_size = sample_size
+        self.sample_batches = sample_batches
+        dynamic_time_warping = dynamic_time_warping or BandedDynamicTimeWarping()
+        self.data_matrix_scorers = {
+            **DATA_MATRIX_SCORERS, BandedDynamicTimeWarping: dynamic_time_warping.similarity_matrix
+        }
+        # both caches drop their least recently used entries once they hold more than their maximum
+        self.max_cached_scores = max_cached_scores
+        self.max_cached_estimates = max_cached_estimates
+        self._scores = OrderedDict()
+        # (checksums, columns, method name, sample size) -> scores on the whole sample and then on each batch
+        self._estimates = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build an engine from the COMPARISON_ENGINE section of the launch config """
+        engine_config = (config or {}).get("COMPARISON_ENGINE") or {}
+        return cls(
+            executor=engine_config.get("executor", "thread"),
+            max_workers=engine_config.get("max_workers"),
+            dynamic_time_warping=BandedDynamicTimeWarping.from_config(config),
+            sample_size=int(engine_config.get("sample_size", 10000)),
+            sample_batches=int(engine_config.get("sample_batches", 5)),
+            max_cached_scores=int(engine_config.get("max_cached_scores", 200_000)),
+            max_cached_estimates=int(engine_config.get("max_cached_estimates", 50_000))
+        )
+
+    def compare(self, match_methods, weights, origin_catalogue, target_catalogue, origin_columns, target_columns,
+                job=None, timings=None, column_pairs=None):
+        """
+        Get the weighted average similarity of every origin and target column pair
+        match_methods maps a method name to its matching method, weights maps a method name to its weight
+        If a job is given, progress is reported to it and scoring stops if it's cancelled
+        If a timings dict is given, the seconds spent scoring each method are added to it, cached scores take none
+        If column_pairs is given, only those (origin column, target column) pairs are scored
+        Methods that fail for a pair are left out of its average
+        Returns {origin_column: {target_column: percentage}}
+        """
+        if column_pairs is None:
+            column_pairs = list(itertools.product(origin_columns, target_columns))
+        pair_scores = self._exact_scores(match_methods, origin_catalogue, target_catalogue, column_pairs, job, timings)
+
+        method_weights = _method_weights(match_methods, weights)
+        similarities = {}
+        for origin_column, target_column in column_pairs:
+            similarity = _weighted_average({
+                method_name: pair_scores[(method_name, origin_column, target_column)] for method_name in match_methods
+            }, method_weights)
+            similarities.setdefault(origin_column, {}).update({target_column: round(float(similarity), 2)})
+
+        return similarities
+
+    def estimate(self, match_methods, weights, origin_catalogue, target_catalogue, origin_columns, target_columns,
+                 sample_size=None, job=None, timings=None):
+        """
+        Estimate the weighted average similarity of every origin and target column pair from a sample of rows
+        Methods that align rows sample both files at the same stratified row positions, so they still compare matching
+        rows, other methods sample each file across all of its own rows. The sample is also split into interleaved
+        batches, and the spread of the batch scores gives a 95% confidence interval. Name methods don't depend on
+        rows, so their exact scores are used
+        Returns {origin_column: {target_column: (percentage, lower bound, upper bound)}}
+        """
+        sample_size = sample_size or self.sample_size
+        origin_checksum = origin_catalogue.get_checksum()
+        target_checksum = target_catalogue.get_checksum()
+        column_pairs = list(itertools.product(origin_columns, target_columns))
+        row_methods = {
+            method_name: method for method_name, method in match_methods.items() if method not in NAME_MATRIX_SCORERS
+        }
+        name_methods = {
+            method_name: method for method_name, method in match_methods.items() if method in NAME_MATRIX_SCORERS
+        }
+
+        def estimate_key(origin_column, target_column, method_name):
+            return origin_checksum, origin_column, target_checksum, target_column, method_name, sample_size
+
+        sample_scores = self._cached(self._estimates, [
+            (method_name, origin_column, target_column)
+            for method_name in row_methods
+            for origin_column, target_column in column_pairs
+        ], estimate_key)
+        missing_scores = [
+            (method_name, origin_column, target_column)
+            for method_name in row_methods
+            for origin_column, target_column in column_pairs
+            if (method_name, origin_column, target_column) not in sample_scores
+        ]
+
+        if missing_scores:
+            new_scores = {
+                pair: np.array(scores, dtype=float)
+                for pair, scores in zip(missing_scores, self._score_sample(
+                    row_methods, missing_scores, origin_catalogue, target_catalogue, sample_size, job, timings
+                ))
+            }
+            sample_scores.update(new_scores)
+            self._store(self._estimates, self.max_cached_estimates, {
+                estimate_key(origin_column, target_column, method_name): scores
+                for (method_name, origin_column, target_column), scores in new_scores.items()
+            })
+
+        name_scores = self._exact_scores(name_methods, origin_catalogue, target_catalogue, column_pairs,
+                                         timings=timings)
+
+        method_scores = {**name_scores, **sample_scores}
+        method_weights = _method_weights(match_methods, weights)
+        similarities = {}
+        for origin_column, target_column in column_pairs:
+            # the score on the whole sample, followed by the score on each batch
+            weighted_scores = np.broadcast_to(_weighted_average({
+                method_name: method_scores[(method_name, origin_column, target_column)] for method_name in match_methods
+            }, method_weights), self.sample_batches + 1)
+
+            percentage, batch_scores = weighted_scores[0], weighted_scores[1:]
+            half_width = T_CRITICAL_95.get(len(batch_scores) - 1, 1.96) * \
+                batch_scores.std(ddof=1) / np.sqrt(len(batch_scores))
+            similarities.setdefault(origin_column, {}).update({target_column: (
+                round(float(percentage), 2),
+                round(float(max(percentage - half_width, 0)), 2),
+                round(float(min(percentage + half_width, 100)), 2)
+            )})
+
+        return similarities
+
+    def forget(self, data_checksum):
+        """ Drop every cached score and estimate that involves the given file checksum """
+        with self._lock:
+            self._scores = OrderedDict(
+                (key, score) for key, score in self._scores.items() if data_checksum not in (key[0], key[2])
+            )
+            self._estimates = OrderedDict(
+                (key, scores) for key, scores in self._estimates.items() if data_checksum not in (key[0], key[2])
+            )
+
+    def _exact_scores(self, match_methods, origin_catalogue, target_catalogue, column_pairs, job=None, timings=None):
+        """
+        Score every (origin column, target column) pair with every method on the whole files, using cached scores
+        Returns {(method name, origin column, target column): score}, the score is None if the method failed
+        """
+        origin_checksum = origin_catalogue.get_checksum()
+        target_checksum = target_catalogue.get_checksum()
+
+        def score_key(origin_column, target_column, method_name):
+            return origin_checksum, origin_column, target_checksum, target_column, method_name
+
+        # scores are read into a local dict, so entries evicted while the rest are scored are still available here
+        pair_scores = self._cached(self._scores, [
+            (method_name, origin_column, target_column)
+            for method_name in match_methods
+            for origin_column, target_column in column_pairs
+        ], score_key)
+        missing_scores = [
+            (method_name, origin_column, target_column)
+            for method_name in match_methods
+            for origin_column, target_column in column_pairs
+            if (method_name, origin_column, target_column) not in pair_scores
+        ]
+
+        if missing_scores:
+            comparison_state = {}
+
+            def get_comparison_state():
+                # only the columns that need scoring are pulled from the dataframes, and only if a scorer needs them
+                if not comparison_state:
+                    comparison_state.update({
+                        'origin_df': origin_catalogue.get_columns(
+                            list(dict.fromkeys(origin_column for _, origin_column, _ in missing_scores))
+                        ),
+                        'target_df': target_catalogue.get_columns(
+                            list(dict.fromkeys(target_column for _, _, target_column in missing_scores))
+                        ),
+                        'origin_meta': origin_catalogue.get_metadata(),
+                        'target_meta': target_catalogue.get_metadata()
+                    })
+                return comparison_state
+
+            scores = self._score_pairs(match_methods, missing_scores, get_comparison_state, job, timings)
+            pair_scores.update(zip(missing_scores, scores))
+            self._store(self._scores, self.max_cached_scores, {
+                score_key(origin_column, target_column, method_name): score
+                for (method_name, origin_column, target_column), score in zip(missing_scores, scores)
+            })
+
+        return pair_scores
+
+    def _cached(self, cache, pairs, cache_key):
+        """
+        Look up (method name, origin column, target column) pairs in a cache, marking them as recently used
+        Returns {pair: cached value} for the pairs that are cached
+        """
+        cached_values = {}
+        with self._lock:
+            for pair in pairs:
+                key = cache_key(pair[1], pair[2], pair[0])
+                if key in cache:
+                    cache.move_to_end(key)
+                    cached_values[pair] = cache[key]
+        return cached_values
+
+    def _store(self, cache, max_entries, values):
+        """ Add values to a cache, dropping the least recently used entries beyond max_entries """
+        with self._lock:
+            cache.update(values)
+            while len(cache) > max_entries:
+                cache.popitem(last=False)
+
+    def _score_sample(self, match_methods, missing_scores, origin_catalogue, target_catalogue, sample_size, job=None,
+                      timings=None):
+        """
+        Score each (method name, origin column, target column) on a row sample, then on each batch of the sample
+        Returns a tuple of scores for each, the whole sample's score first
+        """
+        origin_row_count, target_row_count = origin_catalogue.get_row_count(), target_catalogue.get_row_count()
+        aligned_scores = [pair for pair in missing_scores if match_methods[pair[0]] in ROW_ALIGNED_METHODS]
+        independent_scores = [pair for pair in missing_scores if match_methods[pair[0]] not in ROW_ALIGNED_METHODS]
+        total = (self.sample_batches + 1) * len(missing_scores)
+
+        scores = {}
+        if aligned_scores:
+            positions = stratified_positions(min(origin_row_count, target_row_count), sample_size)
+            scores.update(zip(aligned_scores, self._score_rows_at(
+                match_methods, aligned_scores, origin_catalogue, target_catalogue, positions, positions, job,
+                timings, completed_offset=0, total=total
+            )))
+        if independent_scores:
+            scores.update(zip(independent_scores, self._score_rows_at(
+                match_methods, independent_scores, origin_catalogue, target_catalogue,
+                stratified_positions(origin_row_count, sample_size),
+                stratified_positions(target_row_count, sample_size), job, timings,
+                completed_offset=(self.sample_batches + 1) * len(aligned_scores), total=total
+            )))
+        return [scores[pair] for pair in missing_scores]
+
+    def _score_rows_at(self, match_methods, missing_scores, origin_catalogue, target_catalogue, origin_positions,
+                       target_positions, job=None, timings=None, completed_offset=0, total=None):
+        """
+        Score each (method name, origin column, target column) on the rows at the given positions of each file, then
+        on each batch of those rows
+        Returns a tuple of scores for each, the whole sample's score first
+        """
+        origin_sample = origin_catalogue.get_rows_at(
+            origin_positions, list(dict.fromkeys(origin_column for _, origin_column, _ in missing_scores))
+        ).reset_index(drop=True)
+        target_sample = target_catalogue.get_rows_at(
+            target_positions, list(dict.fromkeys(target_column for _, _, target_column in missing_scores))
+        ).reset_index(drop=True)
+
+        # positions are stratified, so taking every nth sampled row keeps each batch spread across the file
+        def batch_rows(row_count):
+            return [np.arange(row_count)] + [
+                np.arange(batch, row_count, self.sample_batches) for batch in range(self.sample_batches)
+            ]
+
+        part_scores = []
+        parts = list(zip(batch_rows(len(origin_positions)), batch_rows(len(target_positions))))
+        for part_number, (origin_rows, target_rows) in enumerate(parts):
+            comparison_state = {
+                'origin_df': origin_sample.iloc[origin_rows].reset_index(drop=True),
+                'target_df': target_sample.iloc[target_rows].reset_index(drop=True),
+                'origin_meta': origin_catalogue.get_metadata(),
+                'target_meta': target_catalogue.get_metadata()
+            }
+            part_scores.append(self._score_pairs(
+                match_methods, missing_scores, lambda state=comparison_state: state, job, timings,
+                completed_offset=completed_offset + part_number * len(missing_scores),
+                total=total or len(parts) * len(missing_scores)
+            ))
+        return list(zip(*part_scores))
+
+    def _score_pairs(self, match_methods, missing_scores, get_comparison_state, job=None, timings=None,
+                     completed_offset=0, total=None):
+        """
+        Score each (method name, origin column, target column)
+        Methods with a matrix scorer are scored a matrix at a time, the rest pair by pair on the configured executor
+        get_comparison_state is only called if a scorer needs the data
+        """
+        timings = timings if timings is not None else {}
+        total = total or len(missing_scores)
+        scores = self._score_matrices(match_methods, missing_scores, get_comparison_state, timings)
+        pair_indices = [index for index in range(len(missing_scores)) if index not in scores]
+        if pair_indices:
+            pair_scores = self._score_column_pairs(
+                match_methods, [missing_scores[index] for index in pair_indices], get_comparison_state(),
+                job, completed_offset=completed_offset + len(scores), total=total
+            )
+            for index, (score, seconds) in zip(pair_indices, pair_scores):
+                scores[index] = score
+                method_name = missing_scores[index][0]
+                timings[method_name] = timings.get(method_name, 0) + seconds
+        else:
+            self._report_progress(job, completed_offset + len(scores), total)
+        return [scores[index] for index in range(len(missing_scores))]
+
+    def _score_matrices(self, match_methods, missing_scores, get_comparison_state, timings):
+        """
+        Score the missing pairs of every method that has a matrix scorer, with one matrix call per method
+        Returns {index in missing_scores: score}, pairs the matrix couldn't score are left out
+        """
+        pairs_by_method = {}
+        for index, (method_name, origin_column, target_column) in enumerate(missing_scores):
+            method = match_methods[method_name]
+            if method in NAME_MATRIX_SCORERS or method in self.data_matrix_scorers:
+                pairs_by_method.setdefault(method_name, []).append((index, origin_column, target_column))
+
+        scores = {}
+        for method_name, pairs in pairs_by_method.items():
+            method = match_methods[method_name]
+            origin_columns = list(dict.fromkeys(origin_column for _, origin_column, _ in pairs))
+            target_columns = list(dict.fromkeys(target_column for _, _, target_column in pairs))
+            if method in NAME_MATRIX_SCORERS:
+                started = time.perf_counter()
+                matrix = NAME_MATRIX_SCORERS[method](origin_columns, target_columns)
+            else:
+                state = get_comparison_state()
+                started = time.perf_counter()
+                matrix = self.data_matrix_scorers[method](
+                    state['origin_df'][origin_columns], state['target_df'][target_columns]
+                )
+            timings[method_name] = timings.get(method_name, 0) + time.perf_counter() - started
+            if matrix is None:
+                continue
+
+            origin_positions = {column: position for position, column in enumerate(origin_columns)}
+            target_positions = {column: position for position, column in enumerate(target_columns)}
+            for index, origin_column, target_column in pairs:
+                score = matrix[origin_positions[origin_column], target_positions[target_column]]
+                if not np.isnan(score):
+                    scores[index] = float(score)
+        return scores
+
+    def _score_column_pairs(self, match_methods, missing_scores, comparison_state, job=None, completed_offset=0,
+                            total=None):
+        """
+        Score each (method name, origin column, target column) on the configured executor
+        Returns a (score, seconds taken) for each
+        """
+        total = total or len(missing_scores)
+        tasks = [
+            (match_methods[method_name], origin_column, target_column)
+            for method_name, origin_column, target_column in missing_scores
+        ]
+
+        if self.executor == "serial" or self.max_workers == 1 or len(tasks) == 1:
+            scores = []
+            for task in tasks:
+                scores.append(_score_column_pair(*task, comparison_state))
+                self._report_progress(job, completed_offset + len(scores), total)
+            return scores
+
+        if self.executor == "process":
+            # ship the dataframes to each worker once, tasks then only reference column names
+            pool = EXECUTORS[self.executor](
+                max_workers=self.max_workers, initializer=_initialise_worker, initargs=(comparison_state,)
+            )
+            task_args = tasks
+        else:
+            pool = EXECUTORS[self.executor](max_workers=self.max_workers)
+            task_args = [(*task, comparison_state) for task in tasks]
+
+        logger.debug(f"Scoring {len(tasks)} column pairs on a {self.executor} pool")
+        futures = [pool.submit(_score_column_pair, *args) for args in task_args]
+        try:
+            for completed, _ in enumerate(concurrent.futures.as_completed(futures), 1):
+                self._report_progress(job, completed_offset + completed, total)
+            return [future.result() for future in futures]
+        finally:
+            # if the job was cancelled or a pair failed, don't wait on pairs that haven't started
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _report_progress(job, completed, total):
+        if job is not None:
+            job.set_progress(completed, total, f"Scored {completed} of {total} column pairs")
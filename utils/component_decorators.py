@@ -3,7 +3,7 @@ Decorators for graphical components in the dash app
 Wrapped functions are added to a list that's read into the app layout
 """
 
-from utils.component_initialiser import add_component, add_data_component, add_page, add_callback_decorator
+from utils.component_initialiser import add_component, add_data_component, add_page, add_callback_decorator, add_route
 
 
 def component(name, children: list = None, required_data: list = None):
@@ -40,6 +40,22 @@ def callback(*callback_args, **callback_kwargs):
     return app_callback_decorator
 
 
+def route(rule, **route_options):
+    """
+    Adds a route to the app's server, the rule is relative to the app's base path
+    This allows responses that shouldn't go through dash callbacks, such as file streams
+    :param rule:
+    :param route_options:
+    :return:
+    """
+
+    def route_decorator(route_function):
+        add_route(route_function, rule, route_options)
+        return route_function
+
+    return route_decorator
+
+
 def page(path, name=None, reference_component="infer"):
     """
     Adds a navigable page to the app
@@ -56,14 +72,17 @@ def page(path, name=None, reference_component="infer"):
     return page_decorator
 
 
-def data(name):
+def data(name, required_data: list = None):
     """
     Adds a data component to be accessible by app components
+    Data components are initialised with the launch config, followed by any other data components they require
     :param name:
+    :param required_data:
     """
+    required_data = required_data or []
 
     def data_decorator(data_component):
-        add_data_component(name, data_component)
+        add_data_component(name, data_component, required_data)
         return data_component
 
     return data_decorator
@@ -1,18 +1,23 @@
-import importlib.util
 import inspect
 import logging
-import os
+import threading
 
 from dash import html
 from utils.app_context import AppContext
+from utils.component_registry import discover_scripts, import_script, load_manifest, write_manifest
+from utils.startup_profiler import DISABLED_PROFILER, StartupProfiler
 
 logger = logging.getLogger(__name__)
 
 COMPONENTS = {}
 CALLBACKS = {}
+ROUTES = {}
 PAGES = {}
 DATA_COMPONENTS = {}
 
+# directories that components and data components are imported from, relative to the working directory
+COMPONENT_ROOTS = ("components", "data")
+
 
 class DefaultComponent:
     """ If a component fails to load, it gets replaced with this """
@@ -30,13 +35,13 @@ def add_component(name, component, children, required_data):
     COMPONENTS.update({name: (component, children, required_data)})
 
 
-def add_data_component(name, data_component):
+def add_data_component(name, data_component, required_data):
     """
     Adds a data component that can be accessed by using the required_data parameter
     """
     if name in DATA_COMPONENTS:
         raise f"Loaded duplicate components, name:{name}"
-    DATA_COMPONENTS.update({name: data_component})
+    DATA_COMPONENTS.update({name: (data_component, required_data)})
 
 
 def add_page(path, name, page, reference_component):
@@ -68,42 +73,143 @@ def add_callback_decorator(callback, callback_args, callback_kwargs):
         CALLBACKS.setdefault("", {}).update({callback: (callback_args, callback_kwargs)})
 
 
-def iterative_importer(path):
+def add_route(route, rule, route_options):
+    """
+    Adds a server route to the route dict
+    If the route is a class method, the reference component is the class its in
     """
-    Imports every python script from a given path
+    if route.__qualname__ != route.__name__:
+        class_name, _ = route.__qualname__.split('.', maxsplit=1)
+        ROUTES.setdefault(class_name, {}).update({route: (rule, route_options)})
+
+    else:
+        ROUTES.setdefault("", {}).update({route: (rule, route_options)})
+
+
+def register_route(app, base_path, endpoint, route, rule, route_options):
+    """
+    Registers a route on the app's server, under the app's base path
+    """
+    app.server.add_url_rule(
+        f"{base_path.rstrip('/')}/{rule.lstrip('/')}", endpoint=endpoint, view_func=route, **route_options
+    )
+
+
+def iterative_importer(path, profiler=DISABLED_PROFILER):
+    """
+    Imports every python script from a given path, under stable dotted names
     Ignores hidden files, files that begin with "." and "_" are considered hidden
+    Returns the imported scripts and the directories that were walked
 
     Path is relative to the working directory
     """
-    # Returns True if the file is hidden
+    scripts, directories = discover_scripts(path)
+    for script_path in scripts:
+        with profiler.measure("import", script_path):
+            import_script(script_path)
+    return scripts, directories
+
+
+def describe_registry(component_order):
+    """ A serialisable description of everything the imported scripts registered """
+    return {
+        "components": {
+            name: {"module": component.__module__, "class": component.__qualname__, "children": list(children),
+                   "required_data": list(required_data)}
+            for name, (component, children, required_data) in COMPONENTS.items()
+        },
+        "data_components": {
+            name: {"module": data_component.__module__, "class": data_component.__qualname__,
+                   "required_data": list(required_data)}
+            for name, (data_component, required_data) in DATA_COMPONENTS.items()
+        },
+        "pages": {
+            path: {"name": name, "module": page.__module__, "function": page.__qualname__}
+            for pages in PAGES.values() for path, (name, page, _) in pages.items()
+        },
+        "callbacks": [
+            f"{callback.__module__}.{callback.__qualname__}"
+            for callbacks in CALLBACKS.values() for callback in callbacks
+        ],
+        "component_order": list(component_order)
+    }
+
+
+def build_registry_manifest(launch_config, profiler=DISABLED_PROFILER):
+    """
+    Import every component script by discovery, and write the manifest if it's enabled
+    Returns the manifest
+    """
+    scripts, directories = [], []
+    for path in COMPONENT_ROOTS:
+        path_scripts, path_directories = iterative_importer(path, profiler)
+        scripts.extend(path_scripts)
+        directories.extend(path_directories)
 
-    check_hidden = lambda x: x.startswith('_') or x.startswith('.')
-    for root, dirs, files in os.walk(path):
-        dirs[:] = [d for d in dirs if not check_hidden(d)]
+    registry = describe_registry(build_page_component_order())
+    registry_config = (launch_config or {}).get("COMPONENT_REGISTRY") or {}
+    if not registry_config.get("enabled", False):
+        return registry
+    return write_manifest(registry_config.get("path", ".catalogue_cache/component_registry.json"), scripts,
+                          directories, registry)
+
+
+def import_components(launch_config, profiler=DISABLED_PROFILER):
+    """
+    Import every component script, returns the order components should be built in
+    Scripts are imported straight from the manifest, discovery is only used when it's missing or stale
+    """
+    registry_config = (launch_config or {}).get("COMPONENT_REGISTRY") or {}
+    manifest = None
+    if registry_config.get("enabled", False):
+        manifest = load_manifest(registry_config.get("path", ".catalogue_cache/component_registry.json"))
+        if manifest is None:
+            logger.info("Component registry manifest is missing or stale, discovering components")
+
+    if manifest is None:
+        manifest = build_registry_manifest(launch_config, profiler)
+    else:
+        for module in manifest["modules"]:
+            with profiler.measure("import", module["path"]):
+                import_script(module["path"])
 
-        for script in files:
-            if not check_hidden(script) and script.endswith('.py'):
-                spec = importlib.util.spec_from_file_location(
-                    script.rstrip('.py'), os.path.join(root, script)
-                )
-                spec.loader.exec_module(importlib.util.module_from_spec(spec))
+    return tuple(manifest["component_order"])
 
 
-def initialise_data_components(launch_config, app_context):
+def initialise_data_components(launch_config, app_context, profiler=DISABLED_PROFILER):
     """
     Initialise data components, data components are initialised with the launch config
+    and the data components they require, which are initialised first
     """
-    initialised_components = {}
-    for name, component in DATA_COMPONENTS.items():
-        component_instance = component(launch_config)
-        initialised_components[name] = component_instance
-
-    initialised_components['app_context'] = app_context
+    initialised_components = {'app_context': app_context}
+    for name in DATA_COMPONENTS:
+        initialise_data_component(name, launch_config, initialised_components, profiler=profiler)
 
     return initialised_components
 
 
-def initialise_app_components(app, component_order, data_components):
+def initialise_data_component(name, launch_config, initialised_components, requested_by=(),
+                              profiler=DISABLED_PROFILER):
+    """
+    Recursively initialise a data component after the data components it requires
+    """
+    if name in initialised_components:
+        return initialised_components[name]
+    if name in requested_by:
+        raise RecursionError(f"Cyclic data component requirements: {' -> '.join((*requested_by, name))}")
+
+    component, required_data = DATA_COMPONENTS[name]
+    data_wishlist = [
+        initialise_data_component(d_name, launch_config, initialised_components, (*requested_by, name), profiler)
+        for d_name in required_data
+    ]
+    # requirements are built above, so each measurement only covers this component's own constructor
+    with profiler.measure("data_component", name):
+        initialised_components[name] = component(launch_config, *data_wishlist)
+    return initialised_components[name]
+
+
+def initialise_app_components(app, component_order, data_components, profiler=DISABLED_PROFILER):
     """
     Initialises all callback and page components in the context of the component they're attached to
     """
@@ -114,7 +220,8 @@ def initialise_app_components(app, component_order, data_components):
         try:
             component_wishlist = [app_context.components[c_name] for c_name in component_children]
             data_wishlist = [data_components[d_name] for d_name in data_wishlist]
-            instance = component(*component_wishlist, *data_wishlist)
+            with profiler.measure("component", name):
+                instance = component(*component_wishlist, *data_wishlist)
 
         except KeyError as e:
             # Something in the wishlist doesn't exist, we should do something about this later
@@ -131,6 +238,12 @@ def initialise_app_components(app, component_order, data_components):
                     **CALLBACKS[class_name][method][1]
                 )(getattr(instance, method.__name__))
 
+        # Initialise server routes as part of the component
+        for method, (rule, route_options) in ROUTES.get(class_name, {}).items():
+            if method.__name__ in dir(instance) and method == getattr(type(instance), method.__name__):
+                register_route(app, app_context.base_path, f"{class_name}.{method.__name__}",
+                               getattr(instance, method.__name__), rule, route_options)
+
         # Initialise pages as part of the component
         for endpoint, values in PAGES.get(class_name, {}).items():
             name, page, class_name = values
@@ -142,6 +255,76 @@ def initialise_app_components(app, component_order, data_components):
     return app_context
 
 
+class LazyComponents:
+    """
+    Builds components the first time they're used rather than at startup
+    A component is built along with any of its children that haven't been built yet, in build_component_order order
+    """
+
+    def __init__(self, app_context, data_components):
+        self.app_context = app_context
+        self.data_components = data_components
+        # children are built while the lock is held by their parent's build, so the lock has to be re-entrant
+        self._lock = threading.RLock()
+
+    def get(self, name, profiler=DISABLED_PROFILER):
+        """ Get a component, building it first if it hasn't been used yet """
+        instance = self.app_context.components.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            for component_name in build_component_order(name):
+                if component_name not in self.app_context.components:
+                    component, component_children, data_wishlist = COMPONENTS[component_name]
+                    component_wishlist = [self.app_context.components[c_name] for c_name in component_children]
+                    data_wishlist = [self.data_components[d_name] for d_name in data_wishlist]
+                    with profiler.measure("component", component_name):
+                        instance = component(*component_wishlist, *data_wishlist)
+                    self.app_context.add_component(component_name, instance)
+
+        return self.app_context.components[name]
+
+    def method(self, name, method):
+        """ Stands in for a component's method, building the component when it's first called """
+
+        def lazy_method(*args, **kwargs):
+            return getattr(self.get(name), method.__name__)(*args, **kwargs)
+
+        lazy_method.__name__ = method.__name__
+        lazy_method.__doc__ = method.__doc__
+        return lazy_method
+
+
+def register_lazy_app_components(app, component_order, lazy_components):
+    """
+    Registers the callbacks, routes and pages of all components without building the components
+    Each one builds its component the first time it's called
+    """
+    app_context = lazy_components.app_context
+
+    for name in component_order:
+        component = COMPONENTS[name][0]
+        class_name = component.__name__
+
+        # Only register methods that belong to this component's class, the same as for built components
+        for method, (callback_args, callback_kwargs) in CALLBACKS.get(class_name, {}).items():
+            if method == getattr(component, method.__name__, None):
+                app.callback(*callback_args, **callback_kwargs)(lazy_components.method(name, method))
+
+        for method, (rule, route_options) in ROUTES.get(class_name, {}).items():
+            if method == getattr(component, method.__name__, None):
+                register_route(app, app_context.base_path, f"{class_name}.{method.__name__}",
+                               lazy_components.method(name, method), rule, route_options)
+
+        for endpoint, (page_name, page, _) in PAGES.get(class_name, {}).items():
+            if page == getattr(component, page.__name__, None):
+                app_context.add_page(page_name=page_name, page_url=endpoint,
+                                     page_function=lazy_components.method(name, page))
+
+    return app_context
+
+
 def build_component_order(component_name, loaded_components=()):
     """
     Recursively look for components that need to be loaded for this component to work
@@ -157,28 +340,22 @@ def build_component_order(component_name, loaded_components=()):
     return loaded_components
 
 
-def initialise(app, launch_config, base_path):
+def build_page_component_order():
     """
-    Run main initialisation steps, returns an app context
+    The order to build every component that's attached to a page in, children before their parents
     """
-    # import all components
-    iterative_importer("components")
-    iterative_importer("data")
-
-    # initialise app context
-    app_context = AppContext(base_path=base_path)
     components_list = ()
 
-    # initialise pages that aren't part of components
-    page_functions = PAGES.pop("", {})
-    for path, page_items in page_functions.items():
+    # pages that aren't part of components can still reference one
+    for path, page_items in PAGES.get("", {}).items():
         name, page, reference_component = page_items
         if reference_component:
             build_component_order(reference_component, loaded_components=components_list)
-        app_context.add_page(page_name=name, page_url=path, page_function=page)
 
     # load components that are attached to pages
-    for pages in PAGES.values():
+    for class_name, pages in PAGES.items():
+        if not class_name:
+            continue
         for path, page_items in pages.items():
             name, page, page_component = page_items
 
@@ -194,10 +371,61 @@ def initialise(app, launch_config, base_path):
 
             components_list = build_component_order(component_name, loaded_components=components_list)
 
+    return components_list
+
+
+def start_background_work(data_components):
+    """ Start the background work of every data component that has any, such as rescanning the data root """
+    for data_component in data_components.values():
+        if hasattr(data_component, "start_background_work"):
+            data_component.start_background_work()
+
+
+def before_fork(data_components):
+    """ Let every data component release what can't be shared with forked processes """
+    for data_component in data_components.values():
+        if hasattr(data_component, "before_fork"):
+            data_component.before_fork()
+
+
+def initialise(app, launch_config, base_path, background_work=True):
+    """
+    Run main initialisation steps, returns an app context
+    If startup profiling is enabled, the startup report is kept on the app context
+    With lazy component loading, only the navbar is built here, other components are built when they're first used
+    Without background_work, data components' background work waits for start_background_work, e.g. until after a fork
+    """
+    profiler = StartupProfiler.from_config(launch_config)
+    profiler.start()
+
+    # import all components, along with the order they're built in
+    components_list = import_components(launch_config, profiler)
+
+    # initialise app context
+    app_context = AppContext(base_path=base_path, launch_config=launch_config)
+
+    # initialise pages that aren't part of components
+    for path, (name, page, _) in PAGES.pop("", {}).items():
+        app_context.add_page(page_name=name, page_url=path, page_function=page)
+
+    # initialise routes that aren't part of components
+    for route, (rule, route_options) in ROUTES.pop("", {}).items():
+        register_route(app, base_path, route.__name__, route, rule, route_options)
+
     # add the navbar at the end so that the pages get loaded into it
     components_list = (*components_list, 'navigation_bar')
 
-    data_components = initialise_data_components(launch_config, app_context)
-    app_context = initialise_app_components(app, components_list, data_components)
+    data_components = initialise_data_components(launch_config, app_context, profiler)
+    if ((launch_config or {}).get("COMPONENT_LOADING") or {}).get("lazy", False):
+        lazy_components = LazyComponents(app_context, data_components)
+        app_context = register_lazy_app_components(app, components_list, lazy_components)
+        # the navbar is part of the launch layout, so it's always needed
+        lazy_components.get('navigation_bar', profiler)
+    else:
+        app_context = initialise_app_components(app, components_list, data_components, profiler)
+    app_context.startup_report = profiler.report()
+    app_context.data_components = data_components
+    if background_work:
+        start_background_work(data_components)
 
     return app_context
@@ -0,0 +1,121 @@
+"""
+Component registry manifest
+Records which modules register components, pages, callbacks and data components, and the order components are
+built in, so that startup can import those modules directly instead of walking the component directories
+
+The manifest is rebuilt whenever startup falls back to discovery, or ahead of time with:
+    python -m utils.component_registry
+"""
+
+import importlib.util
+import json
+import os
+import sys
+
+MANIFEST_VERSION = 1
+
+
+def is_hidden(name):
+    """ Files and directories that begin with "." and "_" are considered hidden """
+    return name.startswith('_') or name.startswith('.')
+
+
+def module_name(script_path):
+    """ The stable dotted name of a script, from its path relative to the working directory """
+    return os.path.splitext(os.path.normpath(script_path))[0].replace(os.sep, '.')
+
+
+def discover_scripts(path):
+    """ Every visible python script under a path, returns the scripts and the directories that were walked """
+    scripts, directories = [], []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not is_hidden(d))
+        directories.append(root)
+        scripts.extend(
+            os.path.join(root, script) for script in sorted(files) if not is_hidden(script) and script.endswith('.py')
+        )
+    return scripts, directories
+
+
+def import_script(script_path):
+    """
+    Import a script under its stable dotted name
+    The module is kept in sys.modules, so importing the same script again doesn't run it again
+    """
+    name = module_name(script_path)
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.spec_from_file_location(name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def write_manifest(manifest_path, scripts, directories, registry):
+    """
+    Write a manifest of the imported scripts and the registry they produced
+    Directory modification times are recorded too, so that added and removed scripts make the manifest stale
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "directories": {directory: _stat(directory)[0] for directory in directories},
+        "modules": [
+            {"name": module_name(script_path), "path": script_path, "stat": _stat(script_path)}
+            for script_path in scripts
+        ],
+        **registry
+    }
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    # write then rename, so that another process never reads half a manifest
+    temporary_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(temporary_path, manifest_path)
+    return manifest
+
+
+def load_manifest(manifest_path):
+    """
+    Read a manifest, returns None if there isn't one or if it's stale
+    A manifest is stale if any of its scripts or directories have changed since it was written
+    """
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        for directory, modified in manifest["directories"].items():
+            if _stat(directory)[0] != modified:
+                return None
+        for module in manifest["modules"]:
+            if _stat(module["path"]) != module["stat"]:
+                return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return manifest
+
+
+def main():
+    """ Build the manifest by discovery, in the working directory the app is launched from """
+    import yaml
+
+    from utils.component_initialiser import build_registry_manifest
+
+    launch_config = yaml.safe_load(open("launch_config.yaml")) or {}
+    manifest = build_registry_manifest(launch_config)
+    print(f"Wrote {len(manifest['modules'])} modules and {len(manifest['components'])} components to the manifest")
+
+
+if __name__ == "__main__":
+    main()
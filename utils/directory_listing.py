@@ -0,0 +1,77 @@
+"""
+Directory listings for file trees
+Entries are (name, is_dir) pairs, sorted with directories first and then case insensitively by name
+"""
+
+import os
+import threading
+
+
+def entry_sort_key(entry):
+    name, is_dir = entry
+    return not is_dir, name.lower()
+
+
+def list_directory(path, sort_key=entry_sort_key):
+    """
+    List a directory on disk with a single scandir, the entry types come from the cached DirEntry info
+    Returns an empty list if the directory can't be read
+    """
+    try:
+        with os.scandir(path) as entries:
+            listing = [(entry.name, entry.is_dir()) for entry in entries]
+    except OSError:
+        return []
+    return sorted(listing, key=sort_key)
+
+
+def build_directory_index(root, file_paths):
+    """
+    Build listings for every directory that holds one of the given file paths, relative to root
+    Returns {directory path: sorted entries}, the paths of children are os.path.join(directory path, name)
+    """
+    directory_entries = {root: set()}
+    for file_path in file_paths:
+        relative_parts = os.path.relpath(file_path, root).split(os.sep)
+        directory = root
+        for part in relative_parts[:-1]:
+            directory_entries.setdefault(directory, set()).add((part, True))
+            directory = os.path.join(directory, part)
+        directory_entries.setdefault(directory, set()).add((relative_parts[-1], False))
+
+    return {
+        directory: sorted(entries, key=entry_sort_key)
+        for directory, entries in directory_entries.items()
+    }
+
+
+class DirectoryListingCache:
+    """
+    Memoises sorted directory listings, keyed by each directory's mtime
+    Adding, removing or renaming an entry changes its directory's mtime, so only those directories are listed again
+    """
+
+    def __init__(self, sort_key=entry_sort_key):
+        self.sort_key = sort_key
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def list(self, path):
+        """ The sorted (name, is_dir) entries of a directory, listed again only if its mtime has changed """
+        mtime = _directory_mtime(path)
+        with self._lock:
+            cached = self._listings.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        listing = list_directory(path, self.sort_key) if mtime is not None else []
+        with self._lock:
+            self._listings[path] = (mtime, listing)
+        return listing
+
+
+def _directory_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
@@ -1,10 +1,18 @@
 """
 Tree structure visualiser taken from:
 https://stackoverflow.com/questions/9727673/list-directory-tree-structure-in-python
+Directory listings are memoised by mtime and each line's prefix is built once from its parent's
 """
 
 from pathlib import Path
 
+from utils.directory_listing import DirectoryListingCache
+
+
+def _name_sort_key(entry):
+    name, _ = entry
+    return name.lower()
+
 
 class DisplayablePath(object):
     display_filename_prefix_middle = '├──'
@@ -12,54 +20,63 @@ class DisplayablePath(object):
     display_parent_prefix_middle = '    '
     display_parent_prefix_last = '│   '
 
-    def __init__(self, path, parent_path, is_last):
+    def __init__(self, path, parent_path, is_last, is_dir=None):
         self.path = Path(str(path))
         self.parent = parent_path
         self.is_last = is_last
+        self.is_dir = self.path.is_dir() if is_dir is None else is_dir
         if self.parent:
             self.depth = self.parent.depth + 1
         else:
             self.depth = 0
+        self.children_prefix = self._build_children_prefix()
 
     @property
     def displayname(self):
-        if self.path.is_dir():
+        if self.is_dir:
             return self.path.name + '/'
         return self.path.name
 
     @classmethod
-    def make_tree(cls, root, parent=None, is_last=False, criteria=None):
+    def make_tree(cls, root, parent=None, is_last=False, criteria=None, listing_cache=None):
+        """
+        Yield the tree below root in display order
+        Pass a DirectoryListingCache sorted by name to reuse listings of directories that haven't changed
+        """
         root = Path(str(root))
         criteria = criteria or cls._default_criteria
+        listing_cache = listing_cache or DirectoryListingCache(sort_key=_name_sort_key)
 
-        displayable_root = cls(root, parent, is_last)
+        displayable_root = cls(root, parent, is_last, is_dir=True)
         yield displayable_root
 
-        children = sorted(list(path
-                               for path in root.iterdir()
-                               if criteria(path)),
-                          key=lambda s: str(s).lower())
-        count = 1
-        for path in children:
+        children = [
+            (root / name, is_dir)
+            for name, is_dir in listing_cache.list(str(root))
+            if criteria(root / name)
+        ]
+        for count, (path, is_dir) in enumerate(children, start=1):
             is_last = count == len(children)
-            if path.is_dir():
+            if is_dir:
                 yield from cls.make_tree(path,
                                          parent=displayable_root,
                                          is_last=is_last,
-                                         criteria=criteria)
+                                         criteria=criteria,
+                                         listing_cache=listing_cache)
             else:
-                yield cls(path, displayable_root, is_last)
-            count += 1
+                yield cls(path, displayable_root, is_last, is_dir=False)
 
     @classmethod
     def _default_criteria(cls, path):
         return True
 
-    @property
-    def displayname(self):
-        if self.path.is_dir():
-            return self.path.name + '/'
-        return self.path.name
+    def _build_children_prefix(self):
+        """ The indentation shared by every child, taken from the parent's so each level is only built once """
+        if self.parent is None:
+            return ''
+        return self.parent.children_prefix + (self.display_parent_prefix_middle
+                                              if self.is_last
+                                              else self.display_parent_prefix_last)
 
     def displayable(self):
         if self.parent is None:
@@ -69,14 +86,5 @@ class DisplayablePath(object):
                             if self.is_last
                             else self.display_filename_prefix_middle)
 
-        parts = ['{!s} {!s}'.format(_filename_prefix,
-                                    self.displayname)]
-
-        parent = self.parent
-        while parent and parent.parent is not None:
-            parts.append(self.display_parent_prefix_middle
-                         if parent.is_last
-                         else self.display_parent_prefix_last)
-            parent = parent.parent
+        return '{!s}{!s} {!s}'.format(self.parent.children_prefix, _filename_prefix, self.displayname)
 
-        return ''.join(reversed(parts))
@@ -0,0 +1,134 @@
+"""
+Bounded Dynamic Time Warping
+Exact DTW is quadratic in series length for every column pair. Here each numeric column is z-normalised and
+reduced to a fixed length once, warping is limited to a Sakoe-Chiba band, and pairs whose LB_Keogh lower bound
+already rules out a useful score are skipped. The surviving pairs are warped together, one band cell at a time
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def znormalise_downsample(values, length):
+    """
+    Z-normalise a series, ignoring missing values, and resample it to exactly length points
+    Longer series are reduced by averaging equal segments, shorter ones are linearly interpolated
+    Returns None for series with fewer than two values
+    """
+    values = values[~np.isnan(values)]
+    if len(values) < 2:
+        return None
+
+    deviation = values.std()
+    values = (values - values.mean()) / deviation if deviation > 0 else np.zeros(len(values))
+    if len(values) >= length:
+        segments = np.arange(len(values)) * length // len(values)
+        return np.bincount(segments, weights=values, minlength=length) / np.bincount(segments, minlength=length)
+    return np.interp(np.linspace(0, len(values) - 1, length), np.arange(len(values)), values)
+
+
+def band_envelopes(series, radius):
+    """ The upper and lower envelope of each row of series, over a window of radius points either side """
+    padded = np.pad(series, ((0, 0), (radius, radius)), mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1, axis=1)
+    return windows.max(axis=2), windows.min(axis=2)
+
+
+def lb_keogh(queries, upper, lower):
+    """
+    LB_Keogh lower bound of the squared banded DTW distance between every query and every enveloped series
+    Returns a len(queries) x len(upper) matrix
+    """
+    queries = queries[:, np.newaxis, :]
+    above = np.clip(queries - upper[np.newaxis], 0, None)
+    below = np.clip(lower[np.newaxis] - queries, 0, None)
+    return (above ** 2 + below ** 2).sum(axis=2)
+
+
+def banded_dtw_distances(first, second, radius):
+    """
+    Squared DTW distance between each row of first and the same row of second, warping at most radius points
+    Rows are warped together, so the python loop runs over band cells rather than over pairs and cells
+    """
+    pair_count, length = first.shape
+    previous_row = np.full((pair_count, length + 1), np.inf)
+    previous_row[:, 0] = 0
+    for i in range(length):
+        current_row = np.full((pair_count, length + 1), np.inf)
+        start, stop = max(0, i - radius), min(length, i + radius + 1)
+        costs = (first[:, i, np.newaxis] - second[:, start:stop]) ** 2
+        # the diagonal and vertical steps only depend on the previous row, so they're taken for the whole band at once
+        from_previous = np.minimum(previous_row[:, start:stop], previous_row[:, start + 1:stop + 1])
+        for offset, j in enumerate(range(start, stop)):
+            current_row[:, j + 1] = costs[:, offset] + np.minimum(from_previous[:, offset], current_row[:, j])
+        previous_row = current_row
+    return previous_row[:, length]
+
+
+class BandedDynamicTimeWarping:
+    """
+    Approximate Dynamic Time Warping, scored for every origin and target column in one call
+    Scores are percentages from the root mean squared warped distance of the z-normalised series: identical shapes
+    score 100, and series at least as far apart as two opposite series score 0
+    """
+
+    def __init__(self, length=256, window=0.1, min_similarity=20):
+        self.length = length
+        self.radius = max(int(round(window * length)), 0)
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build a scorer from the DYNAMIC_TIME_WARPING section of the launch config """
+        dtw_config = (config or {}).get("DYNAMIC_TIME_WARPING") or {}
+        return cls(
+            length=int(dtw_config.get("length", 256)),
+            window=float(dtw_config.get("window", 0.1)),
+            min_similarity=float(dtw_config.get("min_similarity", 20))
+        )
+
+    def similarity_matrix(self, origin_frame, target_frame):
+        """
+        Similarity of every origin and target column as a percentage
+        Non numeric columns, and pairs whose lower bound is already below min_similarity, score 0
+        """
+        scores = np.zeros((origin_frame.shape[1], target_frame.shape[1]))
+        origin_positions, origin_series = self._prepare(origin_frame)
+        target_positions, target_series = self._prepare(target_frame)
+        if not origin_positions or not target_positions:
+            return scores
+
+        max_distance = self.length * (2 * (1 - self.min_similarity / 100)) ** 2
+        # LB_Keogh isn't symmetric, either direction is a valid bound so the larger one is used
+        target_upper, target_lower = band_envelopes(target_series, self.radius)
+        origin_upper, origin_lower = band_envelopes(origin_series, self.radius)
+        lower_bounds = np.maximum(
+            lb_keogh(origin_series, target_upper, target_lower),
+            lb_keogh(target_series, origin_upper, origin_lower).T
+        )
+        origin_indices, target_indices = np.nonzero(lower_bounds <= max_distance)
+        logger.debug(f"LB_Keogh kept {len(origin_indices)} of {lower_bounds.size} column pairs for warping")
+        if not len(origin_indices):
+            return scores
+
+        distances = banded_dtw_distances(origin_series[origin_indices], target_series[target_indices], self.radius)
+        similarities = np.clip(1 - np.sqrt(distances / self.length) / 2, 0, 1)
+        scores[np.asarray(origin_positions)[origin_indices], np.asarray(target_positions)[target_indices]] = \
+            np.round(similarities * 100, 2)
+        return scores
+
+    def _prepare(self, frame):
+        """ The positions of the columns that can be warped, and their resampled series as rows of one array """
+        positions, series = [], []
+        for position, (_, column) in enumerate(frame.items()):
+            if not pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+                continue
+            resampled = znormalise_downsample(column.to_numpy(dtype=float, na_value=np.nan), self.length)
+            if resampled is not None:
+                positions.append(position)
+                series.append(resampled)
+        return positions, np.array(series).reshape(len(series), self.length)
@@ -0,0 +1,92 @@
+"""
+Lazily expanded file trees
+Only the root is rendered up front, a directory's children are listed and rendered when it's expanded,
+a page at a time. Each directory node holds the following pattern matched components, keyed by its path:
+    {namespace}-dir       toggles the directory (every other click expands it)
+    {namespace}-children  holds the rendered children
+    {namespace}-more      renders the next page of children
+    {namespace}-listing   the entries that are currently rendered
+"""
+
+import os
+
+import dash
+from dash import html, dcc, Patch
+import dash_bootstrap_components as dbc
+
+
+def patch_sorted_list(previous_items, current_items, build_item):
+    """
+    Patch a rendered list that was built from previous_items so that it matches current_items
+    Both lists must share the same order, only removed and added items are sent
+    """
+    patch = Patch()
+    current_set, previous_set = set(current_items), set(previous_items)
+    for index in reversed(range(len(previous_items))):
+        if previous_items[index] not in current_set:
+            del patch[index]
+
+    # after removals the rendered list is in order, so inserting in order puts each item in its final place
+    for index, item in enumerate(current_items):
+        if item not in previous_set:
+            patch.insert(index, build_item(item))
+    return patch
+
+
+class LazyFileTree:
+    """
+    Renders a file tree whose listings come from list_children(directory path)
+    build_file(name, path) renders a file, directories are rendered by the tree
+    """
+
+    def __init__(self, namespace, list_children, build_file, page_size=200):
+        self.namespace = namespace
+        self.list_children = list_children
+        self.build_file = build_file
+        self.page_size = page_size
+
+    def build_root(self, root_path):
+        """ The root is always expanded, so its toggle starts with a click and is hidden """
+        return self.build_directory(root_path, os.path.basename(root_path), is_root=True)
+
+    def build_directory(self, path, name, is_root=False):
+        return html.Div([
+            dbc.Button(
+                f"{name}/", n_clicks=1 if is_root else 0, hidden=is_root, color="link", size="sm",
+                id={"type": f"{self.namespace}-dir", "index": path}
+            ),
+            html.Div(
+                style={} if is_root else {"paddingLeft": "1em"},
+                id={"type": f"{self.namespace}-children", "index": path}
+            ),
+            dbc.Button(
+                "Show more", n_clicks=0, hidden=True, color="link", size="sm",
+                id={"type": f"{self.namespace}-more", "index": path}
+            ),
+            dcc.Store(id={"type": f"{self.namespace}-listing", "index": path}, data=[])
+        ])
+
+    def update_directory(self, path, toggle_clicks, more_clicks, rendered_entries):
+        """
+        Bring a directory's rendered children up to date
+        Collapsed directories render nothing, expanded directories render (more_clicks + 1) pages of entries
+        Returns (children, rendered entries, whether the "show more" button is hidden)
+        """
+        rendered_entries = [tuple(entry) for entry in rendered_entries or []]
+        listing = self.list_children(path) if (toggle_clicks or 0) % 2 else []
+        entries = listing[:((more_clicks or 0) + 1) * self.page_size]
+        more_hidden = len(entries) == len(listing)
+
+        if entries == rendered_entries:
+            return dash.no_update, dash.no_update, more_hidden
+        if not entries or not rendered_entries:
+            return [self._build_entry(path, entry) for entry in entries], entries, more_hidden
+        return patch_sorted_list(rendered_entries, entries, lambda entry: self._build_entry(path, entry)), \
+            entries, more_hidden
+
+    def _build_entry(self, directory, entry):
+        name, is_dir = entry
+        entry_path = os.path.join(directory, name)
+        if is_dir:
+            return self.build_directory(entry_path, name)
+        return self.build_file(name, entry_path)
@@ -0,0 +1,78 @@
+"""
+Memory bounded cache for loaded dataframes
+Frames are evicted least recently used first once the cache holds more than its byte budget
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def frame_size(frame):
+    """ Number of bytes a dataframe holds, including the contents of object columns """
+    return int(frame.memory_usage(deep=True).sum())
+
+
+class FrameCache:
+    """
+    LRU cache of dataframes with a byte budget
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build a cache from the FRAME_CACHE section of the launch config """
+        cache_config = (config or {}).get("FRAME_CACHE") or {}
+        return cls(int(cache_config.get("max_bytes", 512 * 1024 * 1024)))
+
+    def get(self, key, loader):
+        """
+        Get a frame from the cache, loading it with loader() if it isn't cached
+        Frames larger than the whole budget are returned without being cached
+        """
+        frame = self.peek(key)
+        if frame is not None:
+            return frame
+
+        frame = loader()
+        self.put(key, frame)
+        return frame
+
+    def peek(self, key):
+        """ Get a frame only if it's already cached, marking it as recently used """
+        with self._lock:
+            if key not in self._frames:
+                return None
+            self._frames.move_to_end(key)
+            return self._frames[key][0]
+
+    def put(self, key, frame):
+        size = frame_size(frame)
+        if size > self.max_bytes:
+            logger.debug(f"Frame {key} ({size} bytes) exceeds the cache budget, not caching")
+            return
+
+        with self._lock:
+            self._discard(key)
+            self._frames[key] = (frame, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                evicted_key, (_, evicted_size) = self._frames.popitem(last=False)
+                self.current_bytes -= evicted_size
+                logger.debug(f"Evicted frame {evicted_key} from the cache")
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        if key in self._frames:
+            _, size = self._frames.pop(key)
+            self.current_bytes -= size
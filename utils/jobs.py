@@ -0,0 +1,158 @@
+"""
+In-process background jobs
+Long running work is submitted to a worker pool and identified by a job id, so callbacks can poll for progress
+instead of holding a request open
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETE = "complete"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """ Raised inside a job once it has been asked to stop """
+
+
+class Job:
+    """
+    A unit of background work
+    The job is passed to the function it runs, which can report progress and check whether it was cancelled
+    """
+
+    def __init__(self, name):
+        self.job_id = uuid.uuid4().hex
+        self.name = name
+        self.status = QUEUED
+        self.progress = (0, 0)
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self):
+        return self.status in (COMPLETE, FAILED, CANCELLED)
+
+    def set_progress(self, completed, total, message=None):
+        """ Report progress, raises JobCancelled if the job has been cancelled so the work stops """
+        self.progress = (completed, total)
+        if message is not None:
+            self.message = message
+        self.raise_if_cancelled()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def cancel(self):
+        self._cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self._finish(CANCELLED)
+
+    def wait(self, timeout=None):
+        """ Block until the job has finished, returning its result """
+        if self.future is not None:
+            concurrent.futures.wait([self.future], timeout=timeout)
+        return self.result
+
+    def progress_percentage(self):
+        completed, total = self.progress
+        if self.status == COMPLETE:
+            return 100
+        return round(100 * completed / total) if total else 0
+
+    def to_dict(self):
+        """ A json compatible summary of the job, results aren't included """
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "status": self.status,
+            "progress": self.progress_percentage(),
+            "message": self.message,
+            "error": self.error
+        }
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+
+
+class JobManager:
+    """
+    Runs jobs on a thread pool, and keeps the most recent jobs so their progress and results can be retrieved
+    """
+
+    def __init__(self, max_workers=4, max_retained_jobs=200):
+        self.max_retained_jobs = max_retained_jobs
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name, function, *args, **kwargs):
+        """
+        Run function(job, *args, **kwargs) in the background
+        Returns the job, its id can be used to look it up later
+        """
+        job = Job(name)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._forget_finished_jobs()
+        job.future = self._pool.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def list_jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    @staticmethod
+    def _run(job, function, args, kwargs):
+        if job.cancelled:
+            job._finish(CANCELLED)
+            return
+
+        job.status = RUNNING
+        try:
+            result = function(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            logger.exception(f"Job '{job.name}' ({job.job_id}) failed")
+            job._finish(FAILED, error=str(e))
+        else:
+            job._finish(COMPLETE, result=result)
+
+    def _forget_finished_jobs(self):
+        """ Drop the oldest finished jobs once more than max_retained_jobs are held """
+        excess_jobs = len(self._jobs) - self.max_retained_jobs
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:max(excess_jobs, 0)]:
+            self._jobs.pop(job_id)
@@ -0,0 +1,115 @@
+"""
+Load test for a running instance of the app
+Requests the page shell, the Dash layout and dependencies, and the callback that renders a page, from many clients at
+once, then reports throughput, latency and bytes transferred. Run it against the debug server and against gunicorn
+to compare them:
+    python app.py
+    python -m utils.load_test --url http://127.0.0.1:7245/catalogue/
+    gunicorn
+    python -m utils.load_test --url http://127.0.0.1:7245/catalogue/
+"""
+
+import argparse
+import concurrent.futures
+import json
+import statistics
+import threading
+import time
+import urllib.request
+
+
+def build_requests(base_url, page):
+    """ (name, url, body) of each request a client makes in turn, the body is posted as JSON if it isn't None """
+    base_url = base_url.rstrip('/') + '/'
+    display_page = {
+        "output": "page-content.children",
+        "outputs": {"id": "page-content", "property": "children"},
+        "inputs": [{"id": "url", "property": "pathname", "value": f"/{base_url.split('/', 3)[-1]}{page}"}],
+        "changedPropIds": ["url.pathname"]
+    }
+    return [
+        ("page", base_url, None),
+        ("layout", f"{base_url}_dash-layout", None),
+        ("dependencies", f"{base_url}_dash-dependencies", None),
+        ("display_page", f"{base_url}_dash-update-component", display_page)
+    ]
+
+
+def send(url, body, accept_gzip):
+    """ Make one request, returns the number of bytes received """
+    headers = {"Accept-Encoding": "gzip"} if accept_gzip else {}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers), timeout=60) as response:
+        return len(response.read())
+
+
+def run_load_test(base_url, page="catalogue", concurrency=16, duration=20, accept_gzip=True):
+    """
+    Have concurrency clients make requests in a loop for duration seconds
+    Returns a summary of each kind of request
+    """
+    requests = build_requests(base_url, page)
+    results = {name: {"latencies": [], "bytes": 0, "errors": 0} for name, _, _ in requests}
+    results_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(client_index):
+        request_index = client_index
+        while time.perf_counter() < deadline:
+            name, url, body = requests[request_index % len(requests)]
+            request_index += 1
+            started = time.perf_counter()
+            try:
+                received = send(url, body, accept_gzip)
+            except OSError:
+                with results_lock:
+                    results[name]["errors"] += 1
+                continue
+            with results_lock:
+                results[name]["latencies"].append(time.perf_counter() - started)
+                results[name]["bytes"] += received
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(sum(len(result["latencies"]) for result in results.values()) / elapsed, 1),
+        "requests": {
+            name: {
+                "count": len(result["latencies"]),
+                "errors": result["errors"],
+                "median_ms": round(1000 * statistics.median(result["latencies"]), 1) if result["latencies"] else None,
+                "p95_ms": round(1000 * _percentile(result["latencies"], 0.95), 1) if result["latencies"] else None,
+                "mean_bytes": round(result["bytes"] / len(result["latencies"])) if result["latencies"] else None
+            }
+            for name, result in results.items()
+        }
+    }
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running instance of the app")
+    parser.add_argument("--url", default="http://127.0.0.1:7245/catalogue/", help="the app's base url")
+    parser.add_argument("--page", default="catalogue", help="the page rendered by the display_page callback")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--no-gzip", action="store_true", help="don't accept compressed responses")
+    args = parser.parse_args()
+
+    summary = run_load_test(args.url, args.page, args.concurrency, args.duration, accept_gzip=not args.no_gzip)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
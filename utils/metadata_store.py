@@ -0,0 +1,145 @@
+"""
+Persistent store for profiled catalogue metadata
+Entries are keyed by file path and content checksum, so a warm start only has to profile files that changed
+"""
+
+import importlib.metadata
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+
+from utils.catalogue_indexer import FileState
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of persisted entries changes, stored entries from other versions are re-profiled
+STORE_VERSION = 3
+# seconds to wait for another process's write to finish before giving up
+BUSY_TIMEOUT = 30
+# paths per query when loading entries by path, below SQLite's limit on query parameters
+LOAD_BATCH_SIZE = 500
+
+
+def _store_version():
+    """ Entries are only valid for the store layout and discovery library that created them """
+    try:
+        library_version = importlib.metadata.version("DataCatalogueSystem")
+    except importlib.metadata.PackageNotFoundError:
+        library_version = "unknown"
+    return f"{STORE_VERSION}:{library_version}"
+
+
+class MetadataStore:
+    """
+    SQLite backed store of catalogue entries
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.version = _store_version()
+        self._lock = threading.Lock()
+        self._db = None
+        self._connect()
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build a store from the METADATA_STORE section of the launch config, None if it's disabled """
+        store_config = (config or {}).get("METADATA_STORE") or {}
+        if not store_config.get("enabled", True):
+            return None
+        return cls(store_config.get("path", ".catalogue_cache/catalogue.sqlite"))
+
+    @property
+    def _connection(self):
+        """ A closed store reconnects when it's next used """
+        if self._db is None:
+            self._connect()
+        return self._db
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # write ahead logging lets processes that follow the store keep reading while the indexing process writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS catalogue_metadata (
+                    path TEXT PRIMARY KEY,
+                    mtime INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    checksum TEXT NOT NULL,
+                    store_version TEXT NOT NULL,
+                    entry BLOB NOT NULL
+                )
+                """
+            )
+
+    def close(self):
+        """ Close the connection, connections mustn't be carried into forked processes """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def load_all(self):
+        """
+        Load every stored entry that was written by this version of the store
+        Returns {path: (file state, catalogue entry)}
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, mtime, size, checksum, entry FROM catalogue_metadata WHERE store_version = ?",
+                (self.version,)
+            ).fetchall()
+        return self._decode(rows)
+
+    def load_states(self):
+        """ The file state of every stored entry written by this version of the store, without the entries """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, mtime, size, checksum FROM catalogue_metadata WHERE store_version = ?",
+                (self.version,)
+            ).fetchall()
+        return {path: FileState(mtime, size, checksum) for path, mtime, size, checksum in rows}
+
+    def load(self, paths):
+        """
+        Load the stored entries of the given paths
+        Returns {path: (file state, catalogue entry)}, paths without a readable entry are left out
+        """
+        paths, rows = list(paths), []
+        with self._lock:
+            for start in range(0, len(paths), LOAD_BATCH_SIZE):
+                batch = paths[start:start + LOAD_BATCH_SIZE]
+                rows.extend(self._connection.execute(
+                    f"SELECT path, mtime, size, checksum, entry FROM catalogue_metadata "
+                    f"WHERE store_version = ? AND path IN ({', '.join('?' * len(batch))})",
+                    (self.version, *batch)
+                ).fetchall())
+        return self._decode(rows)
+
+    @staticmethod
+    def _decode(rows):
+        stored_entries = {}
+        for path, mtime, size, checksum, entry in rows:
+            try:
+                stored_entries[path] = (FileState(mtime, size, checksum), pickle.loads(entry))
+            except Exception:
+                logger.warning(f"Discarding unreadable stored metadata for '{path}'")
+        return stored_entries
+
+    def save(self, path, file_state, catalogue_entry):
+        """ Store the entry for a path, replacing whatever was stored for it before """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO catalogue_metadata VALUES (?, ?, ?, ?, ?, ?)",
+                (path, file_state.mtime, file_state.size, file_state.checksum, self.version,
+                 pickle.dumps(catalogue_entry, protocol=pickle.HIGHEST_PROTOCOL))
+            )
+
+    def delete(self, path):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM catalogue_metadata WHERE path = ?", (path,))
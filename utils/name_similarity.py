@@ -0,0 +1,122 @@
+"""
+Column name similarity matrices
+Every origin name is scored against every target name in one call, rather than once per column pair.
+Scores are the same as the matching methods': Levenshtein is the InDel ratio, run in rapidfuzz's compiled cdist when
+it's installed, and LCS is difflib's SequenceMatcher ratio. Names are compared as given, case included.
+WordNet synset lookups are memoised per name. Scores are percentages, like the matching methods
+"""
+
+import difflib
+import functools
+import logging
+
+import numpy as np
+
+try:
+    from rapidfuzz import process as rapidfuzz_process
+    from rapidfuzz.distance import Indel
+except ImportError:
+    rapidfuzz_process = Indel = None
+
+logger = logging.getLogger(__name__)
+
+
+def _normalise_name(name):
+    return str(name).strip().lower()
+
+
+def _lcs_length(first, second):
+    previous_row = [0] * (len(second) + 1)
+    for first_char in first:
+        current_row = [0]
+        for j, second_char in enumerate(second, 1):
+            current_row.append(
+                previous_row[j - 1] + 1 if first_char == second_char else max(previous_row[j], current_row[j - 1])
+            )
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def _python_indel_similarity(first, second):
+    """ The same ratio as Levenshtein.ratio, twice the longest common subsequence over the combined length """
+    total_length = len(first) + len(second)
+    return 2 * _lcs_length(first, second) / total_length if total_length else 1
+
+
+def _pairwise_matrix(origin_names, target_names, similarity):
+    """ Score the unique names only, the matrix is then expanded back to the given names """
+    unique_origins = list(dict.fromkeys(origin_names))
+    unique_targets = list(dict.fromkeys(target_names))
+    unique_scores = np.array(
+        [[similarity(origin, target) for target in unique_targets] for origin in unique_origins], dtype=float
+    ).reshape(len(unique_origins), len(unique_targets))
+    origin_positions = {name: position for position, name in enumerate(unique_origins)}
+    target_positions = {name: position for position, name in enumerate(unique_targets)}
+    origin_index = [origin_positions[name] for name in origin_names]
+    target_index = [target_positions[name] for name in target_names]
+    return unique_scores[np.ix_(origin_index, target_index)]
+
+
+def levenshtein_similarity_matrix(origin_names, target_names):
+    """ Levenshtein.ratio, the InDel similarity normalised by the combined length of the names """
+    origin_names = [str(name) for name in origin_names]
+    target_names = [str(name) for name in target_names]
+    if rapidfuzz_process is not None:
+        scores = rapidfuzz_process.cdist(
+            origin_names, target_names, scorer=Indel.normalized_similarity, dtype=np.float64, workers=-1
+        )
+    else:
+        scores = _pairwise_matrix(origin_names, target_names, _python_indel_similarity)
+    return np.round(scores * 100, 2)
+
+
+def lcs_similarity_matrix(origin_names, target_names):
+    """
+    SequenceMatcher(None, origin, target).ratio()
+    The matcher indexes its second sequence, so each target is indexed once and reused for every origin
+    """
+    origin_names = [str(name) for name in origin_names]
+    target_names = [str(name) for name in target_names]
+    pair_scores = {}
+    sequence_matcher = difflib.SequenceMatcher(None)
+    for target in dict.fromkeys(target_names):
+        sequence_matcher.set_seq2(target)
+        for origin in dict.fromkeys(origin_names):
+            sequence_matcher.set_seq1(origin)
+            pair_scores[origin, target] = sequence_matcher.ratio()
+    scores = _pairwise_matrix(origin_names, target_names, lambda origin, target: pair_scores[origin, target])
+    return np.round(scores * 100, 2)
+
+
+@functools.lru_cache(maxsize=4096)
+def _synsets(name):
+    from nltk.corpus import wordnet
+    return tuple(wordnet.synsets(name.replace(' ', '_')))
+
+
+@functools.lru_cache(maxsize=65536)
+def _wordnet_similarity(first, second):
+    if first == second:
+        return 1
+    similarities = [
+        first_synset.wup_similarity(second_synset) or 0
+        for first_synset in _synsets(first)
+        for second_synset in _synsets(second)
+    ]
+    return max(similarities, default=0)
+
+
+def wordnet_similarity_matrix(origin_names, target_names):
+    """
+    The best Wu-Palmer similarity between the names' synsets
+    Returns None if the WordNet corpus isn't available, so the method's own scorer can be used instead
+    """
+    try:
+        _synsets("name")
+    except (ImportError, LookupError):
+        logger.warning("The WordNet corpus isn't available, names will be scored one pair at a time")
+        return None
+
+    origin_names = [_normalise_name(name) for name in origin_names]
+    target_names = [_normalise_name(name) for name in target_names]
+    return np.round(_pairwise_matrix(origin_names, target_names, _wordnet_similarity) * 100, 2)
@@ -0,0 +1,147 @@
+"""
+Numeric column similarity matrices
+Pearson correlations are computed for every origin and target column in one matrix product, and identical
+values are counted from stringified value sets built once per column. Non numeric columns, and pairs whose score isn't
+defined, are left as NaN so the matching method's own scorer can be used for them
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+
+def _numeric_positions(frame):
+    return [
+        position for position, (_, column) in enumerate(frame.items())
+        if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+    ]
+
+
+def _is_constant(values):
+    """ Columns with fewer than two distinct values, their correlation isn't defined """
+    present = ~np.isnan(values)
+    return ~(np.where(present, values, -np.inf).max(axis=0, initial=-np.inf) >
+             np.where(present, values, np.inf).min(axis=0, initial=np.inf))
+
+
+def _centre(values):
+    present_counts = (~np.isnan(values)).sum(axis=0)
+    return values - np.nansum(values, axis=0) / np.maximum(present_counts, 1)
+
+
+def pearson_similarity_matrix(origin_frame, target_frame):
+    """
+    Absolute Pearson correlation of every origin and target column as a percentage
+    Rows are aligned by position and each pair only uses the rows where both values are present, like Series.corr
+    """
+    scores = np.full((origin_frame.shape[1], target_frame.shape[1]), np.nan)
+    origin_positions, target_positions = _numeric_positions(origin_frame), _numeric_positions(target_frame)
+    if not origin_positions or not target_positions:
+        return scores
+
+    row_count = min(len(origin_frame), len(target_frame))
+    origin_values = origin_frame.iloc[:row_count, origin_positions].to_numpy(dtype=float, na_value=np.nan)
+    target_values = target_frame.iloc[:row_count, target_positions].to_numpy(dtype=float, na_value=np.nan)
+    constant_origins, constant_targets = _is_constant(origin_values), _is_constant(target_values)
+    # centring each column first keeps the sums below well conditioned, correlation doesn't change with a shift
+    origin_values, target_values = _centre(origin_values), _centre(target_values)
+
+    origin_present, target_present = ~np.isnan(origin_values), ~np.isnan(target_values)
+    if origin_present.all() and target_present.all():
+        correlation = _complete_correlation(origin_values, target_values)
+    else:
+        correlation = _pairwise_complete_correlation(origin_values, target_values, origin_present, target_present)
+    correlation[constant_origins, :] = np.nan
+    correlation[:, constant_targets] = np.nan
+
+    scores[np.ix_(origin_positions, target_positions)] = np.round(np.clip(np.abs(correlation), 0, 1) * 100, 2)
+    return scores
+
+
+def _complete_correlation(origin_values, target_values):
+    """ Without missing values every pair shares its rows, so scaled columns need a single product """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        origin_scaled = origin_values / np.linalg.norm(origin_values, axis=0)
+        target_scaled = target_values / np.linalg.norm(target_values, axis=0)
+    correlation = origin_scaled.T @ target_scaled
+    if len(origin_values) < 2:
+        correlation[:] = np.nan
+    return correlation
+
+
+def _pairwise_complete_correlation(origin_values, target_values, origin_present, target_present):
+    """ Sums over the rows where both columns of a pair are present """
+    origin_values, target_values = np.nan_to_num(origin_values), np.nan_to_num(target_values)
+    origin_mask, target_mask = origin_present.astype(float), target_present.astype(float)
+
+    pair_counts = origin_mask.T @ target_mask
+    origin_sums = origin_values.T @ target_mask
+    target_sums = origin_mask.T @ target_values
+    product_sums = origin_values.T @ target_values
+    origin_square_sums = (origin_values ** 2).T @ target_mask
+    target_square_sums = origin_mask.T @ (target_values ** 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = pair_counts * product_sums - origin_sums * target_sums
+        variance = (pair_counts * origin_square_sums - origin_sums ** 2) * \
+            (pair_counts * target_square_sums - target_sums ** 2)
+        correlation = covariance / np.sqrt(variance)
+    correlation[(pair_counts < 2) | ~(variance > 0)] = np.nan
+    return correlation
+
+
+def _value_sets(frame, positions):
+    """ Distinct values of each column as strings, the identical values method compares stringified values """
+    return [pd.unique(frame.iloc[:, position].to_numpy().astype(str)) for position in positions]
+
+
+def identical_values_matrix(origin_frame, target_frame):
+    """
+    The Jaccard index of two numeric columns' distinct stringified values, shared values over all values
+    With scipy the shared values of every pair are counted in one sparse product, each column's values are hashed once
+    """
+    scores = np.full((origin_frame.shape[1], target_frame.shape[1]), np.nan)
+    origin_positions, target_positions = _numeric_positions(origin_frame), _numeric_positions(target_frame)
+    if not origin_positions or not target_positions:
+        return scores
+
+    origin_sets = _value_sets(origin_frame, origin_positions)
+    target_sets = _value_sets(target_frame, target_positions)
+    if sparse is not None:
+        # number every distinct value by hashing, only values found on both sides can be shared
+        value_codes, distinct_values = pd.factorize(
+            np.concatenate([*origin_sets, *target_sets, np.empty(0, dtype=object)])
+        )
+        origin_value_count = sum(len(values) for values in origin_sets)
+        shared_values = np.zeros(len(distinct_values), dtype=bool)
+        shared_values[value_codes[:origin_value_count]] = True
+        shared_values &= np.bincount(value_codes[origin_value_count:], minlength=len(distinct_values)) > 0
+        shared_codes = np.cumsum(shared_values) - 1
+
+        # each column is then a sparse row of the shared values it holds
+        column_rows = np.repeat(np.arange(len(origin_sets) + len(target_sets)),
+                                [len(values) for values in origin_sets + target_sets])
+        kept = shared_values[value_codes]
+        membership = sparse.coo_matrix(
+            (np.ones(kept.sum()), (column_rows[kept], shared_codes[value_codes[kept]])),
+            shape=(len(origin_sets) + len(target_sets), int(shared_values.sum()))
+        ).tocsr()
+        shared_counts = (membership[:len(origin_sets)] @ membership[len(origin_sets):].T).toarray()
+    else:
+        target_hashed = [set(values.tolist()) for values in target_sets]
+        shared_counts = np.array([
+            [len(target_values.intersection(origin_values.tolist())) for target_values in target_hashed]
+            for origin_values in origin_sets
+        ], dtype=float).reshape(len(origin_sets), len(target_sets))
+
+    union_sizes = np.add.outer(
+        np.array([len(values) for values in origin_sets]), np.array([len(values) for values in target_sets])
+    ) - shared_counts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(union_sizes > 0, shared_counts / union_sizes, np.nan)
+    scores[np.ix_(origin_positions, target_positions)] = np.round(jaccard * 100, 2)
+    return scores
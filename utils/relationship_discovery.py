@@ -0,0 +1,127 @@
+"""
+Catalogue-wide relationship discovery
+Every file pair's column pairs are first pruned with column signatures, only the surviving candidates are scored with
+the configured matching methods, reading each file's candidate columns once per run
+"""
+
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RelationshipDiscovery:
+    """
+    Settings and candidate pruning for relationship discovery runs
+    Runs can be repeated every interval seconds on a background thread, for example nightly
+    """
+
+    def __init__(self, match_types=None, min_certainty=80, min_overlap=0.5, min_name_similarity=0.5, interval=None):
+        self.match_types = match_types or ["Match Identical Values", "Match Column Name (LVN)"]
+        self.min_certainty = min_certainty
+        self.min_overlap = min_overlap
+        self.min_name_similarity = min_name_similarity
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build the discovery settings from the RELATIONSHIP_DISCOVERY section of the launch config """
+        discovery_config = (config or {}).get("RELATIONSHIP_DISCOVERY") or {}
+        return cls(
+            match_types=discovery_config.get("match_types"),
+            min_certainty=float(discovery_config.get("min_certainty", 80)),
+            min_overlap=float(discovery_config.get("min_overlap", 0.5)),
+            min_name_similarity=float(discovery_config.get("min_name_similarity", 0.5)),
+            interval=discovery_config.get("interval")
+        )
+
+    def candidate_pairs(self, origin_signatures, target_signatures, include_numeric_pairs=False):
+        """
+        The (origin column, target column) pairs worth scoring between two files
+        A pair is kept if the names are similar, or if the columns are of the same kind, their ranges overlap and
+        enough of the smaller column's values are estimated to be in the other. With include_numeric_pairs, for
+        methods that compare numeric series row by row, every pair of non constant numeric columns is kept too
+        """
+        origins, targets = list(origin_signatures.values()), list(target_signatures.values())
+        if not origins or not targets:
+            return []
+
+        origin_numeric = np.array([signature.numeric for signature in origins])
+        target_numeric = np.array([signature.numeric for signature in targets])
+        origin_cardinality = np.array([signature.cardinality for signature in origins], dtype=float)
+        target_cardinality = np.array([signature.cardinality for signature in targets], dtype=float)
+
+        jaccard = (np.stack([signature.minhash for signature in origins])[:, np.newaxis, :] ==
+                   np.stack([signature.minhash for signature in targets])[np.newaxis, :, :]).mean(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shared_values = jaccard * np.add.outer(origin_cardinality, target_cardinality) / (1 + jaccard)
+            containment = shared_values / np.minimum.outer(origin_cardinality, target_cardinality)
+        containment[~(np.minimum.outer(origin_cardinality, target_cardinality) > 0)] = 0
+
+        same_kind = np.equal.outer(origin_numeric, target_numeric)
+        ranges_overlap = np.array([
+            [not origin.numeric or origin.ranges_overlap(target) for target in targets] for origin in origins
+        ]).reshape(len(origins), len(targets))
+        keep = same_kind & ranges_overlap & (containment >= self.min_overlap)
+        if include_numeric_pairs:
+            keep |= np.outer(origin_numeric & (origin_cardinality > 1), target_numeric & (target_cardinality > 1))
+
+        return [
+            (origin.name, target.name)
+            for origin_index, origin in enumerate(origins)
+            for target_index, target in enumerate(targets)
+            if keep[origin_index, target_index] or origin.name_similarity(target) >= self.min_name_similarity
+        ]
+
+    def start(self, submit):
+        """ Call submit() every interval seconds on a background thread, submit should wait for the run to finish """
+        if not self.interval or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(submit,), name="relationship-discovery",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self, submit):
+        while not self._stop_event.wait(self.interval):
+            try:
+                submit()
+            except Exception:
+                logger.exception("Relationship discovery failed")
+
+
+class CandidateColumns:
+    """
+    A catalogued file as seen by one discovery run, its candidate columns are read once and shared by every file pair
+    The columns are kept in the catalogue's frame cache, so they count towards its budget
+    """
+
+    def __init__(self, catalogue_item, column_names, frame_cache):
+        self.catalogue_item = catalogue_item
+        self.column_names = list(column_names)
+        self.frame_cache = frame_cache
+
+    @property
+    def cache_key(self):
+        return (*self.catalogue_item.cache_key, "candidate columns")
+
+    def get_checksum(self):
+        return self.catalogue_item.get_checksum()
+
+    def get_metadata(self):
+        return self.catalogue_item.get_metadata()
+
+    def get_columns(self, column_names):
+        frame = self.frame_cache.get(self.cache_key, lambda: self.catalogue_item.get_columns(self.column_names))
+        return frame.reindex(columns=column_names)
+
+    def discard(self):
+        """ Drop the columns from the frame cache once the run is over """
+        self.frame_cache.discard(self.cache_key)
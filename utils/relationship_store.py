@@ -0,0 +1,127 @@
+"""
+Persistent store for column relationships
+Relationships are keyed by the data checksum and column name of both ends, so they survive restarts and are shared
+by every worker process that opens the same database
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Relationship = namedtuple(
+    "Relationship",
+    ["origin_checksum", "origin_column", "target_checksum", "target_column", "certainty", "method", "updated"]
+)
+
+# seconds to wait for another process's write to finish before giving up
+BUSY_TIMEOUT = 30
+
+
+class RelationshipStore:
+    """
+    SQLite backed store of column relationships
+    Writes are batched into a single transaction, and lookups by either end of a relationship are indexed
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = None
+        self._connect()
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build a store from the RELATIONSHIP_STORE section of the launch config """
+        store_config = (config or {}).get("RELATIONSHIP_STORE") or {}
+        return cls(store_config.get("path", ".catalogue_cache/relationships.sqlite"))
+
+    @property
+    def _connection(self):
+        """ A closed store reconnects when it's next used """
+        if self._db is None:
+            self._connect()
+        return self._db
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # write ahead logging lets other processes keep reading while one of them writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS column_relationships (
+                    origin_checksum TEXT NOT NULL,
+                    origin_column TEXT NOT NULL,
+                    target_checksum TEXT NOT NULL,
+                    target_column TEXT NOT NULL,
+                    certainty REAL NOT NULL,
+                    method TEXT,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (origin_checksum, origin_column, target_checksum, target_column)
+                )
+                """
+            )
+            self._db.execute(
+                """
+                CREATE INDEX IF NOT EXISTS column_relationships_by_target
+                ON column_relationships (target_checksum, target_column)
+                """
+            )
+
+    def close(self):
+        """ Close the connection, connections mustn't be carried into forked processes """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def upsert(self, relationships):
+        """
+        Add or update many relationships in one transaction
+        relationships is an iterable of (origin checksum, origin column, target checksum, target column, certainty,
+        method), a relationship that already exists takes the new certainty and method
+        """
+        updated = time.time()
+        rows = [(*relationship, updated) for relationship in relationships]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                """
+                INSERT INTO column_relationships VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (origin_checksum, origin_column, target_checksum, target_column)
+                DO UPDATE SET certainty = excluded.certainty, method = excluded.method, updated = excluded.updated
+                """,
+                rows
+            )
+        return len(rows)
+
+    def get_by_checksum(self, data_checksum):
+        """ Every relationship with the given file at either end """
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT * FROM column_relationships WHERE origin_checksum = ?
+                UNION
+                SELECT * FROM column_relationships WHERE target_checksum = ?
+                """,
+                (data_checksum, data_checksum)
+            ).fetchall()
+        return [Relationship(*row) for row in rows]
+
+    def get_by_column(self, data_checksum, column_name):
+        """ Every relationship with the given column at either end """
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT * FROM column_relationships WHERE origin_checksum = ? AND origin_column = ?
+                UNION
+                SELECT * FROM column_relationships WHERE target_checksum = ? AND target_column = ?
+                """,
+                (data_checksum, column_name, data_checksum, column_name)
+            ).fetchall()
+        return [Relationship(*row) for row in rows]
@@ -0,0 +1,67 @@
+"""
+Decimation of long series for plotting
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def min_max_downsample(series, point_budget):
+    """
+    Reduce a numeric series to at most point_budget points
+    The series is split into point_budget / 2 equal buckets and the minimum and maximum of each bucket are kept,
+    so peaks and troughs survive the decimation. Points are returned in their original order
+    """
+    if len(series) <= point_budget:
+        return series
+
+    bucket_count = max(point_budget // 2, 1)
+    bucket_size = -(-len(series) // bucket_count)
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    padded = np.full(bucket_count * bucket_size, np.nan)
+    padded[:len(values)] = values
+    buckets = padded.reshape(bucket_count, bucket_size)
+
+    valid_buckets = ~np.isnan(buckets).all(axis=1)
+    bucket_offsets = np.arange(bucket_count) * bucket_size
+    minimum_indices = np.where(np.isnan(buckets), np.inf, buckets).argmin(axis=1) + bucket_offsets
+    maximum_indices = np.where(np.isnan(buckets), -np.inf, buckets).argmax(axis=1) + bucket_offsets
+
+    kept_indices = np.unique(np.concatenate([minimum_indices[valid_buckets], maximum_indices[valid_buckets]]))
+    return series.iloc[kept_indices]
+
+
+class DownsampledSeriesCache:
+    """
+    Downsampled numeric columns, keyed by data checksum and column name
+    """
+
+    def __init__(self, point_budget=2000):
+        self.point_budget = point_budget
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build a cache from the VISUALISATION section of the launch config """
+        visual_config = (config or {}).get("VISUALISATION") or {}
+        return cls(int(visual_config.get("point_budget", 2000)))
+
+    def get(self, catalogue_item, column_name):
+        key = (catalogue_item.get_checksum(), column_name)
+        with self._lock:
+            if key in self._series:
+                return self._series[key]
+
+        column = pd.to_numeric(catalogue_item.get_columns([column_name])[column_name], errors='coerce')
+        downsampled_column = min_max_downsample(column, self.point_budget)
+        with self._lock:
+            self._series[key] = downsampled_column
+        return downsampled_column
+
+    def forget(self, data_checksum):
+        """ Drop every series that was built from the given data checksum """
+        with self._lock:
+            self._series = {key: series for key, series in self._series.items() if key[0] != data_checksum}
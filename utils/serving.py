@@ -0,0 +1,57 @@
+"""
+Response tuning for serving the app
+Large responses such as callback payloads and component bundles are gzip compressed, and Dash's assets, which are
+requested with a version or modification time in their url, are given long lived cache headers
+"""
+
+import gzip
+
+import flask
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json", "application/javascript", "text/javascript", "text/html", "text/css", "text/plain",
+    "image/svg+xml"
+}
+# url parts of the files Dash requests with a version or modification time, which change whenever the file does
+ASSET_URL_PARTS = ("/assets/", "/_dash-component-suites/")
+
+
+def configure_responses(server, config):
+    """ Add compression and asset caching to a Flask server, as set in the SERVING section of the launch config """
+    serving_config = (config or {}).get("SERVING") or {}
+    compression_config = serving_config.get("compression") or {}
+    if compression_config.get("enabled", True):
+        min_bytes = int(compression_config.get("min_bytes", 1024))
+        level = int(compression_config.get("level", 6))
+        server.after_request(lambda response: compress_response(response, min_bytes, level))
+
+    asset_max_age = int(serving_config.get("asset_max_age", 31536000))
+    if asset_max_age:
+        server.after_request(lambda response: cache_assets(response, asset_max_age))
+
+
+def compress_response(response, min_bytes=1024, level=6):
+    """
+    Gzip a response body if the client accepts it
+    Streamed, file and already encoded responses are left alone, streams that should be compressed do so themselves
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "gzip" not in flask.request.headers.get("Accept-Encoding", "").lower()):
+        return response
+
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=level))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def cache_assets(response, max_age):
+    """ Let clients keep assets for max_age seconds, a changed asset is requested under a new url """
+    if response.status_code == 200 and any(part in flask.request.path for part in ASSET_URL_PARTS):
+        response.headers["Cache-Control"] = f"public, max-age={max_age}, immutable"
+    return response
@@ -0,0 +1,76 @@
+"""
+Frames shared between server processes through an on-disk Arrow cache
+The first process to load a file converts it once to an Arrow IPC file named after its data checksum, every process
+then reads it memory mapped instead of parsing the CSV again
+"""
+
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:
+    pa = ipc = None
+
+from utils.catalogue_lease import catalogue_is_shared
+
+logger = logging.getLogger(__name__)
+
+
+class SharedFrameStore:
+    """
+    Arrow IPC files of whole frames, keyed by data checksum
+    Frames that can't be converted to Arrow, such as columns of mixed types, are loaded from the CSV every time
+    """
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build a store from the SHARED_CATALOGUE section of the launch config, None if frames aren't shared """
+        shared_config = (config or {}).get("SHARED_CATALOGUE") or {}
+        if not catalogue_is_shared(config) or not shared_config.get("share_frames", True):
+            return None
+        if pa is None:
+            logger.warning("pyarrow isn't installed, frames won't be shared between processes")
+            return None
+        return cls(shared_config.get("frame_path", ".catalogue_cache/frames"))
+
+    def get(self, data_checksum, loader):
+        """ Read a frame from the store, loading it with loader() and storing it if it isn't there yet """
+        frame_path = self._frame_path(data_checksum)
+        try:
+            return ipc.open_file(pa.memory_map(frame_path)).read_all().to_pandas()
+        except FileNotFoundError:
+            pass
+        except pa.ArrowInvalid:
+            logger.warning(f"Discarding unreadable shared frame '{frame_path}'")
+
+        frame = loader()
+        self._write(frame_path, frame)
+        return frame
+
+    def discard(self, data_checksum):
+        try:
+            os.remove(self._frame_path(data_checksum))
+        except FileNotFoundError:
+            pass
+
+    def _frame_path(self, data_checksum):
+        return os.path.join(self.path, f"{data_checksum}.arrow")
+
+    def _write(self, frame_path, frame):
+        try:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            logger.debug(f"Frame for '{frame_path}' can't be converted to Arrow, not sharing it")
+            return
+
+        # write then rename, so that another process never maps half a file
+        temporary_path = f"{frame_path}.{os.getpid()}.tmp"
+        with pa.OSFile(temporary_path, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temporary_path, frame_path)
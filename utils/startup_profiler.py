@@ -0,0 +1,191 @@
+"""
+Startup instrumentation
+Records the wall time and memory of each module import, data component constructor and component constructor made by
+utils.component_initialiser.initialise, and reports them as JSON and as a table
+
+Run as a module to benchmark cold starts, each run builds the app in a fresh process:
+    python -m utils.startup_profiler --runs 5 --baseline .catalogue_cache/startup_baseline.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """
+    Collects one measurement per measured step
+    A disabled profiler measures nothing, so it can be passed around unconditionally
+    """
+
+    def __init__(self, enabled=False, report_path=None):
+        self.enabled = enabled
+        self.report_path = report_path
+        self.measurements = []
+        self._started = None
+        # tracing slows every allocation down, so it's stopped after the report unless something else started it
+        self._started_tracing = False
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build a profiler from the STARTUP_PROFILING section of the launch config """
+        profiling_config = (config or {}).get("STARTUP_PROFILING") or {}
+        return cls(
+            enabled=profiling_config.get("enabled", False),
+            report_path=profiling_config.get("report_path", ".catalogue_cache/startup_report.json")
+        )
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._started = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    @contextlib.contextmanager
+    def measure(self, category, name):
+        """ Measure the wall time, memory delta and peak memory of the wrapped block """
+        if not self.enabled:
+            yield
+            return
+
+        memory_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            memory_after, memory_peak = tracemalloc.get_traced_memory()
+            self.measurements.append({
+                "category": category,
+                "name": name,
+                "seconds": round(seconds, 6),
+                "memory_delta_bytes": memory_after - memory_before,
+                "memory_peak_bytes": memory_peak - memory_before
+            })
+
+    def report(self):
+        """
+        Build the report, write it to report_path as JSON and log it as a table
+        Returns the report, or None if the profiler is disabled
+        """
+        if not self.enabled:
+            return None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+        report = {
+            "total_seconds": round(time.perf_counter() - self._started, 6) if self._started else None,
+            "totals_by_category": {
+                category: round(sum(
+                    measurement["seconds"] for measurement in self.measurements
+                    if measurement["category"] == category
+                ), 6)
+                for category in dict.fromkeys(measurement["category"] for measurement in self.measurements)
+            },
+            "measurements": self.measurements
+        }
+        if self.report_path:
+            os.makedirs(os.path.dirname(self.report_path) or '.', exist_ok=True)
+            with open(self.report_path, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+        logger.info(f"Startup report\n{format_report(report)}")
+        return report
+
+
+# the default profiler of the initialiser's steps, so that they can be called without one
+DISABLED_PROFILER = StartupProfiler()
+
+
+def format_report(report):
+    """ A readable table of a startup report, slowest steps first """
+    lines = [f"{'category':<16} {'name':<48} {'seconds':>9} {'memory (KiB)':>13} {'peak (KiB)':>11}"]
+    for measurement in sorted(report["measurements"], key=lambda measurement: measurement["seconds"], reverse=True):
+        lines.append(
+            f"{measurement['category']:<16} {measurement['name'][:48]:<48} {measurement['seconds']:>9.3f} "
+            f"{measurement['memory_delta_bytes'] / 1024:>13.1f} {measurement['memory_peak_bytes'] / 1024:>11.1f}"
+        )
+    for category, seconds in report["totals_by_category"].items():
+        lines.append(f"{'total':<16} {category:<48} {seconds:>9.3f}")
+    if report["total_seconds"] is not None:
+        lines.append(f"{'total':<16} {'startup':<48} {report['total_seconds']:>9.3f}")
+    return "\n".join(lines)
+
+
+BENCHMARK_SCRIPT = """
+import json, sys, yaml
+from app import App
+launch_config = yaml.safe_load(open(sys.argv[1])) or {}
+launch_config["STARTUP_PROFILING"] = {"enabled": True, "report_path": None}
+app = App(launch_config, background_work=False)
+print(json.dumps(app.app_context.startup_report))
+"""
+
+
+def run_benchmark(launch_config_path, runs):
+    """ Build the app runs times, each in a fresh process so every run is a cold start, returns the reports """
+    reports = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", BENCHMARK_SCRIPT, launch_config_path],
+            check=True, capture_output=True, text=True
+        ).stdout
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+    return reports
+
+
+def summarise_benchmark(reports):
+    """ Median seconds of the whole startup and of each category across runs """
+    categories = dict.fromkeys(category for report in reports for category in report["totals_by_category"])
+    return {
+        "runs": len(reports),
+        "total_seconds": statistics.median(report["total_seconds"] for report in reports),
+        "totals_by_category": {
+            category: statistics.median(report["totals_by_category"].get(category, 0) for report in reports)
+            for category in categories
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the app")
+    parser.add_argument("--config", default="launch_config.yaml")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", help="summary to compare against, it's written here if it doesn't exist")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown over the baseline, 0.1 = 10%%")
+    args = parser.parse_args()
+
+    summary = summarise_benchmark(run_benchmark(args.config, args.runs))
+    print(json.dumps(summary, indent=2))
+    if not args.baseline:
+        return 0
+    if not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(summary, baseline_file, indent=2)
+        print(f"Wrote baseline to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    allowed_seconds = baseline["total_seconds"] * (1 + args.tolerance)
+    print(f"Median startup {summary['total_seconds']:.3f}s, baseline {baseline['total_seconds']:.3f}s")
+    if summary["total_seconds"] > allowed_seconds:
+        print(f"Startup regressed beyond the {args.tolerance:.0%} tolerance")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
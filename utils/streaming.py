@@ -0,0 +1,15 @@
+"""
+Helpers for streaming responses
+"""
+
+import zlib
+
+
+def gzip_chunks(chunks, compression_level=6):
+    """ Compress a stream of byte chunks into a gzip stream, without holding the whole stream in memory """
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
@@ -0,0 +1,142 @@
+"""
+Server side paging, sorting and filtering for catalogue DataTables
+Tables use DataTable's custom page, sort and filter actions, so every response only holds a single page of rows
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+FILTER_OPERATORS = [
+    ['ge ', '>='],
+    ['le ', '<='],
+    ['lt ', '<'],
+    ['gt ', '>'],
+    ['ne ', '!='],
+    ['eq ', '='],
+    ['contains '],
+    ['datestartswith ']
+]
+
+
+def paged_table_options(page_size):
+    """ DataTable arguments for a table that's paged, sorted and filtered by a callback """
+    return dict(
+        page_current=0,
+        page_size=page_size,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='multi',
+        sort_by=[],
+        filter_action='custom',
+        filter_query=''
+    )
+
+
+def split_filter_part(filter_part):
+    """
+    Split a single DataTable filter expression, such as "{col} >= 5", into (column, operator, value)
+    Returns (None, None, None) if the expression isn't understood
+    """
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator not in filter_part:
+                continue
+
+            name_part, value_part = filter_part.split(operator, 1)
+            name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+            value_part = value_part.strip()
+            if value_part and value_part[0] == value_part[-1] and value_part[0] in ("'", '"', '`'):
+                value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+            else:
+                try:
+                    value = float(value_part)
+                except ValueError:
+                    value = value_part
+
+            # word operators need spaces after them in the filter string, but we don't want them later
+            return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def filter_mask(frame, filter_query):
+    """ Boolean mask of the rows in a frame that match a DataTable filter query """
+    mask = np.ones(len(frame), dtype=bool)
+    for filter_part in filter_query.split(' && '):
+        column_name, operator, value = split_filter_part(filter_part)
+        if column_name not in frame.columns:
+            continue
+
+        column = frame[column_name]
+        try:
+            if operator == 'contains':
+                part_mask = column.astype(str).str.contains(str(value), regex=False)
+            elif operator == 'datestartswith':
+                part_mask = column.astype(str).str.startswith(str(value))
+            else:
+                part_mask = getattr(column, operator)(value)
+        except TypeError:
+            # comparing a value to a column of a different type, nothing matches
+            part_mask = np.zeros(len(frame), dtype=bool)
+        mask &= np.asarray(part_mask, dtype=bool)
+    return mask
+
+
+class TableQueryCache:
+    """
+    Serves pages of catalogue items
+    The row order of each (data checksum, sort, filter) is kept, so moving between pages only slices it
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._row_orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_page(self, catalogue_item, page_current, page_size, sort_by=None, filter_query=None):
+        """
+        Get a single page of rows
+        Returns (records, page count)
+        """
+        page_start = page_current * page_size
+        if not sort_by and not filter_query:
+            # a plain page can be read straight out of the file
+            page = catalogue_item.get_rows(page_start, page_size)
+            return page.to_dict('records'), max(math.ceil(catalogue_item.get_row_count() / page_size), 1)
+
+        frame = catalogue_item.get_data()
+        row_order = self._get_row_order(catalogue_item.get_checksum(), frame, sort_by, filter_query)
+        page = frame.iloc[row_order[page_start:page_start + page_size]]
+        return page.to_dict('records'), max(math.ceil(len(row_order) / page_size), 1)
+
+    def _get_row_order(self, data_checksum, frame, sort_by, filter_query):
+        """ Positions of the rows that match the filter, in sorted order """
+        sort_key = tuple((sort['column_id'], sort['direction']) for sort in sort_by or [])
+        key = (data_checksum, sort_key, filter_query or '')
+        with self._lock:
+            if key in self._row_orders:
+                self._row_orders.move_to_end(key)
+                return self._row_orders[key]
+
+        row_order = np.arange(len(frame))
+        if filter_query:
+            row_order = np.flatnonzero(filter_mask(frame, filter_query))
+
+        sort_columns = [(column, direction) for column, direction in sort_key if column in frame.columns]
+        if sort_columns:
+            sorted_rows = frame.iloc[row_order].reset_index(drop=True).sort_values(
+                [column for column, _ in sort_columns],
+                ascending=[direction == 'asc' for _, direction in sort_columns],
+                kind='mergesort'
+            )
+            row_order = row_order[sorted_rows.index.to_numpy()]
+
+        with self._lock:
+            self._row_orders[key] = row_order
+            while len(self._row_orders) > self.max_entries:
+                self._row_orders.popitem(last=False)
+        return row_order
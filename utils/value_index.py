@@ -0,0 +1,150 @@
+"""
+Locality sensitive hashing index of column value sets
+Every catalogued column's MinHash signature is split into bands, and columns that agree on a whole band share a
+bucket. A query only has to look at the columns in its own buckets, rather than at every column in the catalogue
+
+Buckets find columns by Jaccard similarity, but joinable columns are ranked by containment, and a small column can be
+contained in a much larger one while their Jaccard similarity is tiny. For the columns whose size is too far from the
+query's for the buckets to be reliable, signatures are compared directly instead, as one vectorised scan
+"""
+
+import threading
+
+import numpy as np
+
+from utils.column_signatures import MINHASH_PERMUTATIONS
+
+# the buckets should find at least this share of the columns above their Jaccard threshold
+BUCKET_RECALL = 0.9
+INITIAL_CAPACITY = 1024
+
+
+class ValueOverlapIndex:
+    """
+    Columns keyed by (data checksum, column name), found by the values they share with a query column
+    Results are ranked by estimated containment, the share of the smaller column's distinct values that are shared
+    """
+
+    def __init__(self, band_count=64, min_containment=0.5, limit=10):
+        if MINHASH_PERMUTATIONS % band_count:
+            raise ValueError(f"band_count must divide the {MINHASH_PERMUTATIONS} MinHash permutations")
+        self.band_count = band_count
+        self.band_size = MINHASH_PERMUTATIONS // band_count
+        self.min_containment = min_containment
+        self.limit = limit
+        # the lowest Jaccard similarity that shares a bucket with the query in at least BUCKET_RECALL of cases
+        self.bucket_threshold = (1 - (1 - BUCKET_RECALL) ** (1 / band_count)) ** (1 / self.band_size)
+
+        # signatures are held as rows of one matrix so that they can be scanned together, removed rows are reused
+        self._keys = []
+        self._rows = {}
+        self._free_rows = []
+        self._minhashes = np.zeros((INITIAL_CAPACITY, MINHASH_PERMUTATIONS), dtype=np.uint64)
+        self._cardinalities = np.zeros(INITIAL_CAPACITY)
+        self._buckets = [{} for _ in range(band_count)]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build an index from the VALUE_INDEX section of the launch config """
+        index_config = (config or {}).get("VALUE_INDEX") or {}
+        return cls(
+            band_count=int(index_config.get("band_count", 64)),
+            min_containment=float(index_config.get("min_containment", 0.5)),
+            limit=int(index_config.get("limit", 10))
+        )
+
+    def add(self, data_checksum, signatures):
+        """ Index every column of a file, replacing any columns already indexed for the checksum """
+        with self._lock:
+            self._remove(data_checksum)
+            for column_name, signature in signatures.items():
+                # empty columns can't share values with anything
+                if signature.cardinality:
+                    self._add((data_checksum, column_name), signature)
+
+    def remove(self, data_checksum):
+        with self._lock:
+            self._remove(data_checksum)
+
+    def query(self, signature, min_containment=None, limit=None, exclude_checksum=None):
+        """
+        Indexed columns that share values with the given column, most overlapping first
+        Returns [(data checksum, column name, estimated containment)]
+        """
+        min_containment = self.min_containment if min_containment is None else min_containment
+        limit = limit or self.limit
+        if not signature.cardinality:
+            return []
+
+        with self._lock:
+            candidate_rows = set()
+            for band, band_key in enumerate(self._band_keys(signature.minhash)):
+                candidate_rows.update(self._buckets[band].get(band_key, ()))
+            smallest, largest = self._bucket_cardinalities(signature.cardinality, min_containment)
+            cardinalities = self._cardinalities[:len(self._keys)]
+            outside_buckets = (cardinalities < smallest) | (cardinalities > largest)
+            scanned_rows = np.flatnonzero((cardinalities > 0) & outside_buckets)
+            rows = np.array(sorted(candidate_rows.union(scanned_rows.tolist())), dtype=int)
+            keys = [self._keys[row] for row in rows]
+            jaccard = (self._minhashes[rows] == signature.minhash).mean(axis=1)
+            cardinalities = cardinalities[rows]
+
+        # the same estimate as ColumnSignature.containment, for every candidate at once
+        shared_values = jaccard * (cardinalities + signature.cardinality) / (1 + jaccard)
+        containment = np.minimum(shared_values / np.minimum(cardinalities, signature.cardinality), 1)
+        matches = [
+            (data_checksum, column_name, float(column_containment))
+            for (data_checksum, column_name), column_containment in zip(keys, containment)
+            if column_containment >= min_containment and data_checksum != exclude_checksum
+        ]
+        return sorted(matches, key=lambda match: match[2], reverse=True)[:limit]
+
+    def _bucket_cardinalities(self, cardinality, min_containment):
+        """
+        The range of column sizes for which every pair reaching min_containment has a Jaccard similarity of at least
+        the bucket threshold, columns outside of it have to be scanned
+        """
+        threshold = self.bucket_threshold
+        # a smaller column sharing min_containment of its values with the query
+        smaller_denominator = min_containment - threshold * (1 - min_containment)
+        smallest = threshold * cardinality / smaller_denominator if smaller_denominator > 0 else np.inf
+        # a larger column sharing min_containment of the query's values
+        largest = min_containment * cardinality / threshold - cardinality * (1 - min_containment)
+        # if the threshold is too high for any size to be covered, the range is empty and every column is scanned
+        return smallest, largest
+
+    def _add(self, key, signature):
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._keys[row] = key
+        else:
+            row = len(self._keys)
+            self._keys.append(key)
+            if row == len(self._minhashes):
+                self._minhashes = np.concatenate([self._minhashes, np.zeros_like(self._minhashes)])
+                self._cardinalities = np.concatenate([self._cardinalities, np.zeros_like(self._cardinalities)])
+        self._rows[key] = row
+        self._minhashes[row] = signature.minhash
+        self._cardinalities[row] = signature.cardinality
+        for band, band_key in enumerate(self._band_keys(signature.minhash)):
+            self._buckets[band].setdefault(band_key, set()).add(row)
+
+    def _remove(self, data_checksum):
+        for key in [key for key in self._rows if key[0] == data_checksum]:
+            row = self._rows.pop(key)
+            for band, band_key in enumerate(self._band_keys(self._minhashes[row])):
+                bucket = self._buckets[band].get(band_key)
+                if bucket is not None:
+                    bucket.discard(row)
+                    if not bucket:
+                        self._buckets[band].pop(band_key)
+            self._keys[row] = None
+            self._cardinalities[row] = 0
+            self._free_rows.append(row)
+
+    def _band_keys(self, minhash):
+        return [
+            minhash[band * self.band_size:(band + 1) * self.band_size].tobytes()
+            for band in range(self.band_count)
+        ]
@@ -0,0 +1,17 @@
+"""
+Production entry point, serves the app through a WSGI server instead of Dash's debug server
+Run gunicorn from this directory, it picks up gunicorn.conf.py, which reads the SERVING section of launch_config.yaml:
+    gunicorn
+
+Background work such as rescanning the data root is started by gunicorn.conf.py in each worker once it has started,
+so that a catalogue preloaded before forking doesn't carry running threads into the workers
+With more than one worker in SERVING the catalogue is shared, only the worker holding the lease indexes the data root
+"""
+
+import yaml
+
+from app import App
+
+launch_config = yaml.safe_load(open("launch_config.yaml"))
+app = App(launch_config, background_work=False)
+server = app.server